@@ -1,12 +1,15 @@
 # app/agent/Company_Summary_Agent.py
 
 import logging
+
+import config
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
 from langchain_core.tools import Tool
 
+from agent.deadlines import DeadlineExpired
 from agent.llm_tools import GSTAPISummaryTool
-from agent.summarizer import _summary_llm  # Gemini LLM
+from agent.model_routing import chat_model
 
 log = logging.getLogger(__name__)
 
@@ -61,7 +64,7 @@ tools = [
 
 # ─────────────────────────────────────────────
 agent = create_react_agent(
-    llm=_summary_llm,
+    llm=chat_model(config.MODEL_TIER_GST_SUMMARY),
     tools=tools,
     prompt=CUSTOM_REACT_PROMPT,
 )
@@ -88,6 +91,8 @@ async def run_gst_summary_agent(gst_number: str, application_id: str) -> str:
             }
         )
         return response.get("output", "No final answer returned.")
+    except DeadlineExpired:
+        raise
     except Exception as e:
         log.exception("❌ Agent execution failed.")
         return f"Error: {e}"
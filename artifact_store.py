@@ -0,0 +1,155 @@
+# artifact_store.py
+
+"""
+Artifact store for extracted documents.
+
+The ReAct agent should not copy full extraction JSON into every Action
+Input. GeminiFileQATool stores what it extracted and hands back a short
+handle ("artifact://<id>"). PersistFinancialDataTool and
+FinancialSummarizerTool resolve handles back into data.
+
+Two backends:
+  • memory – process-local dict with TTL and a size cap (default)
+  • mongo  – "extractionArtifacts" collection, shared across workers
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import config
+from database.database_config import NetworkConnections
+
+log = logging.getLogger(__name__)
+
+HANDLE_PREFIX = "artifact://"
+
+
+def is_handle(value: Any) -> bool:
+    return isinstance(value, str) and value.strip().startswith(HANDLE_PREFIX)
+
+
+def new_handle() -> str:
+    return f"{HANDLE_PREFIX}{uuid.uuid4().hex}"
+
+
+class InMemoryArtifactStore:
+    """Thread-safe LRU with TTL — the sync tool path runs in worker threads."""
+
+    def __init__(
+        self,
+        ttl_seconds: int = config.ARTIFACT_TTL_SECONDS,
+        max_items: int = config.ARTIFACT_MAX_ITEMS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, data: Any, metadata: Optional[Dict[str, Any]] = None) -> str:
+        handle = new_handle()
+        with self._lock:
+            self._items[handle] = (time.monotonic(), data, metadata or {})
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> Any:
+        handle = handle.strip()
+        with self._lock:
+            entry = self._items.get(handle)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._items.pop(handle, None)
+                raise KeyError(f"Unknown or expired artifact handle: {handle}")
+            self._items.move_to_end(handle)
+            return entry[1]
+
+    async def aput(self, data: Any, metadata: Optional[Dict[str, Any]] = None) -> str:
+        return self.put(data, metadata)
+
+    async def aget(self, handle: str) -> Any:
+        return self.get(handle)
+
+
+class MongoArtifactStore:
+    """Artifacts in Mongo; expiresAt is covered by a TTL index (see database.indexes)."""
+
+    COLLECTION = "extractionArtifacts"
+
+    def __init__(
+        self,
+        connection: NetworkConnections,
+        ttl_seconds: int = config.ARTIFACT_TTL_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.collection = connection.get_mongo_db()[self.COLLECTION]
+        self.async_collection = connection.get_async_mongo_db()[self.COLLECTION]
+
+    def _doc(self, data: Any, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        return {
+            "_id": new_handle(),
+            "data": data,
+            "metadata": metadata or {},
+            "createdAt": now,
+            "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+        }
+
+    def put(self, data: Any, metadata: Optional[Dict[str, Any]] = None) -> str:
+        doc = self._doc(data, metadata)
+        self.collection.insert_one(doc)
+        return doc["_id"]
+
+    def get(self, handle: str) -> Any:
+        doc = self.collection.find_one({"_id": handle.strip()})
+        if doc is None:
+            raise KeyError(f"Unknown or expired artifact handle: {handle}")
+        return doc["data"]
+
+    async def aput(self, data: Any, metadata: Optional[Dict[str, Any]] = None) -> str:
+        doc = self._doc(data, metadata)
+        await self.async_collection.insert_one(doc)
+        return doc["_id"]
+
+    async def aget(self, handle: str) -> Any:
+        doc = await self.async_collection.find_one({"_id": handle.strip()})
+        if doc is None:
+            raise KeyError(f"Unknown or expired artifact handle: {handle}")
+        return doc["data"]
+
+
+def build_artifact_store(backend: str = config.ARTIFACT_STORE_BACKEND):
+    if backend == "mongo":
+        return MongoArtifactStore(NetworkConnections())
+    if backend != "memory":
+        log.warning(f"Unknown ARTIFACT_STORE_BACKEND {backend!r}, using memory")
+    return InMemoryArtifactStore()
+
+
+artifact_store = build_artifact_store()
+
+
+async def resolve_artifacts(json_list_str: str, store=None) -> List[Any]:
+    """
+    Turn a tool argument into a list of extracted items.
+
+    Accepts a bare handle, a JSON list of handles, inline JSON, or any mix
+    of handles and inline objects. Handles are replaced by the data they
+    point to; unknown handles raise KeyError.
+    """
+    store = store or artifact_store
+    text = (json_list_str or "").strip()
+    if not text:
+        return []
+    value = [text] if is_handle(text) else json.loads(text)
+    if not isinstance(value, list):
+        value = [value]
+
+    resolved = []
+    for entry in value:
+        resolved.append(await store.aget(entry) if is_handle(entry) else entry)
+    return resolved
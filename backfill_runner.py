@@ -0,0 +1,293 @@
+# backfill_runner.py
+
+"""
+Resumable backfill of TASK_DISPATCH payloads (`python main.py backfill ...`).
+
+Payload sources:
+  • JSONL file – one payload per line ({"type": "...", "ApplicationId": ...})
+  • Mongo      – documents matching a query, read in _id order and turned
+                 into payloads (type from --task-type, ApplicationId from
+                 "identifier", GstNumber from --gst-field)
+
+Payloads run through the same handlers as the Kafka worker with bounded
+concurrency. Progress is checkpointed to a JSON file:
+  • cursor    – position (line number / _id) up to which everything is done
+  • completed – positions past the cursor already done (out-of-order
+                completions under concurrency)
+  • failed    – payload key → error and payload; --retry-failed runs these
+                again before continuing from the cursor, and an entry is
+                only removed once its retry succeeds
+A handler reply starting with "Error" / "Agent failed" (the agents report
+failures as text) counts as a failure, like a raised exception.
+An interrupted run restarted with the same checkpoint skips everything up
+to the cursor (Mongo: `_id > cursor` in the query) and the completed set.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import signal
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from agent.coalescing import coalescer, is_failure_reply
+from agent.deadlines import DeadlineExpired
+from agent.gstin import GSTINValidationError
+from bson import json_util
+from database.database_config import NetworkConnections
+from pydantic import BaseModel, Field
+from task_handler import TASK_DISPATCH
+
+log = logging.getLogger("backfill")
+
+CHECKPOINT_EVERY_SECONDS = 5.0
+
+
+class BackfillCheckpoint(BaseModel):
+    source: str
+    cursor: Optional[str] = None  # json_util-encoded position
+    completed: list = Field(default_factory=list)  # json_util-encoded positions
+    failed: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+    succeeded: int = 0
+    updatedAt: float = 0.0
+
+
+def _encode(position: Any) -> str:
+    return json_util.dumps(position)
+
+
+def _decode(value: str) -> Any:
+    return json_util.loads(value)
+
+
+def _failure(payload: Dict[str, Any], error: str) -> Dict[str, Any]:
+    # Keep the payload so --retry-failed can rerun it after the cursor moved on
+    return {"error": error, "payload": json.loads(json_util.dumps(payload))}
+
+
+def payload_key(payload: Dict[str, Any], position: Any) -> str:
+    return f"{payload.get('type', '?')}:{payload.get('ApplicationId') or _encode(position)}"
+
+
+def default_checkpoint_path(source: str) -> str:
+    return f".backfill-{hashlib.sha256(source.encode()).hexdigest()[:12]}.json"
+
+
+def load_checkpoint(path: str, source: str) -> BackfillCheckpoint:
+    if not os.path.exists(path):
+        return BackfillCheckpoint(source=source)
+    with open(path, encoding="utf-8") as fh:
+        checkpoint = BackfillCheckpoint(**json.load(fh))
+    if checkpoint.source != source:
+        raise SystemExit(
+            f"Checkpoint {path} belongs to {checkpoint.source!r}, not {source!r}"
+        )
+    log.info(
+        f"Resuming from {path}: cursor={checkpoint.cursor} "
+        f"done-ahead={len(checkpoint.completed)} failed={len(checkpoint.failed)}"
+    )
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: BackfillCheckpoint) -> None:
+    checkpoint.updatedAt = time.time()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(checkpoint.model_dump_json(indent=2))
+    os.replace(tmp_path, path)
+
+
+# ─── sources ──────────────────────────────────────────────────────
+class JsonlSource:
+    def __init__(self, path: str):
+        self.path = path
+        self.description = f"jsonl:{os.path.abspath(path)}"
+
+    async def count(self, cursor: Any) -> int:
+        with open(self.path, encoding="utf-8") as fh:
+            total = sum(1 for raw in fh if raw.strip())
+        return total - (cursor or 0)
+
+    async def iterate(self, cursor: Any) -> AsyncIterator[Tuple[Any, Dict[str, Any]]]:
+        with open(self.path, encoding="utf-8") as fh:
+            for line_no, raw in enumerate(fh, start=1):
+                if not raw.strip() or (cursor is not None and line_no <= cursor):
+                    continue
+                yield line_no, json.loads(raw)
+
+
+class MongoSource:
+    def __init__(
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        task_type: str,
+        gst_field: str = "gstNumber",
+    ):
+        self.collection_name = collection
+        self.query = query
+        self.task_type = task_type.upper()
+        self.gst_field = gst_field
+        self.description = f"mongo:{collection}:{json_util.dumps(query, sort_keys=True)}:{self.task_type}"
+        self._connection = NetworkConnections()
+        self._collection = self._connection.get_async_mongo_db()[collection]
+
+    def _query(self, cursor: Any) -> Dict[str, Any]:
+        if cursor is None:
+            return self.query
+        return {"$and": [self.query, {"_id": {"$gt": cursor}}]}
+
+    def to_payload(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {k: v for k, v in doc.items() if k != "_id"}
+        payload.setdefault("type", self.task_type)
+        payload.setdefault("ApplicationId", str(doc.get("identifier") or doc["_id"]))
+        if self.gst_field in doc:
+            payload.setdefault("GstNumber", doc[self.gst_field])
+        return payload
+
+    async def count(self, cursor: Any) -> int:
+        return await self._collection.count_documents(self._query(cursor))
+
+    async def iterate(self, cursor: Any) -> AsyncIterator[Tuple[Any, Dict[str, Any]]]:
+        async for doc in self._collection.find(self._query(cursor)).sort("_id", 1):
+            yield doc["_id"], self.to_payload(doc)
+
+    async def close(self) -> None:
+        await self._connection.close()
+
+
+# ─── runner ───────────────────────────────────────────────────────
+class _Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.done / elapsed
+        remaining = max(self.total - self.done, 0)
+        eta = f"{remaining / rate:,.0f}s" if rate > 0 else "?"
+        return (
+            f"{self.done}/{self.total} done ({self.failed} failed) │ "
+            f"{rate * 60:,.1f}/min │ ETA {eta}"
+        )
+
+
+async def run_backfill(
+    source,
+    checkpoint_path: Optional[str] = None,
+    concurrency: int = 4,
+    retry_failed: bool = False,
+    progress_every: float = 10.0,
+) -> BackfillCheckpoint:
+    checkpoint_path = checkpoint_path or default_checkpoint_path(source.description)
+    checkpoint = load_checkpoint(checkpoint_path, source.description)
+    cursor = _decode(checkpoint.cursor) if checkpoint.cursor else None
+    done_ahead = set(checkpoint.completed)
+    # Entries stay in checkpoint.failed until their retry succeeds, so an
+    # interrupted --retry-failed run does not lose the ones it never reached
+    retries = list(checkpoint.failed.items()) if retry_failed else []
+
+    progress = _Progress(await source.count(cursor) - len(done_ahead) + len(retries))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    in_order: deque = deque()  # dispatched positions, oldest first
+    finished: set = set()
+    stop = asyncio.Event()
+    last_saved = time.monotonic()
+
+    def advance_cursor() -> None:
+        nonlocal cursor
+        while in_order and _encode(in_order[0]) in finished:
+            position = in_order.popleft()
+            finished.discard(_encode(position))
+            done_ahead.discard(_encode(position))
+            cursor = position
+        checkpoint.cursor = _encode(cursor) if cursor is not None else None
+        checkpoint.completed = sorted(finished | done_ahead)
+
+    def maybe_save(force: bool = False) -> None:
+        nonlocal last_saved
+        if force or time.monotonic() - last_saved >= CHECKPOINT_EVERY_SECONDS:
+            advance_cursor()
+            save_checkpoint(checkpoint_path, checkpoint)
+            last_saved = time.monotonic()
+
+    async def produce() -> None:
+        # Earlier failures first (their positions are already behind the cursor)
+        for key, failure in retries:
+            if stop.is_set():
+                break
+            await queue.put((None, _decode(json.dumps(failure["payload"])), key))
+        async for position, payload in source.iterate(cursor):
+            if stop.is_set():
+                break
+            encoded = _encode(position)
+            in_order.append(position)
+            if encoded in done_ahead:
+                finished.add(encoded)
+                continue
+            await queue.put((position, payload, payload_key(payload, position)))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            position, payload, key = item
+            task_type = str(payload.get("type", "")).upper()
+            handler = TASK_DISPATCH.get(task_type)
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown task type {task_type!r}")
+                result = await handler(payload)
+                if is_failure_reply(result):
+                    checkpoint.failed[key] = _failure(payload, str(result))
+                    progress.failed += 1
+                else:
+                    checkpoint.succeeded += 1
+                    checkpoint.failed.pop(key, None)
+            except GSTINValidationError as e:
+                checkpoint.failed[key] = _failure(payload, f"invalid GSTIN: {e}")
+                progress.failed += 1
+            except DeadlineExpired as e:
+                checkpoint.failed[key] = _failure(payload, f"expired: {e}")
+                progress.failed += 1
+            except Exception as e:
+                log.exception(f"Backfill task {key} failed")
+                checkpoint.failed[key] = _failure(payload, str(e))
+                progress.failed += 1
+            progress.done += 1
+            if position is not None:
+                finished.add(_encode(position))
+            maybe_save()
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(progress_every)
+            log.info(progress.line())
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        maybe_save(force=True)
+        if hasattr(source, "close"):
+            await source.close()
+    log.info(f"Backfill {'interrupted' if stop.is_set() else 'finished'}: {progress.line()}")
+    log.info(coalescer.report())
+    log.info(f"Checkpoint saved to {checkpoint_path}")
+    return checkpoint
@@ -0,0 +1,38 @@
+# balance_sheet_data.py
+
+from typing import Any, Dict, List, Optional
+
+from database.database_config import NetworkConnections
+from database.sheet_bulk_ops import bulk_upsert_sheet_items, sheet_upsert_spec
+from models.balance_sheet import BalanceSheetData
+
+
+class BalanceSheetDataDatabase:
+    def __init__(self, connection: NetworkConnections):
+        self.db = connection.get_async_mongo_db()
+        self.collection = self.db["balanceSheetData"]
+
+    async def get_sheet_data(self, company_gst: str, fiscal_year_end):
+        return await self.collection.find_one(
+            {"companyGst": company_gst, "fiscalYearEnd": fiscal_year_end}
+        )
+
+    async def get_sheet_data_by_gst(self, company_gst: str) -> list:
+        cursor = self.collection.find({"companyGst": company_gst}).sort(
+            "fiscalYearEnd", -1
+        )
+        return await cursor.to_list(length=None)
+
+    async def upsert_sheet_data(
+        self, item: BalanceSheetData, extra_fields: Optional[Dict[str, Any]] = None
+    ):
+        query, update = sheet_upsert_spec(item, extra_fields)
+        return await self.collection.update_one(query, update, upsert=True)
+
+    async def bulk_upsert_sheet_data(
+        self,
+        items: List[BalanceSheetData],
+        extra_fields: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """One unordered bulk_write for all items; per-item results in input order."""
+        return await bulk_upsert_sheet_items(self.collection, items, extra_fields)
@@ -0,0 +1,459 @@
+# batch_backfill.py
+
+"""
+Offline batch-prediction backfills.
+
+Re-summarising historical applications (e.g. after a SUMMARY_PROMPT change)
+or re-extracting sheets in bulk should not go through the real-time Kafka
+path. This module builds one Gemini batch-prediction job instead:
+
+  1. build one JSONL request per record (summary: stored sheet data from
+     Mongo; extraction: a PDF already in GCS)
+  2. write the JSONL to GCS and submit the job
+  3. poll until it ends
+  4. write results back with the same code as the online path —
+     summarizer.store_summary() for the LOS tracker,
+     sheet_persistence.persist_sheet_items() for sheets
+
+Each request carries a "backfill_key" label, echoed back in the output,
+which maps responses to their record.
+
+Backends:
+  • VertexBatchBackend – GCS + vertexai BatchPredictionJob
+  • FakeBatchBackend   – in-memory, answers with a local responder (tests)
+
+With dry_run (always on for --fake, whose default responder answers "{}")
+nothing is written back: responses are parsed and counted in the report
+only.
+
+    python -m agent.batch_backfill summary --query '{"balanceSheetSummary": {"$exists": true}}'
+    python -m agent.batch_backfill extraction --input targets.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import config
+from agent import prompts
+from agent.extraction_provenance import extraction_prompt, stored_record_as_item
+from agent.json_output import extraction_response_schema, parse_json_lenient
+from agent.model_routing import TIER_PRO, _creds, model_name
+from agent.region_pool import vertex_location
+from agent.sheet_persistence import SHEET_TARGETS, count_persisted, persist_sheet_items
+from agent.summarizer import (
+    _los_application_tracker_db,
+    fiscal_year_hashes,
+    store_summary,
+    summary_messages,
+)
+from google.cloud import storage
+from pydantic import BaseModel, Field
+
+try:
+    from vertexai.batch_prediction import BatchPredictionJob
+except ImportError:  # older SDKs only ship the preview module
+    try:
+        from vertexai.preview.batch_prediction import BatchPredictionJob
+    except ImportError:
+        BatchPredictionJob = None
+
+log = logging.getLogger(__name__)
+
+KEY_LABEL = "backfill_key"
+
+class SummaryTarget(BaseModel):
+    application_id: str
+    company_gst: str
+
+
+class ExtractionTarget(BaseModel):
+    company_gst: str
+    doc_type: str
+    gs_uri: str
+
+
+class BackfillReport(BaseModel):
+    mode: str
+    jobId: Optional[str] = None
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    dryRun: bool = False
+    failures: List[Dict[str, str]] = Field(default_factory=list)
+
+
+# ─── JSONL request / response helpers ──────────────────────────────
+def batch_line(
+    key: str,
+    contents: List[Dict[str, Any]],
+    system_text: Optional[str] = None,
+    generation_config: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    request: Dict[str, Any] = {"contents": contents, "labels": {KEY_LABEL: key}}
+    if system_text:
+        request["systemInstruction"] = {"parts": [{"text": system_text}]}
+    if generation_config:
+        request["generationConfig"] = generation_config
+    return {"request": request}
+
+
+def response_key(line: Dict[str, Any]) -> Optional[str]:
+    return ((line.get("request") or {}).get("labels") or {}).get(KEY_LABEL)
+
+
+def response_text(line: Optional[Dict[str, Any]]) -> Optional[str]:
+    try:
+        return line["response"]["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def response_error(line: Optional[Dict[str, Any]]) -> str:
+    return str((line or {}).get("status") or "no response in batch output")
+
+
+# ─── backends ──────────────────────────────────────────────────────
+class VertexBatchBackend:
+    def __init__(self, bucket_name: str = config.GCS_BUCKET, prefix: str = config.BATCH_GCS_PREFIX):
+        if BatchPredictionJob is None:
+            raise RuntimeError("vertexai batch_prediction module is not available")
+        self._bucket = storage.Client(credentials=_creds, project=config.PROJECT_ID).bucket(bucket_name)
+        self._bucket_name = bucket_name
+        self._prefix = prefix
+
+    def output_uri(self, job_name: str) -> str:
+        return f"gs://{self._bucket_name}/{self._prefix}/{job_name}/output"
+
+    def write_input(self, job_name: str, lines: List[Dict[str, Any]]) -> str:
+        object_name = f"{self._prefix}/{job_name}/input.jsonl"
+        self._bucket.blob(object_name).upload_from_string(
+            "\n".join(json.dumps(line, default=str) for line in lines),
+            content_type="application/jsonl",
+        )
+        return f"gs://{self._bucket_name}/{object_name}"
+
+    def submit(self, model: str, input_uri: str, output_uri: str) -> str:
+        with vertex_location(None):
+            job = BatchPredictionJob.submit(
+                source_model=model,
+                input_dataset=input_uri,
+                output_uri_prefix=output_uri,
+            )
+        return job.resource_name
+
+    def status(self, job_id: str) -> str:
+        with vertex_location(None):
+            job = BatchPredictionJob(job_id)
+        if not job.has_ended:
+            return "running"
+        if not job.has_succeeded:
+            log.error(f"Batch job {job_id} failed: {job.error}")
+            return "failed"
+        return "succeeded"
+
+    def read_output(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        with vertex_location(None):
+            output = BatchPredictionJob(job_id).output_location
+        prefix = output.split(f"gs://{self._bucket_name}/", 1)[-1]
+        for blob in self._bucket.list_blobs(prefix=prefix):
+            if not blob.name.endswith(".jsonl"):
+                continue
+            for raw in blob.download_as_text().splitlines():
+                if raw.strip():
+                    yield json.loads(raw)
+
+
+class FakeBatchBackend:
+    """
+    In-memory batch backend. `responder(request) -> text` answers every
+    request (raise to simulate a per-row failure); jobs report "running"
+    for `polls_until_done` status checks.
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+        polls_until_done: int = 1,
+    ):
+        self.responder = responder or (lambda request: "{}")
+        self.polls_until_done = polls_until_done
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._inputs: Dict[str, List[Dict[str, Any]]] = {}
+
+    def output_uri(self, job_name: str) -> str:
+        return f"fake://{job_name}/output"
+
+    def write_input(self, job_name: str, lines: List[Dict[str, Any]]) -> str:
+        uri = f"fake://{job_name}/input.jsonl"
+        self._inputs[uri] = json.loads(json.dumps(lines, default=str))
+        return uri
+
+    def submit(self, model: str, input_uri: str, output_uri: str) -> str:
+        job_id = f"fake-job-{uuid.uuid4().hex[:8]}"
+        self.jobs[job_id] = {"model": model, "lines": self._inputs[input_uri], "polls": 0}
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        job = self.jobs[job_id]
+        job["polls"] += 1
+        return "succeeded" if job["polls"] > self.polls_until_done else "running"
+
+    def read_output(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        for line in self.jobs[job_id]["lines"]:
+            request = line["request"]
+            try:
+                text = self.responder(request)
+            except Exception as e:
+                yield {"request": request, "status": str(e)}
+                continue
+            yield {
+                "request": request,
+                "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]},
+            }
+
+
+def build_batch_backend(fake: bool = False):
+    return FakeBatchBackend() if fake else VertexBatchBackend()
+
+
+# ─── job lifecycle ─────────────────────────────────────────────────
+async def run_batch(
+    backend,
+    mode: str,
+    lines: List[Dict[str, Any]],
+    model: str,
+    poll_seconds: float = config.BATCH_POLL_SECONDS,
+    timeout_seconds: float = config.BATCH_TIMEOUT_SECONDS,
+) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """Write, submit and wait for one job; returns (job id, output line by key)."""
+    job_name = f"{mode}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    input_uri = await asyncio.to_thread(backend.write_input, job_name, lines)
+    job_id = await asyncio.to_thread(
+        backend.submit, model, input_uri, backend.output_uri(job_name)
+    )
+    log.info(f"Submitted {mode} batch job {job_id} with {len(lines)} request(s) on {model}")
+
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        state = await asyncio.to_thread(backend.status, job_id)
+        if state != "running":
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Batch job {job_id} still running after {timeout_seconds:g}s")
+        await asyncio.sleep(poll_seconds)
+    if state != "succeeded":
+        raise RuntimeError(f"Batch job {job_id} ended in state {state!r}")
+
+    output_lines = await asyncio.to_thread(lambda: list(backend.read_output(job_id)))
+    outputs = {response_key(line): line for line in output_lines if response_key(line)}
+    log.info(f"Batch job {job_id} finished: {len(outputs)} of {len(lines)} response(s)")
+    return job_id, outputs
+
+
+# ─── summary backfill ──────────────────────────────────────────────
+async def load_sheet_items(company_gst: str) -> Tuple[list, list]:
+    """Stored (pnl, balance-sheet) items for a company, newest year first."""
+    _, bs_db = SHEET_TARGETS["balance-sheet"]
+    _, pnl_db = SHEET_TARGETS["pnl-sheet"]
+    bs_records, pnl_records = await asyncio.gather(
+        bs_db.get_sheet_data_by_gst(company_gst),
+        pnl_db.get_sheet_data_by_gst(company_gst),
+    )
+    return (
+        [stored_record_as_item(r) for r in pnl_records],
+        [stored_record_as_item(r) for r in bs_records],
+    )
+
+
+async def summary_targets_from_mongo(
+    query: Dict[str, Any], gst_field: str = "gstNumber", limit: int = 0
+) -> List[SummaryTarget]:
+    cursor = _los_application_tracker_db.collection.find(
+        query, {"identifier": 1, gst_field: 1}
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    targets = []
+    async for doc in cursor:
+        if not doc.get("identifier") or not doc.get(gst_field):
+            log.warning(f"Skipping tracker record {doc.get('_id')}: no identifier or {gst_field}")
+            continue
+        targets.append(
+            SummaryTarget(application_id=str(doc["identifier"]), company_gst=doc[gst_field])
+        )
+    return targets
+
+
+async def run_summary_backfill(
+    targets: List[SummaryTarget], backend, dry_run: bool = False
+) -> BackfillReport:
+    report = BackfillReport(mode="summary", dryRun=dry_run)
+    lines, manifest = [], {}
+    for index, target in enumerate(targets):
+        pnl_items, bs_items = await load_sheet_items(target.company_gst)
+        if not pnl_items and not bs_items:
+            report.skipped += 1
+            log.warning(f"No stored sheets for {target.company_gst}; skipping {target.application_id}")
+            continue
+        system_message, human_message = summary_messages(pnl_items, bs_items)
+        key = f"r{index}"
+        lines.append(
+            batch_line(
+                key,
+                [{"role": "user", "parts": [{"text": human_message.content}]}],
+                system_message.content,
+                {"temperature": config.TEMPERATURE, "responseMimeType": "application/json"},
+            )
+        )
+        manifest[key] = (target, fiscal_year_hashes(pnl_items, bs_items))
+    if not lines:
+        return report
+
+    report.submitted = len(lines)
+    report.jobId, outputs = await run_batch(
+        backend, "summary", lines, model_name(config.MODEL_TIER_FINANCIAL_SUMMARY)
+    )
+    for key, (target, year_hashes) in manifest.items():
+        text = response_text(outputs.get(key))
+        if text is None:
+            report.failed += 1
+            report.failures.append(
+                {"applicationId": target.application_id, "error": response_error(outputs.get(key))}
+            )
+            continue
+        if not dry_run:
+            await store_summary(target.application_id, text, year_hashes)
+        report.succeeded += 1
+    return report
+
+
+# ─── extraction backfill ───────────────────────────────────────────
+def extraction_line(key: str, target: ExtractionTarget) -> Dict[str, Any]:
+    generation_config: Dict[str, Any] = {
+        "temperature": 0.2,
+        "responseMimeType": "application/json",
+    }
+    schema = extraction_response_schema(target.doc_type)
+    if schema is not None:
+        generation_config["responseSchema"] = schema
+    contents = [
+        {"role": "user", "parts": [{"text": prompts.GIVE_OUTPUT_STRING}]},
+        {
+            "role": "user",
+            "parts": [
+                {"text": extraction_prompt(target.doc_type).strip()},
+                {"fileData": {"fileUri": target.gs_uri, "mimeType": "application/pdf"}},
+            ],
+        },
+    ]
+    return batch_line(key, contents, generation_config=generation_config)
+
+
+async def run_extraction_backfill(
+    targets: List[ExtractionTarget], backend, dry_run: bool = False
+) -> BackfillReport:
+    report = BackfillReport(mode="extraction", dryRun=dry_run)
+    manifest = {}
+    for index, target in enumerate(targets):
+        if target.doc_type not in SHEET_TARGETS:
+            report.skipped += 1
+            log.warning(f"Skipping {target.gs_uri}: unknown doc_type {target.doc_type!r}")
+            continue
+        manifest[f"r{index}"] = target
+    if not manifest:
+        return report
+
+    report.submitted = len(manifest)
+    report.jobId, outputs = await run_batch(
+        backend,
+        "extraction",
+        [extraction_line(key, target) for key, target in manifest.items()],
+        model_name(TIER_PRO),
+    )
+    for key, target in manifest.items():
+        parsed = parse_json_lenient(response_text(outputs.get(key)))
+        if parsed is None:
+            report.failed += 1
+            report.failures.append({"source": target.gs_uri, "error": response_error(outputs.get(key))})
+            continue
+        items = parsed if isinstance(parsed, list) else [parsed]
+        if dry_run:
+            log.info(f"Dry run: not persisting {len(items)} {target.doc_type} item(s) from {target.gs_uri}")
+            report.succeeded += 1
+            continue
+        persisted = await persist_sheet_items(target.doc_type, items, target.company_gst)
+        if count_persisted(persisted) == len(items):
+            report.succeeded += 1
+        else:
+            report.failed += 1
+            report.failures.append(
+                {"source": target.gs_uri, "error": f"{count_persisted(persisted)}/{len(items)} item(s) persisted"}
+            )
+    return report
+
+
+# ─── CLI ───────────────────────────────────────────────────────────
+def read_jsonl(path: str, model_cls):
+    with open(path, encoding="utf-8") as fh:
+        return [model_cls(**json.loads(raw)) for raw in fh if raw.strip()]
+
+
+async def run(args: argparse.Namespace) -> BackfillReport:
+    backend = build_batch_backend(fake=args.fake)
+    # The fake backend's answers are placeholders: never write them to Mongo
+    dry_run = args.fake
+    if args.mode == "summary":
+        if args.input:
+            targets = read_jsonl(args.input, SummaryTarget)
+        else:
+            targets = await summary_targets_from_mongo(
+                json.loads(args.query), args.gst_field, args.limit
+            )
+        return await run_summary_backfill(targets, backend, dry_run)
+    return await run_extraction_backfill(
+        read_jsonl(args.input, ExtractionTarget), backend, dry_run
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Batch-prediction backfills")
+    parser.add_argument("mode", choices=("summary", "extraction"))
+    parser.add_argument(
+        "--query",
+        default="{}",
+        help="summary: Mongo filter on losApplicationTracker (JSON)",
+    )
+    parser.add_argument(
+        "--gst-field",
+        default="gstNumber",
+        help="summary: tracker field holding the company GSTIN",
+    )
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument(
+        "--input",
+        help="JSONL of targets ({application_id, company_gst} or {company_gst, doc_type, gs_uri})",
+    )
+    parser.add_argument(
+        "--fake",
+        action="store_true",
+        help="Dry run on the in-memory fake batch backend (no Vertex job, no Mongo writes)",
+    )
+    args = parser.parse_args()
+    if args.mode == "extraction" and not args.input:
+        parser.error("extraction mode needs --input")
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s │ %(levelname)-8s │ %(message)s",
+    )
+    result = asyncio.run(run(parse_args()))
+    log.info(result.model_dump_json(indent=2))
+    raise SystemExit(0 if result.failed == 0 else 1)
@@ -0,0 +1,90 @@
+# bench_sheet_persistence.py
+
+"""
+Benchmark: per-item upsert_sheet_data vs one unordered bulk_write.
+
+Each round times both approaches twice on their own fresh keys: once on the
+insert path, then with changed values on the update path. Runs against the
+configured Mongo (CENTRAL_KYC_MONGO_URI) using a scratch collection that is
+dropped afterwards:
+
+    python -m database.bench_sheet_persistence --items 20 --rounds 5
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from database.database_config import NetworkConnections
+from database.sheet_bulk_ops import bulk_upsert_sheet_items, sheet_upsert_spec
+from pydantic import BaseModel
+
+SCRATCH_COLLECTION = "benchSheetPersistence"
+
+
+class _BenchSheetItem(BaseModel):
+    companyGst: str
+    fiscalYearEnd: int
+    data: Optional[Dict[str, Any]] = None
+
+
+def _make_items(n: int, prefix: str, round_no: int, version: int = 1) -> List[_BenchSheetItem]:
+    return [
+        _BenchSheetItem(
+            companyGst=f"{prefix}{round_no:04d}",
+            fiscalYearEnd=2000 + i,
+            data={"totalAssets": i * 1000 * version, "totalLiabilities": i * 1000 * version},
+        )
+        for i in range(n)
+    ]
+
+
+async def _per_item(collection, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        query, update = sheet_upsert_spec(item)
+        await collection.update_one(query, update, upsert=True)
+    return time.perf_counter() - start
+
+
+async def _bulk(collection, items) -> float:
+    start = time.perf_counter()
+    await bulk_upsert_sheet_items(collection, items)
+    return time.perf_counter() - start
+
+
+async def run(items: int, rounds: int):
+    connection = NetworkConnections()
+    collection = connection.get_async_mongo_db()[SCRATCH_COLLECTION]
+    await collection.drop()
+    try:
+        methods = (("PERITEM", _per_item), ("BULK", _bulk))
+        times = {(prefix, phase): 0.0 for prefix, _ in methods for phase in ("insert", "update")}
+        for r in range(rounds):
+            for prefix, method in methods:
+                # Fresh keys take the insert path; the same keys with new values the update path
+                times[prefix, "insert"] += await method(collection, _make_items(items, prefix, r))
+                times[prefix, "update"] += await method(collection, _make_items(items, prefix, r, 2))
+
+        print(f"items/round={items} rounds={rounds}")
+        for phase in ("insert", "update"):
+            per_item_ms = 1000 * times["PERITEM", phase] / rounds
+            bulk_ms = 1000 * times["BULK", phase] / rounds
+            print(f"{phase}: per-item upsert : {per_item_ms:8.2f} ms/round")
+            print(f"{phase}: bulk_write      : {bulk_ms:8.2f} ms/round")
+            print(f"{phase}: speed-up        : {per_item_ms / bulk_ms if bulk_ms else float('inf'):8.2f}x")
+    finally:
+        await collection.drop()
+        await connection.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sheet persistence benchmark")
+    parser.add_argument("--items", type=int, default=20, help="items per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.items, args.rounds))
@@ -0,0 +1,158 @@
+# bench_text_fast_path.py
+
+"""
+Accuracy / latency comparison: PDF-file extraction vs text-layer fast path.
+
+Corpus layout (one folder per doc_type, optional ground truth next to each PDF):
+
+    corpus/
+      balance-sheet/  acme_fy24.pdf  acme_fy24.expected.json
+      pnl-sheet/      acme_fy24.pdf
+
+    python -m agent.bench_text_fast_path --corpus ./corpus
+
+Accuracy is the share of numeric fields matching within 0.5%: against
+*.expected.json when present, otherwise text path vs file path agreement.
+Scanned PDFs (no usable text layer) are reported and skipped.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import config
+from agent.extraction_provenance import extraction_prompt
+from agent.llm_tools import GeminiFileQATool, _bucket
+from agent.page_selection import extract_page_texts, select_relevant_pages
+from agent.text_layer import build_statement_text, is_born_digital
+
+_tool = GeminiFileQATool()
+
+
+def _numeric_leaves(value: Any, path: str = "") -> Dict[str, float]:
+    leaves: Dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, child in value.items():
+            leaves.update(_numeric_leaves(child, f"{path}.{key}" if path else key))
+    elif isinstance(value, list):
+        for child in value:
+            if isinstance(child, dict):
+                year = str(child.get("fiscalYearEnd"))[:10]
+                leaves.update(_numeric_leaves(child, f"{path}[{year}]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        leaves[path] = float(value)
+    return leaves
+
+
+def field_accuracy(candidate: Any, reference: Any) -> Optional[float]:
+    ref = _numeric_leaves(reference)
+    if not ref:
+        return None
+    cand = _numeric_leaves(candidate)
+    matched = sum(
+        1
+        for path, expected in ref.items()
+        if path in cand
+        and abs(cand[path] - expected) <= max(1.0, 0.005 * abs(expected))
+    )
+    return matched / len(ref)
+
+
+async def _file_path(pdf_bytes: bytes, doc_type: str) -> str:
+    blob = _bucket.blob(f"tmp/{uuid.uuid4()}.pdf")
+    await asyncio.to_thread(
+        blob.upload_from_string, pdf_bytes, content_type="application/pdf", timeout=120
+    )
+    try:
+        # Same arguments as GeminiFileQATool._arun for a full extraction
+        return await _tool._agenerate_text(
+            "",
+            f"{config.GS_URI_PREFIX}/{blob.name}",
+            None,
+            doc_type,
+            static_prefix=extraction_prompt(doc_type),
+        )
+    finally:
+        await asyncio.to_thread(blob.delete)
+
+
+async def _text_path(document_text: str, doc_type: str) -> str:
+    return await _tool._agenerate_text(
+        "", None, document_text, doc_type, static_prefix=extraction_prompt(doc_type)
+    )
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    text = await coro
+    return text, round(time.perf_counter() - start, 2)
+
+
+def _parse(text: str):
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+async def bench_file(pdf_path: Path, doc_type: str) -> Dict[str, Any]:
+    pdf_bytes = pdf_path.read_bytes()
+    row: Dict[str, Any] = {"file": pdf_path.name, "doc_type": doc_type}
+    page_texts = extract_page_texts(pdf_bytes)
+    if not is_born_digital(page_texts):
+        row["skipped"] = "scanned / no text layer"
+        return row
+
+    trimmed, selection = select_relevant_pages(pdf_bytes, doc_type, page_texts)
+    text_doc = build_statement_text(pdf_bytes, selection.kept_pages)
+    if text_doc is None:
+        row["skipped"] = "text layer too large or unreadable"
+        return row
+
+    file_text, row["file_seconds"] = await _timed(_file_path(trimmed, doc_type))
+    fast_text, row["text_seconds"] = await _timed(_text_path(text_doc.text, doc_type))
+    row["text_chars"] = text_doc.chars
+    row["pages"] = len(selection.kept_pages)
+
+    file_json, fast_json = _parse(file_text), _parse(fast_text)
+    expected_path = pdf_path.with_suffix(".expected.json")
+    if expected_path.exists():
+        expected = json.loads(expected_path.read_text())
+        row["file_accuracy"] = field_accuracy(file_json, expected)
+        row["text_accuracy"] = field_accuracy(fast_json, expected)
+    else:
+        row["agreement"] = field_accuracy(fast_json, file_json)
+    return row
+
+
+async def run(corpus: Path) -> List[Dict[str, Any]]:
+    rows = []
+    for doc_type in ("balance-sheet", "pnl-sheet"):
+        for pdf_path in sorted((corpus / doc_type).glob("*.pdf")):
+            row = await bench_file(pdf_path, doc_type)
+            print(json.dumps(row))
+            rows.append(row)
+
+    measured = [r for r in rows if "text_seconds" in r]
+    if measured:
+        file_s = sum(r["file_seconds"] for r in measured)
+        text_s = sum(r["text_seconds"] for r in measured)
+        print(
+            f"documents={len(measured)} skipped={len(rows) - len(measured)} "
+            f"file_path={file_s:.1f}s text_path={text_s:.1f}s "
+            f"speed-up={file_s / text_s if text_s else float('inf'):.2f}x"
+        )
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Text-layer fast path comparison")
+    parser.add_argument("--corpus", type=Path, required=True)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args().corpus))
@@ -0,0 +1,157 @@
+# coalescing.py
+
+"""
+Request coalescing in front of TASK_DISPATCH.
+
+UI double-submits and upstream retries produce identical GST_SUMMARY /
+FINANCIAL_SUMMARY payloads close together. Payloads are keyed on task type +
+a normalised payload (pre-signed URLs without their query string, GSTIN
+upper-cased, URL lists sorted, delivery metadata such as EnqueuedAt and
+Deadline dropped):
+
+  • in flight – a payload identical to one still running waits for that
+                execution and gets its result (or its error)
+  • window    – a successful result is reused for COALESCE_WINDOW_SECONDS
+                after it finished; failures (raised, or "Error..." /
+                "Agent failed..." replies) are never reused
+
+A waiter whose shared execution ran out of job time runs on its own, since
+its own deadline may be later. coalescer.stats counts executions, joins,
+window hits and the execution seconds saved; report() formats them.
+COALESCE_ENABLED=false dispatches every payload as before.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import config
+from agent.deadlines import DeadlineExpired
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+_IGNORED_FIELDS = {"EnqueuedAt", "Deadline"}
+# The agents report failures as text rather than raising
+FAILURE_PREFIXES = ("Error", "Agent failed")
+
+
+class CoalescingStats(BaseModel):
+    calls: int = 0
+    executions: int = 0
+    joinedInFlight: int = 0
+    servedFromWindow: int = 0
+    savedSeconds: float = 0.0
+
+
+def is_failure_reply(result: Any) -> bool:
+    return str(result).startswith(FAILURE_PREFIXES)
+
+
+def _normalise(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalise(v) for k, v in value.items() if k not in _IGNORED_FIELDS}
+    if isinstance(value, list):
+        items = [_normalise(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True, default=str))
+    if isinstance(value, str):
+        text = value.strip()
+        parts = urlsplit(text)
+        if parts.scheme in ("http", "https"):
+            return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+        return text
+    return value
+
+
+def coalesce_key(task_type: str, payload: Dict[str, Any]) -> str:
+    normalised = _normalise(payload)
+    if isinstance(normalised.get("GstNumber"), str):
+        normalised["GstNumber"] = normalised["GstNumber"].upper()
+    blob = json.dumps([task_type, normalised], sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class RequestCoalescer:
+    def __init__(self, window: float = config.COALESCE_WINDOW_SECONDS):
+        self.window = window
+        self.stats = CoalescingStats()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent: Dict[str, Tuple[float, float, Any]] = {}  # key → (expires, seconds, result)
+
+    def _prune(self, now: float) -> None:
+        for key in [k for k, (expires, _, _) in self._recent.items() if expires <= now]:
+            del self._recent[key]
+
+    async def _execute(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await fn()
+        elapsed = time.monotonic() - started
+        if self.window > 0 and not is_failure_reply(result):
+            self._recent[key] = (time.monotonic() + self.window, elapsed, result)
+        return result
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]], label: str = "") -> Any:
+        now = time.monotonic()
+        self.stats.calls += 1
+        self._prune(now)
+
+        if key in self._recent:
+            _, elapsed, result = self._recent[key]
+            self.stats.servedFromWindow += 1
+            self.stats.savedSeconds += elapsed
+            log.info(f"Coalesced {label}: reusing a result from the last {self.window:g}s")
+            return result
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats.joinedInFlight += 1
+            log.info(f"Coalesced {label}: joining the identical execution in flight")
+            try:
+                result = await asyncio.shield(task)
+            except DeadlineExpired:
+                log.info(f"Shared execution for {label} expired; running this one on its own")
+                return await self._own(key, fn)
+            self.stats.savedSeconds += self._recent.get(key, (0, 0.0, None))[1]
+            return result
+
+        return await self._own(key, fn)
+
+    async def _own(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats.executions += 1
+        # A task of its own, so a cancelled caller does not cancel the waiters' work
+        task = asyncio.create_task(self._execute(key, fn))
+        self._inflight[key] = task
+        task.add_done_callback(
+            lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None
+        )
+        return await asyncio.shield(task)
+
+    def wrap(self, task_type: str, handler: Callable[[dict], Awaitable[Any]]):
+        if not config.COALESCE_ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        async def run(payload: dict) -> Any:
+            label = f"{task_type} {payload.get('ApplicationId') or payload.get('GstNumber') or ''}".strip()
+            return await self.run(
+                coalesce_key(task_type, payload), lambda: handler(payload), label
+            )
+
+        return run
+
+    def report(self) -> str:
+        s = self.stats
+        saved = s.joinedInFlight + s.servedFromWindow
+        return (
+            f"Coalescing: {s.calls} calls, {s.executions} executions, "
+            f"{s.joinedInFlight} joined in flight, {s.servedFromWindow} from the "
+            f"{self.window:g}s window ({saved / s.calls if s.calls else 0:.0%} saved, "
+            f"~{s.savedSeconds:,.0f}s of execution)"
+        )
+
+
+coalescer = RequestCoalescer()
@@ -23,6 +23,96 @@ CENTRAL_KYC_MONGO_DB_URL = os.getenv(
 ALL_MIGHT_BASE_URL = os.getenv("ALL_MIGHT_BASE_URL", "")
 BIZCON_AUTH_KEY = os.getenv("BIZCON_AUTH_KEY", "")
 SOURCE_NAME = os.getenv("SOURCE_NAME", "wall_e_gst_details_ai_summary")
+# Build missing centralKyc indexes when the worker starts
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "false").lower() == "true"
+# Extracted-document artifacts ("memory" or "mongo")
+ARTIFACT_STORE_BACKEND = os.getenv("ARTIFACT_STORE_BACKEND", "memory")
+ARTIFACT_TTL_SECONDS = int(os.getenv("ARTIFACT_TTL_SECONDS", "86400"))
+ARTIFACT_MAX_ITEMS = int(os.getenv("ARTIFACT_MAX_ITEMS", "2000"))
+# Send only statement/note pages to Gemini when the PDF has a text layer
+PAGE_SELECTION_ENABLED = os.getenv("PAGE_SELECTION_ENABLED", "true").lower() == "true"
+PAGE_SELECTION_MAX_KEEP_RATIO = float(os.getenv("PAGE_SELECTION_MAX_KEEP_RATIO", "0.8"))
+# Send born-digital statements to Gemini as extracted text instead of a PDF
+TEXT_LAYER_FAST_PATH = os.getenv("TEXT_LAYER_FAST_PATH", "true").lower() == "true"
+TEXT_LAYER_MAX_CHARS = int(os.getenv("TEXT_LAYER_MAX_CHARS", "120000"))
+# Downsample / strip / linearize scanned PDFs before upload (worker process)
+PDF_COMPACTION_ENABLED = os.getenv("PDF_COMPACTION_ENABLED", "false").lower() == "true"
+PDF_COMPACTION_TARGET_DPI = int(os.getenv("PDF_COMPACTION_TARGET_DPI", "150"))
+PDF_COMPACTION_JPEG_QUALITY = int(os.getenv("PDF_COMPACTION_JPEG_QUALITY", "75"))
+PDF_COMPACTION_MIN_BYTES = int(os.getenv("PDF_COMPACTION_MIN_BYTES", str(2 * 1024 * 1024)))
+PDF_COMPACTION_WORKERS = int(os.getenv("PDF_COMPACTION_WORKERS", "2"))
+# Per-task model tiers ("fast" / "pro"); when disabled everything uses VERTEX_MODEL
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+VERTEX_MODEL_FAST = os.getenv("VERTEX_MODEL_FAST_NAME", "gemini-2.5-flash")
+VERTEX_MODEL_PRO = os.getenv("VERTEX_MODEL_PRO_NAME", VERTEX_MODEL)
+MODEL_TIER_GST_SUMMARY = os.getenv("MODEL_TIER_GST_SUMMARY", "fast")
+MODEL_TIER_ORCHESTRATION = os.getenv("MODEL_TIER_ORCHESTRATION", "pro")
+MODEL_TIER_FINANCIAL_SUMMARY = os.getenv("MODEL_TIER_FINANCIAL_SUMMARY", "pro")
+# Born-digital statements up to this many pages are extracted on the fast tier
+MODEL_FAST_MAX_PAGES = int(os.getenv("MODEL_FAST_MAX_PAGES", "30"))
+# Cost estimates, USD per million tokens
+VERTEX_FAST_INPUT_USD_PER_MTOK = float(os.getenv("VERTEX_FAST_INPUT_USD_PER_MTOK", "0.30"))
+VERTEX_FAST_OUTPUT_USD_PER_MTOK = float(os.getenv("VERTEX_FAST_OUTPUT_USD_PER_MTOK", "2.50"))
+VERTEX_PRO_INPUT_USD_PER_MTOK = float(os.getenv("VERTEX_PRO_INPUT_USD_PER_MTOK", "1.25"))
+VERTEX_PRO_OUTPUT_USD_PER_MTOK = float(os.getenv("VERTEX_PRO_OUTPUT_USD_PER_MTOK", "10.00"))
+VERTEX_CACHED_INPUT_DISCOUNT = float(os.getenv("VERTEX_CACHED_INPUT_DISCOUNT", "0.25"))
+# Vertex regions for Gemini calls, "location[:weight],..." (default: LOCATION only)
+VERTEX_LOCATIONS = os.getenv("VERTEX_LOCATIONS", LOCATION)
+VERTEX_REGION_EJECT_AFTER_ERRORS = int(os.getenv("VERTEX_REGION_EJECT_AFTER_ERRORS", "3"))
+VERTEX_REGION_EJECT_SECONDS = float(os.getenv("VERTEX_REGION_EJECT_SECONDS", "30"))
+VERTEX_REGION_MAX_ATTEMPTS = int(os.getenv("VERTEX_REGION_MAX_ATTEMPTS", "2"))
+# Per-call deadline and optional hedged (duplicate) Gemini requests
+GEMINI_CALL_TIMEOUT_SECONDS = float(os.getenv("GEMINI_CALL_TIMEOUT_SECONDS", "240"))
+GEMINI_HEDGING_ENABLED = os.getenv("GEMINI_HEDGING_ENABLED", "false").lower() == "true"
+GEMINI_HEDGE_TIER = os.getenv("GEMINI_HEDGE_TIER", "")  # empty → same tier as the primary
+GEMINI_HEDGE_MAX_RATIO = float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.05"))
+GEMINI_HEDGE_BURST = float(os.getenv("GEMINI_HEDGE_BURST", "2"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_SECONDS", "5"))
+# Offline batch-prediction backfills (agent/batch_backfill.py)
+BATCH_GCS_PREFIX = os.getenv("BATCH_GCS_PREFIX", "batch")
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("BATCH_TIMEOUT_SECONDS", str(24 * 3600)))
+# Job deadlines (agent/deadlines.py): from the Kafka message timestamp unless
+# the payload carries its own "Deadline"; 0 disables the derived deadline
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "3600"))
+DEADLINE_MIN_STAGE_SECONDS = float(os.getenv("DEADLINE_MIN_STAGE_SECONDS", "30"))
+# Prefetch spool for FINANCIAL_SUMMARY documents (agent/document_spool.py)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+PREFETCH_UPLOAD = os.getenv("PREFETCH_UPLOAD", "false").lower() == "true"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/tmp/financial-spool")
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(2 * 1024**3)))
+# Spooled files older than this are checked against the object's ETag before reuse
+SPOOL_REVALIDATE_AFTER_SECONDS = int(os.getenv("SPOOL_REVALIDATE_AFTER_SECONDS", "300"))
+# Ranged parallel downloads of source PDFs (agent/ranged_download.py)
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(8 * 1024**2)))
+DOWNLOAD_PARALLEL_CHUNKS = int(os.getenv("DOWNLOAD_PARALLEL_CHUNKS", "4"))
+DOWNLOAD_CHUNK_RETRIES = int(os.getenv("DOWNLOAD_CHUNK_RETRIES", "3"))
+DOWNLOAD_CHUNK_TIMEOUT_SECONDS = float(os.getenv("DOWNLOAD_CHUNK_TIMEOUT_SECONDS", "60"))
+DOWNLOAD_VERIFY_MD5_ETAG = os.getenv("DOWNLOAD_VERIFY_MD5_ETAG", "true").lower() == "true"
+# Coalescing of identical GST_SUMMARY / FINANCIAL_SUMMARY payloads (agent/coalescing.py)
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "120"))
+# Map-reduce financial summary for large inputs (agent/summarizer.py): one call
+# per fiscal year, then a merge call, once the data exceeds the size threshold
+SUMMARY_MAP_REDUCE_ENABLED = os.getenv("SUMMARY_MAP_REDUCE_ENABLED", "true").lower() == "true"
+SUMMARY_MAP_REDUCE_MIN_CHARS = int(os.getenv("SUMMARY_MAP_REDUCE_MIN_CHARS", "60000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+# Summarise only a newly added latest fiscal year and splice it into the
+# application's stored summary when every other year is unchanged
+SUMMARY_INCREMENTAL_ENABLED = os.getenv("SUMMARY_INCREMENTAL_ENABLED", "true").lower() == "true"
+# Per-job stage checkpoints for FINANCIAL_SUMMARY (agent/job_state.py)
+JOB_STATE_ENABLED = os.getenv("JOB_STATE_ENABLED", "true").lower() == "true"
+JOB_STATE_TTL_SECONDS = int(os.getenv("JOB_STATE_TTL_SECONDS", str(14 * 86400)))
+# A finished job's summary is returned as-is only for redeliveries within this window
+JOB_REDELIVERY_WINDOW_SECONDS = int(os.getenv("JOB_REDELIVERY_WINDOW_SECONDS", "3600"))
+# Provider-side cache for the static extraction prompt ("vertex", "local" or "off")
+PROMPT_CACHE_BACKEND = os.getenv("PROMPT_CACHE_BACKEND", "vertex")
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+PROMPT_CACHE_REFRESH_MARGIN_SECONDS = int(
+    os.getenv("PROMPT_CACHE_REFRESH_MARGIN_SECONDS", "300")
+)
 
 # Derived constants --------------------------------------------------
 GS_URI_PREFIX = f"gs://{GCS_BUCKET}"
@@ -3,13 +3,41 @@ import os
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 
 
 class DatabaseConfig:
     CENTRAL_KYC_MONGO_DB_URL = os.getenv(
         "CENTRAL_KYC_MONGO_URI", "mongodb://localhost:27017/"
     )
+    CENTRAL_KYC_DB_NAME = os.getenv("CENTRAL_KYC_DB_NAME", "centralKyc")
+
+    # Connection-pool / timeout tuning, shared by the sync and async clients
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "60000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+        os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")
+    )
+    MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+    MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "wall-e")
+
+    @classmethod
+    def client_options(cls) -> Dict[str, Any]:
+        return {
+            "maxPoolSize": cls.MONGO_MAX_POOL_SIZE,
+            "minPoolSize": cls.MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": cls.MONGO_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": cls.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "connectTimeoutMS": cls.MONGO_CONNECT_TIMEOUT_MS,
+            "socketTimeoutMS": cls.MONGO_SOCKET_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": cls.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "readPreference": cls.MONGO_READ_PREFERENCE,
+            "appname": cls.MONGO_APP_NAME,
+        }
 
 
 class NetworkConnections:
@@ -26,11 +54,26 @@ class NetworkConnections:
             return
 
         self.central_kyc_database = None
+        self.central_kyc_async_database = None
 
         try:
             # MongoDB Connections
-            self.mongo_client = MongoClient(DatabaseConfig.CENTRAL_KYC_MONGO_DB_URL)
-            self.central_kyc_database = self.mongo_client["centralKyc"]
+            client_options = DatabaseConfig.client_options()
+            self.mongo_client = MongoClient(
+                DatabaseConfig.CENTRAL_KYC_MONGO_DB_URL, **client_options
+            )
+            self.central_kyc_database = self.mongo_client[
+                DatabaseConfig.CENTRAL_KYC_DB_NAME
+            ]
+
+            # Native async client — one pool shared by every database class.
+            # Connects lazily on the first awaited operation.
+            self.async_mongo_client = AsyncMongoClient(
+                DatabaseConfig.CENTRAL_KYC_MONGO_DB_URL, **client_options
+            )
+            self.central_kyc_async_database = self.async_mongo_client[
+                DatabaseConfig.CENTRAL_KYC_DB_NAME
+            ]
 
         except Exception as e:
             print(f"Error establishing database connections: {e}")
@@ -41,6 +84,13 @@ class NetworkConnections:
     def get_mongo_db(self):
         return self.central_kyc_database
 
+    def get_async_mongo_db(self):
+        return self.central_kyc_async_database
+
+    async def close(self):
+        await self.async_mongo_client.close()
+        self.mongo_client.close()
+
 
 class BalanceSheetData(BaseModel):
     companyGst: str
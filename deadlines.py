@@ -0,0 +1,123 @@
+# deadlines.py
+
+"""
+Job deadlines, propagated from the Kafka message to every pipeline stage.
+
+A payload's deadline is its "Deadline" field (epoch seconds/ms or ISO-8601)
+or, failing that, "EnqueuedAt" (stamped by the Kafka consumer from the
+message timestamp) + JOB_DEADLINE_SECONDS. task_handler opens a
+deadline_scope() per payload; stages then:
+
+  • check_deadline(stage)  – before expensive work; raises DeadlineExpired
+                             when less than DEADLINE_MIN_STAGE_SECONDS remain
+  • check_url(stage, url)  – before downloading a pre-signed S3 URL that has
+                             already expired
+  • call_timeout(default)  – caps a Gemini call timeout at the time left
+
+DeadlineExpired is never retried and is not turned into a tool "Error: ..."
+string: it propagates out of the agent so the consumer can ack the message
+as expired instead of failed.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import config
+
+log = logging.getLogger(__name__)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("job_deadline", default=None)
+
+
+class DeadlineExpired(Exception):
+    """The job ran out of time before `stage`; retrying cannot help."""
+
+    def __init__(self, stage: str, detail: str = ""):
+        self.stage = stage
+        super().__init__(f"Job deadline expired before {stage}" + (f": {detail}" if detail else ""))
+
+
+def _parse_time(value: Any) -> Optional[float]:
+    """Epoch seconds from epoch seconds/milliseconds or an ISO-8601 string."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, (int, float)) or str(value).replace(".", "", 1).isdigit():
+        seconds = float(value)
+        return seconds / 1000 if seconds > 1e11 else seconds
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            log.warning(f"Ignoring unparseable timestamp {value!r}")
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def payload_deadline(payload: Dict[str, Any]) -> Optional[float]:
+    explicit = _parse_time(payload.get("Deadline"))
+    if explicit is not None:
+        return explicit
+    enqueued_at = _parse_time(payload.get("EnqueuedAt"))
+    if enqueued_at is not None and config.JOB_DEADLINE_SECONDS > 0:
+        return enqueued_at + config.JOB_DEADLINE_SECONDS
+    return None
+
+
+def presigned_url_expiry(url: str) -> Optional[float]:
+    """Expiry of a SigV4 (X-Amz-Date + X-Amz-Expires) or SigV2 (Expires) URL."""
+    query = {k.lower(): v[0] for k, v in parse_qs(urlsplit(url or "").query).items()}
+    if "x-amz-date" in query and "x-amz-expires" in query:
+        try:
+            signed_at = datetime.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ")
+        except ValueError:
+            return None
+        return signed_at.replace(tzinfo=timezone.utc).timestamp() + int(query["x-amz-expires"])
+    if "expires" in query:
+        return _parse_time(query["expires"])
+    return None
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]):
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current job, or None when it has no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(stage: str, needed: float = config.DEADLINE_MIN_STAGE_SECONDS) -> None:
+    left = remaining()
+    if left is not None and left < needed:
+        raise DeadlineExpired(stage, f"{left:.0f}s left, {needed:g}s needed")
+
+
+def check_url(stage: str, url: str) -> None:
+    expiry = presigned_url_expiry(url)
+    if expiry is not None and expiry <= time.time():
+        raise DeadlineExpired(
+            stage, f"pre-signed URL expired {time.time() - expiry:.0f}s ago"
+        )
+
+
+def call_timeout(default: float) -> float:
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExpired("model call", f"{-left:.0f}s overdue")
+    return min(default, left)
@@ -0,0 +1,277 @@
+# document_spool.py
+
+"""
+Prefetch spool for FINANCIAL_SUMMARY documents.
+
+As soon as a FINANCIAL_SUMMARY message is accepted, task_handler hands every
+PNLSheetUrls / BalanceSheetUrls entry to document_spool.prefetch(). The PDFs
+download in the background (PREFETCH_CONCURRENCY at a time, each as parallel
+verified ranges, see ranged_download.py) while the agent is still planning,
+and are optionally uploaded to GCS (PREFETCH_UPLOAD), so:
+
+  • downloads no longer wait behind LLM reasoning steps, and
+  • a pre-signed URL that expires mid-job no longer matters once fetched.
+
+Files live on disk under SPOOL_DIR, keyed by S3 object path (pre-signed
+query strings differ between deliveries). The spool is size-capped at
+SPOOL_MAX_BYTES: a download reserves its size as soon as Content-Range
+gives it, before anything is written, and least recently used files are
+evicted to make room (with their GCS copies). GeminiFileQATool leases a file
+with fetch(), which waits for its prefetch or downloads it now, and hands it
+back with release() once extraction is over; that deletes the GCS copy, and
+a leased file is never evicted. Files that are leased or still downloading
+can hold the spool over the cap until they are released.
+A file spooled more than SPOOL_REVALIDATE_AFTER_SECONDS ago (typically by an
+earlier job) is only reused if the object's ETag is unchanged (one-byte
+Range request); otherwise it is dropped and downloaded again, so a file
+replaced under the same S3 key is never served from the spool.
+The index is in memory, so each process spools into its own SPOOL_DIR/<pid>
+directory and clears it on start.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import config
+from agent.deadlines import check_url
+from agent.model_routing import _creds
+from agent.ranged_download import download_to_file, object_etag
+from google.cloud import storage
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+
+def spool_key(url: str) -> str:
+    parts = urlsplit(url or "")
+    return hashlib.sha256(f"{parts.netloc}{parts.path}".encode()).hexdigest()[:24]
+
+
+class SpoolEntry(BaseModel):
+    key: str
+    path: str
+    size: int
+    sha256: str
+    etag: Optional[str] = None
+    gsUri: Optional[str] = None
+    fetchedAt: float
+    lastUsed: float
+
+
+class DocumentSpool:
+    def __init__(
+        self,
+        root: str = config.SPOOL_DIR,
+        max_bytes: int = config.SPOOL_MAX_BYTES,
+        concurrency: int = config.PREFETCH_CONCURRENCY,
+        upload: bool = config.PREFETCH_UPLOAD,
+    ):
+        self.root = os.path.join(root, str(os.getpid()))
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.upload = upload
+        self._entries: "OrderedDict[str, SpoolEntry]" = OrderedDict()  # LRU first
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._reserved: Dict[str, int] = {}  # key → size of a download in progress
+        self._leases: Dict[str, int] = {}  # path → callers still using the file
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket = None
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(e.size for e in self._entries.values()) + sum(self._reserved.values())
+
+    def prefetch(self, urls: Iterable[str]) -> List[asyncio.Task]:
+        """Start background downloads for URLs not spooled or in flight yet."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        started = []
+        for url in urls:
+            key = spool_key(url)
+            if not url or key in self._entries or key in self._inflight:
+                continue
+            task = asyncio.create_task(self._fetch(key, url))
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+            self._inflight[key] = task
+            started.append(task)
+        if started:
+            log.info(f"Prefetching {len(started)} document(s) into {self.root}")
+        return started
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning(f"Prefetch {key} failed: {task.exception()}")
+
+    async def get(self, url: str) -> Optional[SpoolEntry]:
+        """The spooled file for `url` (waiting for its prefetch), or None."""
+        key = spool_key(url)
+        task = self._inflight.get(key)
+        if task is not None:
+            try:
+                await asyncio.shield(task)
+            except Exception as e:
+                log.warning(f"Prefetch of {urlsplit(url).path} failed, downloading directly: {e}")
+                return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.path):
+            del self._entries[key]
+            return None
+        if task is None and not await self._still_current(url, entry):
+            log.info(f"Spooled copy of {urlsplit(url).path} is out of date; downloading it again")
+            await self._drop(entry)
+            return None
+        entry.lastUsed = time.time()
+        self._entries.move_to_end(key)
+        return entry
+
+    async def fetch(self, url: str) -> SpoolEntry:
+        """
+        Lease the spooled file for `url`, spooling it now if needed; raises when
+        the download fails. Pair every fetch() with a release().
+        """
+        key = spool_key(url)
+        while True:
+            entry = await self.get(url)
+            if entry is None:
+                self.prefetch([url])
+                task = self._inflight.get(key)
+                if task is not None:
+                    await asyncio.shield(task)
+                entry = self._entries.get(key)
+            # None only if evicted between the download and this lease: spool it again
+            if entry is not None:
+                self._leases[entry.path] = self._leases.get(entry.path, 0) + 1
+                return entry
+
+    async def release(self, entry: SpoolEntry) -> None:
+        """
+        End a lease; the last one out deletes the prefetched GCS copy, and the
+        file too if it was dropped from the index while leased.
+        """
+        left = self._leases.get(entry.path, 0) - 1
+        if left > 0:
+            self._leases[entry.path] = left
+            return
+        self._leases.pop(entry.path, None)
+        if self._entries.get(entry.key) is not entry:
+            await self._discard(entry)
+        elif entry.gsUri:
+            gs_uri, entry.gsUri = entry.gsUri, None
+            await self._delete_upload(gs_uri)
+
+    async def _still_current(self, url: str, entry: SpoolEntry) -> bool:
+        if time.time() - entry.fetchedAt < config.SPOOL_REVALIDATE_AFTER_SECONDS:
+            return True
+        if not entry.etag:
+            return False
+        try:
+            return await object_etag(url) == entry.etag
+        except Exception as e:
+            log.warning(f"Could not revalidate spooled {entry.key}: {e}")
+            return False
+
+    async def _drop(self, entry: SpoolEntry) -> None:
+        # Out of the index now; a leased file is deleted by its last release()
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        if not self._leases.get(entry.path):
+            await self._discard(entry)
+
+    async def _discard(self, entry: SpoolEntry) -> None:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        if entry.gsUri:
+            gs_uri, entry.gsUri = entry.gsUri, None
+            await self._delete_upload(gs_uri)
+
+    async def _fetch(self, key: str, url: str) -> SpoolEntry:
+        async with self._semaphore:
+            check_url("download", url)
+            # A fresh name per download, so a replaced copy never overwrites a leased one
+            path = os.path.join(self.root, f"{key}-{uuid.uuid4().hex[:8]}.pdf")
+            tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+            started = time.perf_counter()
+
+            async def reserve(size: int) -> None:
+                self._reserved[key] = size
+                await self._evict()
+
+            try:
+                result = await download_to_file(url, tmp_path, on_size=reserve)
+                os.replace(tmp_path, path)
+            finally:
+                self._reserved.pop(key, None)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            size = result.size
+
+            gs_uri = await self._upload(path) if self.upload else None
+            now = time.time()
+            entry = SpoolEntry(
+                key=key,
+                path=path,
+                size=size,
+                sha256=result.sha256,
+                etag=result.etag,
+                gsUri=gs_uri,
+                fetchedAt=now,
+                lastUsed=now,
+            )
+            self._entries[key] = entry
+            log.info(
+                f"Prefetched {urlsplit(url).path} ({size} bytes) in {time.perf_counter() - started:.1f}s"
+            )
+            await self._evict(keep=key)
+            return entry
+
+    async def _upload(self, path: str) -> str:
+        if self._bucket is None:
+            self._bucket = storage.Client(
+                credentials=_creds, project=config.PROJECT_ID
+            ).bucket(config.GCS_BUCKET)
+        object_name = f"tmp/prefetch/{uuid.uuid4()}.pdf"
+        await asyncio.to_thread(
+            self._bucket.blob(object_name).upload_from_filename,
+            path,
+            content_type="application/pdf",
+            timeout=120,
+        )
+        return f"{config.GS_URI_PREFIX}/{object_name}"
+
+    async def _delete_upload(self, gs_uri: str) -> None:
+        if self._bucket is None:
+            return
+        object_name = gs_uri.split(f"{config.GS_URI_PREFIX}/", 1)[-1]
+        try:
+            await asyncio.to_thread(self._bucket.blob(object_name).delete)
+        except Exception as e:
+            log.warning(f"Could not delete prefetched copy {gs_uri}: {e}")
+
+    async def _evict(self, keep: str = "") -> None:
+        # Least recently used first; leased files and the one just spooled (`keep`) stay
+        for key in list(self._entries):
+            if self.used_bytes <= self.max_bytes:
+                break
+            entry = self._entries.get(key)
+            if key == keep or entry is None or self._leases.get(entry.path):
+                continue
+            del self._entries[key]
+            await self._discard(entry)
+            log.info(f"Evicted {key} ({entry.size} bytes) from the document spool")
+
+
+document_spool = DocumentSpool() if config.PREFETCH_ENABLED else None
@@ -0,0 +1,153 @@
+# extraction_provenance.py
+
+"""
+Extraction provenance and incremental-extraction planning.
+
+Every persisted sheet record carries an "extractionProvenance" block
+(sourceHash, promptVersion, model). Before a document is sent to Gemini,
+we look at what is already stored for the company:
+  • same source bytes, same prompt version and model → skip the call and
+    reuse the stored records
+  • some years already stored → ask Gemini to extract only the missing
+    years and return a tiny stub for the others, which is then replaced
+    by the stored record
+"""
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import config
+from agent import prompts
+from agent.model_routing import extraction_models
+from agent.sheet_persistence import SHEET_TARGETS
+from pydantic import BaseModel, Field
+
+log = logging.getLogger(__name__)
+
+PROVENANCE_FIELD = "extractionProvenance"
+ALREADY_EXTRACTED_FLAG = "alreadyExtracted"
+_STORAGE_ONLY_FIELDS = ("_id", "createdAt", "updatedAt")
+
+
+class ExtractionPlan(BaseModel):
+    skip: bool = False
+    reused_items: List[Dict[str, Any]] = Field(default_factory=list)
+    known_years: List[str] = Field(default_factory=list)
+    stored_by_year: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+
+
+def source_hash(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def extraction_prompt(doc_type: str) -> str:
+    return (
+        prompts.BALANCE_SHEET_PROMPT
+        if doc_type == "balance-sheet"
+        else prompts.PNL_PROMPT
+    )
+
+
+def prompt_version(doc_type: str) -> str:
+    """Short content hash of the extraction prompt — changes whenever the prompt does."""
+    text = prompts.GIVE_OUTPUT_STRING + extraction_prompt(doc_type)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def year_key(value: Any) -> str:
+    return str(value)[:10]
+
+
+def build_provenance(
+    pdf_hash: str, doc_type: str, s3_url: str, model: Optional[str] = None
+) -> Dict[str, Any]:
+    parts = urlsplit(s3_url or "")
+    return {
+        "sourceHash": pdf_hash,
+        # Pre-signed query strings expire and carry credentials — keep the object path only
+        "sourceObject": f"{parts.netloc}{parts.path}",
+        "docType": doc_type,
+        "promptVersion": prompt_version(doc_type),
+        "model": model or config.VERTEX_MODEL,
+        "extractedAt": datetime.utcnow().isoformat(),
+    }
+
+
+def stored_record_as_item(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in record.items() if k not in _STORAGE_ONLY_FIELDS}
+
+
+async def plan_extraction(
+    company_gst: Optional[str],
+    doc_type: str,
+    pdf_hash: str,
+    model: Optional[str] = None,
+) -> ExtractionPlan:
+    """Decide whether a document needs a full, partial or no Gemini call."""
+    if not company_gst or doc_type not in SHEET_TARGETS:
+        return ExtractionPlan()
+
+    _, sheet_db = SHEET_TARGETS[doc_type]
+    current_version = prompt_version(doc_type)
+    # Records from any routing tier are reusable (see model_routing)
+    current_models = {model} if model else extraction_models()
+
+    reusable = [
+        record
+        for record in await sheet_db.get_sheet_data_by_gst(company_gst)
+        if (record.get(PROVENANCE_FIELD) or {}).get("promptVersion") == current_version
+        and (record.get(PROVENANCE_FIELD) or {}).get("model") in current_models
+    ]
+    same_source = [
+        record
+        for record in reusable
+        if record[PROVENANCE_FIELD].get("sourceHash") == pdf_hash
+    ]
+    if same_source:
+        log.info(
+            f"{doc_type} source {pdf_hash[:12]} already extracted for {company_gst} "
+            f"({[year_key(r.get('fiscalYearEnd')) for r in same_source]}) — skipping Gemini"
+        )
+        return ExtractionPlan(
+            skip=True, reused_items=[stored_record_as_item(r) for r in same_source]
+        )
+
+    stored_by_year = {year_key(r.get("fiscalYearEnd")): stored_record_as_item(r) for r in reusable}
+    return ExtractionPlan(
+        known_years=sorted(stored_by_year), stored_by_year=stored_by_year
+    )
+
+
+def incremental_prompt_suffix(plan: ExtractionPlan) -> str:
+    if not plan.known_years:
+        return ""
+    return prompts.INCREMENTAL_YEARS_HINT.format(
+        known_years=", ".join(plan.known_years)
+    )
+
+
+def merge_with_stored(
+    items: List[Any], plan: ExtractionPlan, provenance: Dict[str, Any]
+) -> List[Any]:
+    """
+    Replace "alreadyExtracted" stubs with the stored records and stamp
+    freshly extracted items with their provenance.
+    """
+    merged = []
+    for item in items:
+        if not isinstance(item, dict):
+            merged.append(item)
+            continue
+        if item.get(ALREADY_EXTRACTED_FLAG):
+            stored = plan.stored_by_year.get(year_key(item.get("fiscalYearEnd")))
+            if stored is not None:
+                merged.append(stored)
+            else:
+                log.warning(
+                    f"Gemini marked {item.get('fiscalYearEnd')} as already extracted but it is not stored — dropping stub"
+                )
+            continue
+        merged.append({**item, PROVENANCE_FIELD: provenance})
+    return merged
@@ -0,0 +1,256 @@
+# extraction_validation.py
+
+"""
+Local cross-validation of extracted statements.
+
+Checks the accounting identities of the BALANCE_SHEET_PROMPT / PNL_PROMPT
+schemas on the parsed JSON (every check runs across all years of a
+document in one pass). Failures name the schema section that is wrong so
+only that section has to be re-asked from Gemini.
+
+Only identities the schema can close are checked: totals whose statement
+lines have no slot in the schema (long-term provisions, other non-current
+assets, exceptional items above profit before tax) would fail on correct
+extractions, so the non-current subtotals and profit before tax are not
+checked.
+"""
+import copy
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent import prompts
+from agent.json_output import parse_json_lenient
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+# Relative tolerance for rounding in source statements, plus an absolute floor
+REL_TOLERANCE = 0.005
+ABS_TOLERANCE = 1.0
+
+# (check name, section to re-extract, total path, [component paths])
+BALANCE_SHEET_CHECKS: List[Tuple[str, str, str, List[str]]] = [
+    (
+        "shareholdersFunds total",
+        "balanceSheet.shareholdersFunds",
+        "balanceSheet.shareholdersFunds.totalShareholdersFunds",
+        [
+            "balanceSheet.shareholdersFunds.shareCapital",
+            "balanceSheet.shareholdersFunds.reservesAndSurplus",
+        ],
+    ),
+    (
+        "currentLiabilities total",
+        "balanceSheet.currentLiabilities",
+        "balanceSheet.currentLiabilities.totalCurrentLiabilities",
+        [
+            "balanceSheet.currentLiabilities.shortTermBorrowings",
+            "balanceSheet.currentLiabilities.tradePayables",
+            "balanceSheet.currentLiabilities.otherCurrentLiabilities",
+            "balanceSheet.currentLiabilities.shortTermProvisions",
+        ],
+    ),
+    (
+        "equity + liabilities",
+        "balanceSheet",
+        "balanceSheet.totalLiabilities",
+        [
+            "balanceSheet.shareholdersFunds.totalShareholdersFunds",
+            "balanceSheet.nonCurrentLiabilities.totalNonCurrentLiabilities",
+            "balanceSheet.currentLiabilities.totalCurrentLiabilities",
+        ],
+    ),
+    (
+        "currentAssets total",
+        "balanceSheet.currentAssets",
+        "balanceSheet.currentAssets.totalCurrentAssets",
+        [
+            "balanceSheet.currentAssets.currentInvestments",
+            "balanceSheet.currentAssets.inventories",
+            "balanceSheet.currentAssets.tradeReceivables",
+            "balanceSheet.currentAssets.cashAndCashEquivalents",
+            "balanceSheet.currentAssets.shortTermLoansAndAdvances",
+            "balanceSheet.currentAssets.otherCurrentAssets",
+        ],
+    ),
+    (
+        "total assets",
+        "balanceSheet",
+        "balanceSheet.totalAssets",
+        [
+            "balanceSheet.nonCurrentAssets.totalNonCurrentAssets",
+            "balanceSheet.currentAssets.totalCurrentAssets",
+        ],
+    ),
+    (
+        "assets = liabilities + equity",
+        "balanceSheet",
+        "balanceSheet.totalAssets",
+        ["balanceSheet.totalLiabilities"],
+    ),
+]
+
+# Cross-section identities: a re-ask that cannot fix these is not worth a stronger tier
+IDENTITY_CHECKS = frozenset(
+    {"equity + liabilities", "total assets", "assets = liabilities + equity", "profit after tax"}
+)
+
+# Subtracted components are prefixed with "-"
+PNL_CHECKS: List[Tuple[str, str, str, List[str]]] = [
+    (
+        "total income",
+        "profitAndLoss.income",
+        "profitAndLoss.income.totalIncome",
+        [
+            "profitAndLoss.income.revenueFromOperations",
+            "profitAndLoss.income.otherIncome",
+        ],
+    ),
+    (
+        "total expenses",
+        "profitAndLoss.expenses",
+        "profitAndLoss.expenses.totalExpenses",
+        [
+            "profitAndLoss.expenses.costOfMaterialsConsumed",
+            "profitAndLoss.expenses.purchaseOfStockInTrade",
+            "profitAndLoss.expenses.changesInInventory",
+            "profitAndLoss.expenses.employeeBenefitExpenses",
+            "profitAndLoss.expenses.financeCosts",
+            "profitAndLoss.expenses.depreciationAndAmortization",
+            "profitAndLoss.expenses.otherExpenses",
+        ],
+    ),
+    (
+        "total tax expense",
+        "profitAndLoss.profit",
+        "profitAndLoss.profit.totalTaxExpense",
+        [
+            "profitAndLoss.profit.taxExpenseCurrent",
+            "profitAndLoss.profit.taxExpenseDeferred",
+        ],
+    ),
+    (
+        "profit after tax",
+        "profitAndLoss.profit",
+        "profitAndLoss.profit.profitAfterTax",
+        [
+            "profitAndLoss.profit.profitBeforeTax",
+            "-profitAndLoss.profit.totalTaxExpense",
+        ],
+    ),
+]
+
+CHECKS = {"balance-sheet": BALANCE_SHEET_CHECKS, "pnl-sheet": PNL_CHECKS}
+
+
+class CheckFailure(BaseModel):
+    fiscalYearEnd: str
+    check: str
+    section: str
+    expected: float
+    reported: float
+
+
+def _get(item: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = item
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _within_tolerance(expected: float, reported: float) -> bool:
+    return abs(expected - reported) <= max(
+        ABS_TOLERANCE, REL_TOLERANCE * max(abs(expected), abs(reported))
+    )
+
+
+def validate_items(doc_type: str, items: List[Any]) -> List[CheckFailure]:
+    """
+    Run every identity for doc_type across all years at once. Checks whose
+    total or components are missing are skipped, not failed.
+    """
+    checks = CHECKS.get(doc_type, [])
+    years = [i for i in items if isinstance(i, dict)]
+    failures: List[CheckFailure] = []
+    for name, section, total_path, component_paths in checks:
+        totals = [_get(i, total_path) for i in years]
+        signed = [
+            (-1 if p.startswith("-") else 1, p.lstrip("-")) for p in component_paths
+        ]
+        columns = [[_get(i, path) for i in years] for _, path in signed]
+        for idx, item in enumerate(years):
+            reported = totals[idx]
+            parts = [column[idx] for column in columns]
+            if reported is None or all(p is None for p in parts):
+                continue
+            expected = sum(
+                sign * (p or 0) for (sign, _), p in zip(signed, parts)
+            )
+            if not _within_tolerance(expected, reported):
+                failures.append(
+                    CheckFailure(
+                        fiscalYearEnd=str(item.get("fiscalYearEnd")),
+                        check=name,
+                        section=section,
+                        expected=round(expected, 2),
+                        reported=reported,
+                    )
+                )
+    return failures
+
+
+def identity_failures_only(failures: List[CheckFailure]) -> bool:
+    return all(f.check in IDENTITY_CHECKS for f in failures)
+
+
+def failing_sections(failures: List[CheckFailure]) -> List[str]:
+    # The most specific section first; a parent section covers its children
+    sections = sorted({f.section for f in failures}, key=len)
+    return [
+        s for s in sections if not any(s.startswith(p + ".") for p in sections if p != s)
+    ]
+
+
+def section_reextraction_prompt(doc_type: str, failures: List[CheckFailure]) -> str:
+    details = "\n".join(
+        f"- {f.fiscalYearEnd}: {f.check} — components add up to {f.expected}, extracted total is {f.reported}"
+        for f in failures
+    )
+    return prompts.SECTION_REEXTRACTION_PROMPT.format(
+        statement="Balance Sheet" if doc_type == "balance-sheet" else "Statement of Profit & Loss",
+        sections=", ".join(failing_sections(failures)),
+        years=", ".join(sorted({f.fiscalYearEnd for f in failures})),
+        failures=details,
+    )
+
+
+def _deep_update(target: Dict[str, Any], patch: Dict[str, Any]):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_update(target[key], value)
+        else:
+            target[key] = value
+
+
+def apply_section_patch(items: List[Any], patch_text: str) -> List[Any]:
+    """Overlay re-extracted sections onto the matching fiscal years."""
+    patches = parse_json_lenient(patch_text)
+    if patches is None:
+        log.warning("Section re-extraction did not return JSON; keeping original values")
+        return items
+    if isinstance(patches, dict):
+        patches = [patches]
+
+    patched = copy.deepcopy(items)
+    by_year = {
+        str(i.get("fiscalYearEnd"))[:10]: i for i in patched if isinstance(i, dict)
+    }
+    for patch in patches if isinstance(patches, list) else []:
+        if not isinstance(patch, dict):
+            continue
+        target = by_year.get(str(patch.get("fiscalYearEnd"))[:10])
+        if target is not None:
+            _deep_update(target, {k: v for k, v in patch.items() if k != "fiscalYearEnd"})
+    return patched
@@ -1,7 +1,9 @@
 import logging
 from typing import List
 
-from agent import summarizer as summarizer_module
+import config
+from agent.deadlines import DeadlineExpired
+from agent.model_routing import chat_model
 from agent.llm_tools import (
     FinancialSummarizerTool,
     GeminiFileQATool,
@@ -21,8 +23,13 @@ class FinancialAgentInput(BaseModel):
     company_gst: str
 
 
-agent_llm = summarizer_module._summary_llm
-tools = [GeminiFileQATool(), PersistFinancialDataTool(), FinancialSummarizerTool()]
+# Free-text ReAct steps — not the JSON-mode summary model
+agent_llm = chat_model(config.MODEL_TIER_ORCHESTRATION)
+tools = [
+    GeminiFileQATool(return_artifact_handle=True),
+    PersistFinancialDataTool(),
+    FinancialSummarizerTool(),
+]
 
 prompt = hub.pull("hwchase17/react")
 
@@ -42,27 +49,28 @@ prompt.template = """You are an expert financial analyst agent. Your purpose is
 1.  **EXTRACT:** You will be given JSON lists of S3 URLs for PNL and Balance Sheet documents. You must process EACH URL from both lists using the `FinancialDocumentExtractor` tool.
     - For PNL URLs, set `doc_type` to "pnl-sheet".
     - For Balance Sheet URLs, set `doc_type` to "balance-sheet".
-    - Collect all JSON data returned by the tool. If you get an error, retry once.
+    - Always pass `company_gst` so years that were already extracted are reused.
+    - The tool stores the extracted data and returns a short reference such as
+      {{"artifact": "artifact://3f2a...", "doc_type": "pnl-sheet", "fiscalYears": [...]}}.
+      Collect the "artifact" handle for each document. **Never copy the extracted JSON yourself.** If you get an error, retry once.
 2.  **PERSIST:** After successfully extracting data from ALL documents, you MUST use the `PersistFinancialDataTool` ONCE.
-    - Combine all extracted PNL JSON objects into a single JSON array string.
-    - Combine all extracted Balance Sheet JSON objects into a single JSON array string.
+    - Put all PNL artifact handles into a single JSON array string.
+    - Put all Balance Sheet artifact handles into a single JSON array string.
     - Pass these arrays and other required IDs to the tool.
     -**PERSIST step – required Action Input**
     ```json
     Action: PersistFinancialDataTool
-    Action Input: {{"pnl_json_list_str": "[{{...}}]",       // ← PNL array **as a string**
-                "bs_json_list_str" : "[{{...}}]",       // ← BS array **as a string**
+    Action Input: {{"pnl_json_list_str": "[\\"artifact://...\\"]",   // ← PNL handles **as a string**
+                "bs_json_list_str" : "[\\"artifact://...\\"]",   // ← BS handles **as a string**
                 "application_id"   : "ApplicationId",
                 "company_gst"      : "GstNumber"}}
 3.  **SUMMARIZE:** After the data has been persisted successfully, you MUST use the `FinancialSummarizerTool` ONCE to generate the final report.
-    - Combine all extracted PNL JSON objects into a single JSON array string.
-    - Combine all extracted Balance Sheet JSON objects into a single JSON array string.
-    - Pass these arrays and the application ID to the tool.
+    - Pass the same PNL and Balance Sheet handle arrays and the application ID to the tool.
     -**SUMMARIZE step – required Action Input**
     ```json
     Action: FinancialSummarizerTool
-    Action Input: {{"pnl_json_list_str": "[{{...}}]",       // ← PNL array **as a string**
-                "bs_json_list_str" : "[{{...}}]",       // ← BS array **as a string**
+    Action Input: {{"pnl_json_list_str": "[\\"artifact://...\\"]",   // ← PNL handles **as a string**
+                "bs_json_list_str" : "[\\"artifact://...\\"]",   // ← BS handles **as a string**
                 "application_id"   : "ApplicationId"}}
 
 **IMPORTANT NOTE ON FORMATTING:**
@@ -71,7 +79,7 @@ When calling a tool, always pass the `Action Input` as a valid **JSON object**,
 
 ✅ Correct:
 Action: gemini_pdf_extractor  
-Action Input: {{"s3_url": "https://example.com/sample.pdf", "doc_type": "pnl-sheet"}}
+Action Input: {{"s3_url": "https://example.com/sample.pdf", "doc_type": "pnl-sheet", "company_gst": "GstNumber"}}
 
 ❌ Incorrect:
 Action Input: "s3_url": "\"s3_url\": \"https://example.com/sample.pdf\", \"doc_type\": \"pnl-sheet\""
@@ -144,6 +152,8 @@ async def run_financial_agent(
             f"Agent for AppID {application_id} finished. Final Answer: {final_answer}"
         )
         return final_answer
+    except DeadlineExpired:
+        raise
     except Exception as e:
         log.exception(
             f"CRITICAL: Agent execution failed for AppID {application_id}. Error: {e}"
@@ -0,0 +1,159 @@
+# fiscal_year_merge.py
+
+"""
+Merge and de-duplicate extracted fiscal years before persistence/summary.
+
+When several PDFs cover overlapping years (e.g. FY24 report with FY23
+comparatives + FY23 report), each (doc_type, fiscalYearEnd) must end up as
+exactly one record. Sources are ranked deterministically:
+
+  1. audited sources first ("audited": true on the item or its provenance)
+  2. the source whose own latest fiscal year is newer — a later report's
+     comparatives reflect restatements and final audit adjustments
+  3. the more recent extraction (extractionProvenance.extractedAt)
+  4. the later document in the input order
+
+The best-ranked record is the base; missing/null fields are filled field by
+field from lower-ranked sources, and differing values are reported as
+conflicts (the base value is kept).
+"""
+import copy
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+# Differences in these keys are expected and never reported as conflicts
+_NON_CONFLICT_KEYS = {"summary", "extractionProvenance", "companyGst"}
+
+
+class FiscalYearConflict(BaseModel):
+    docType: str
+    fiscalYearEnd: str
+    field: str
+    keptValue: Any
+    discardedValue: Any
+    keptSource: int
+    discardedSource: int
+
+
+def _year_key(value: Any) -> str:
+    return str(value)[:10]
+
+
+def _is_audited(item: Dict[str, Any]) -> bool:
+    provenance = item.get("extractionProvenance") or {}
+    return bool(item.get("audited") or provenance.get("audited"))
+
+
+def _documents(data_list_outer: Any) -> Tuple[List[List[Dict[str, Any]]], List[Any]]:
+    """
+    One list of items per source document (bare objects are their own
+    source), plus the entries that are not objects at all.
+    """
+    if not isinstance(data_list_outer, list):
+        data_list_outer = [data_list_outer]
+    documents, malformed = [], []
+    for entry in data_list_outer:
+        items = entry if isinstance(entry, list) else [entry]
+        documents.append([i for i in items if isinstance(i, dict)])
+        malformed.extend(i for i in items if not isinstance(i, dict))
+    return documents, malformed
+
+
+def _source_rank(doc_index: int, items: List[Dict[str, Any]]) -> Tuple:
+    latest_year = max((_year_key(i.get("fiscalYearEnd")) for i in items), default="")
+    extracted_at = max(
+        ((i.get("extractionProvenance") or {}).get("extractedAt") or "" for i in items),
+        default="",
+    )
+    return (any(_is_audited(i) for i in items), latest_year, extracted_at, doc_index)
+
+
+def _fill(
+    base: Dict[str, Any],
+    other: Dict[str, Any],
+    path: str,
+    on_conflict,
+):
+    for key, other_value in other.items():
+        field = f"{path}.{key}" if path else key
+        if key not in base or base[key] is None:
+            base[key] = copy.deepcopy(other_value)
+        elif isinstance(base[key], dict) and isinstance(other_value, dict):
+            _fill(base[key], other_value, field, on_conflict)
+        elif (
+            other_value is not None
+            and other_value != base[key]
+            and key not in _NON_CONFLICT_KEYS
+        ):
+            on_conflict(field, base[key], other_value)
+
+
+def merge_fiscal_years(
+    doc_type: str, data_list_outer: Any
+) -> Tuple[List[Dict[str, Any]], List[FiscalYearConflict]]:
+    """
+    Returns (merged items newest year first, conflicts).
+    Items without a fiscalYearEnd, and entries that are not objects, are
+    passed through untouched so persistence reports them as invalid.
+    """
+    documents, malformed = _documents(data_list_outer)
+    if malformed:
+        log.warning(f"{doc_type}: {len(malformed)} non-object item(s) passed through unmerged")
+    ranks = {idx: _source_rank(idx, items) for idx, items in enumerate(documents)}
+
+    by_year: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    undated = []
+    for doc_index, items in enumerate(documents):
+        for item in items:
+            if item.get("fiscalYearEnd") in (None, ""):
+                undated.append(item)
+                continue
+            by_year.setdefault(_year_key(item["fiscalYearEnd"]), []).append(
+                (doc_index, item)
+            )
+
+    merged: List[Dict[str, Any]] = []
+    conflicts: List[FiscalYearConflict] = []
+    for year in sorted(by_year, reverse=True):
+        candidates = sorted(by_year[year], key=lambda c: ranks[c[0]], reverse=True)
+        base_source, base_item = candidates[0]
+        record = copy.deepcopy(base_item)
+        for other_source, other_item in candidates[1:]:
+            _fill(
+                record,
+                other_item,
+                "",
+                lambda field, kept, discarded, src=other_source: conflicts.append(
+                    FiscalYearConflict(
+                        docType=doc_type,
+                        fiscalYearEnd=year,
+                        field=field,
+                        keptValue=kept,
+                        discardedValue=discarded,
+                        keptSource=base_source,
+                        discardedSource=src,
+                    )
+                ),
+            )
+        merged.append(record)
+
+    if conflicts:
+        log.warning(
+            f"{doc_type}: {len(conflicts)} conflicting value(s) across overlapping sources; kept best-ranked source"
+        )
+    return merged + undated + malformed, conflicts
+
+
+def describe_conflicts(conflicts: List[FiscalYearConflict], limit: int = 10) -> str:
+    lines = [
+        f"{c.docType} {c.fiscalYearEnd} {c.field}: kept {c.keptValue} (doc {c.keptSource}), "
+        f"dropped {c.discardedValue} (doc {c.discardedSource})"
+        for c in conflicts[:limit]
+    ]
+    if len(conflicts) > limit:
+        lines.append(f"... {len(conflicts) - limit} more")
+    return "; ".join(lines)
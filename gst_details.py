@@ -5,8 +5,8 @@ from database.database_config import NetworkConnections
 
 class GSTDetailsDatabase:
     def __init__(self, connection: NetworkConnections):
-        self.db = connection.get_mongo_db()
+        self.db = connection.get_async_mongo_db()
         self.collection = self.db["gstDetails"]
 
     async def get_gst_details_by_number(self, gst_number: str):
-        return self.collection.find_one({"gstNumber": gst_number})
+        return await self.collection.find_one({"gstNumber": gst_number})
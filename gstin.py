@@ -0,0 +1,167 @@
+# gstin.py
+
+"""
+Local GSTIN validation and decoding.
+
+A GSTIN is 15 characters:
+  • 2  – state code (see GST_STATE_CODES)
+  • 10 – PAN of the taxpayer
+  • 1  – entity number for the same PAN within the state (1-9, A-Z)
+  • 1  – "Z" by default
+  • 1  – mod-36 checksum over the first 14 characters
+
+Everything here is pure Python so malformed numbers can be rejected before
+we spend an ALL_MIGHT API call or a Gemini call on them.
+"""
+import re
+from typing import Optional
+
+from pydantic import BaseModel
+
+GST_STATE_CODES = {
+    "01": "Jammu and Kashmir",
+    "02": "Himachal Pradesh",
+    "03": "Punjab",
+    "04": "Chandigarh",
+    "05": "Uttarakhand",
+    "06": "Haryana",
+    "07": "Delhi",
+    "08": "Rajasthan",
+    "09": "Uttar Pradesh",
+    "10": "Bihar",
+    "11": "Sikkim",
+    "12": "Arunachal Pradesh",
+    "13": "Nagaland",
+    "14": "Manipur",
+    "15": "Mizoram",
+    "16": "Tripura",
+    "17": "Meghalaya",
+    "18": "Assam",
+    "19": "West Bengal",
+    "20": "Jharkhand",
+    "21": "Odisha",
+    "22": "Chhattisgarh",
+    "23": "Madhya Pradesh",
+    "24": "Gujarat",
+    "25": "Daman and Diu",
+    "26": "Dadra and Nagar Haveli and Daman and Diu",
+    "27": "Maharashtra",
+    "28": "Andhra Pradesh (Old)",
+    "29": "Karnataka",
+    "30": "Goa",
+    "31": "Lakshadweep",
+    "32": "Kerala",
+    "33": "Tamil Nadu",
+    "34": "Puducherry",
+    "35": "Andaman and Nicobar Islands",
+    "36": "Telangana",
+    "37": "Andhra Pradesh",
+    "38": "Ladakh",
+    "97": "Other Territory",
+    "99": "Centre Jurisdiction",
+}
+
+# 4th character of a PAN identifies the holder type
+PAN_HOLDER_TYPES = {
+    "A": "Association of Persons",
+    "B": "Body of Individuals",
+    "C": "Company",
+    "F": "Firm / LLP",
+    "G": "Government",
+    "H": "Hindu Undivided Family",
+    "J": "Artificial Juridical Person",
+    "L": "Local Authority",
+    "P": "Individual",
+    "T": "Trust",
+}
+
+_GSTIN_RE = re.compile(r"^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]$")
+_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class GSTINValidationError(ValueError):
+    """Raised when a GSTIN fails local format, state, PAN or checksum checks."""
+
+
+class GSTINDetails(BaseModel):
+    gstin: str
+    stateCode: str
+    stateName: str
+    pan: str
+    panHolderType: str
+    entityNumber: str
+    checksum: str
+
+
+def normalise_gstin(gstin: Optional[str]) -> str:
+    return (gstin or "").strip().upper()
+
+
+def gstin_checksum(first_14: str) -> str:
+    """
+    Mod-36 check character for the first 14 characters of a GSTIN.
+    Odd positions weigh 1, even positions weigh 2; each product is folded
+    back into base 36 (quotient + remainder) before summing.
+    """
+    total = 0
+    for idx, char in enumerate(first_14):
+        product = _CHARSET.index(char) * (2 if idx % 2 else 1)
+        total += product // 36 + product % 36
+    return _CHARSET[(36 - total % 36) % 36]
+
+
+def validate_gstin(gstin: Optional[str]) -> str:
+    """
+    Validate a GSTIN locally and return it normalised (stripped, upper-case).
+
+    Raises:
+        GSTINValidationError: if the number is malformed.
+    """
+    value = normalise_gstin(gstin)
+    if not value:
+        raise GSTINValidationError("GST number missing")
+    if len(value) != 15:
+        raise GSTINValidationError(
+            f"GST number {value!r} must be 15 characters, got {len(value)}"
+        )
+    if not _GSTIN_RE.match(value):
+        raise GSTINValidationError(f"GST number {value!r} has an invalid format")
+    if value[:2] not in GST_STATE_CODES:
+        raise GSTINValidationError(
+            f"GST number {value!r} has an unknown state code {value[:2]!r}"
+        )
+    if value[5] not in PAN_HOLDER_TYPES:
+        raise GSTINValidationError(
+            f"GST number {value!r} embeds a PAN with unknown holder type {value[5]!r}"
+        )
+    expected = gstin_checksum(value[:14])
+    if value[14] != expected:
+        raise GSTINValidationError(
+            f"GST number {value!r} failed checksum (expected {expected!r})"
+        )
+    return value
+
+
+def is_valid_gstin(gstin: Optional[str]) -> bool:
+    try:
+        validate_gstin(gstin)
+    except GSTINValidationError:
+        return False
+    return True
+
+
+def decode_gstin(gstin: Optional[str]) -> GSTINDetails:
+    """
+    Validate and split a GSTIN into its state, PAN and entity components.
+    """
+    value = validate_gstin(gstin)
+    pan = value[2:12]
+    return GSTINDetails(
+        gstin=value,
+        stateCode=value[:2],
+        stateName=GST_STATE_CODES[value[:2]],
+        pan=pan,
+        panHolderType=PAN_HOLDER_TYPES[pan[3]],
+        entityNumber=value[12],
+        checksum=value[14],
+    )
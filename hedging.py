@@ -0,0 +1,193 @@
+# hedging.py
+
+"""
+Deadlines and hedged requests for Gemini calls.
+
+hedged_call() runs the primary attempt under a hard deadline. If it has not
+finished after the observed p95 latency for that call type, a duplicate
+(hedge) attempt is started — optionally on another model tier — and the
+first *valid* result wins. Latency is tracked per key, and a hedge on
+another tier records its own key (hedge_key), so a fast or slow hedge tier
+does not skew the primary's p95.
+
+Hedges are rate-capped by a token bucket: every primary call earns
+GEMINI_HEDGE_MAX_RATIO of a token (up to GEMINI_HEDGE_BURST), every hedge
+spends one, so hedges can never exceed that share of traffic.
+
+Attempts run in worker threads (the Vertex SDK is blocking); a losing or
+timed-out attempt is abandoned, not interrupted, and its result is dropped.
+
+The deadline is also capped at the time left for the job (agent/deadlines.py);
+running out of job time raises DeadlineExpired instead.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import config
+from agent.deadlines import DeadlineExpired, call_timeout
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 200
+
+
+class GeminiDeadlineExceeded(TimeoutError):
+    """No valid Gemini result arrived before the call deadline."""
+
+
+class HedgeStats(BaseModel):
+    calls: int = 0
+    hedged: int = 0
+    hedgeWins: int = 0
+    budgetDenied: int = 0
+    deadlineExceeded: int = 0
+
+
+class LatencyTracker:
+    """Rolling latency samples per call type."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < config.GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(pct * len(samples)))]
+
+
+class HedgeBudget:
+    """Token bucket capping hedges at max_ratio of primary calls."""
+
+    def __init__(
+        self,
+        max_ratio: float = config.GEMINI_HEDGE_MAX_RATIO,
+        burst: float = config.GEMINI_HEDGE_BURST,
+    ):
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.max_ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget()
+hedge_stats = HedgeStats()
+
+
+def hedge_delay(key: str) -> Optional[float]:
+    """Seconds to wait before hedging, or None while there is no p95 yet."""
+    p95 = latency_tracker.percentile(key, 0.95)
+    if p95 is None:
+        return None
+    return max(p95, config.GEMINI_HEDGE_MIN_DELAY_SECONDS)
+
+
+async def _timed(key: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+    started = time.perf_counter()
+    result = await attempt()
+    latency_tracker.record(key, time.perf_counter() - started)
+    return result
+
+
+async def hedged_call(
+    key: str,
+    primary: Callable[[], Awaitable[Any]],
+    hedge: Optional[Callable[[], Awaitable[Any]]] = None,
+    timeout: float = config.GEMINI_CALL_TIMEOUT_SECONDS,
+    is_valid: Callable[[Any], bool] = lambda result: result is not None,
+    hedge_key: Optional[str] = None,
+) -> Any:
+    """
+    Run primary() with a deadline of `timeout` seconds and, when enabled and
+    the budget allows, a hedge() after the p95 delay of `key`; the hedge's
+    latency is recorded under `hedge_key` (default `key`). Returns the first valid
+    result; if every attempt fails, the last error (or invalid result) is
+    returned/raised. Raises GeminiDeadlineExceeded when time runs out, or
+    DeadlineExpired when it was the job deadline that cut the call short.
+    """
+    call_limit = timeout
+    timeout = call_timeout(call_limit)
+    deadline = time.monotonic() + timeout
+    hedge_stats.calls += 1
+    hedge_budget.earn()
+
+    tasks = {asyncio.create_task(_timed(key, primary)): "primary"}
+    delay = hedge_delay(key) if config.GEMINI_HEDGING_ENABLED and hedge else None
+    fallback: Any = None
+    error: Optional[BaseException] = None
+
+    try:
+        while tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining
+            if delay is not None:
+                wait_for = min(remaining, max(0.0, delay - (timeout - remaining)))
+            done, _ = await asyncio.wait(
+                tasks, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if not done and delay is not None:
+                # Primary is past the p95 mark — hedge once, if the budget allows
+                delay = None
+                if hedge_budget.try_spend():
+                    hedge_stats.hedged += 1
+                    log.info(f"Hedging slow Gemini call {key} after {timeout - remaining:.1f}s")
+                    tasks[asyncio.create_task(_timed(hedge_key or key, hedge))] = "hedge"
+                else:
+                    hedge_stats.budgetDenied += 1
+                    log.info(f"Hedge budget exhausted; not hedging {key}")
+                continue
+
+            for task in done:
+                label = tasks.pop(task)
+                if task.exception() is not None:
+                    error = task.exception()
+                    log.warning(f"Gemini {label} attempt for {key} failed: {error}")
+                    continue
+                result = task.result()
+                if is_valid(result):
+                    if label == "hedge":
+                        hedge_stats.hedgeWins += 1
+                    return result
+                fallback = result
+                log.warning(f"Gemini {label} attempt for {key} returned an invalid result")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if tasks or (fallback is None and error is None):
+        hedge_stats.deadlineExceeded += 1
+        if timeout < call_limit:
+            raise DeadlineExpired(f"Gemini call {key}", f"cut short after {timeout:.0f}s")
+        raise GeminiDeadlineExceeded(
+            f"Gemini call {key} exceeded its {timeout:g}s deadline"
+        )
+    if fallback is not None:
+        return fallback
+    raise error
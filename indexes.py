@@ -0,0 +1,170 @@
+# indexes.py
+
+"""
+Required indexes for the centralKyc collections, an idempotent builder and
+explain() checks on the hot queries.
+
+    python -m database.indexes            # build missing indexes, then check plans
+    python -m database.indexes --check    # only run the query-plan checks
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+import config
+from database.database_config import NetworkConnections
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+log = logging.getLogger(__name__)
+
+# collection → indexes it must have
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "gstDetails": [
+        IndexModel([("gstNumber", ASCENDING)], name="gstNumber_1"),
+    ],
+    "balanceSheetData": [
+        IndexModel(
+            [("companyGst", ASCENDING), ("fiscalYearEnd", DESCENDING)],
+            name="companyGst_1_fiscalYearEnd_-1",
+            unique=True,
+        ),
+    ],
+    "profitAndLossSheetData": [
+        IndexModel(
+            [("companyGst", ASCENDING), ("fiscalYearEnd", DESCENDING)],
+            name="companyGst_1_fiscalYearEnd_-1",
+            unique=True,
+        ),
+    ],
+    "losApplicationTracker": [
+        IndexModel([("identifier", ASCENDING)], name="identifier_1", unique=True),
+    ],
+    "extractionArtifacts": [
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+    ],
+    "financialSummaryJobs": [
+        IndexModel([("applicationId", ASCENDING)], name="applicationId_1", unique=True),
+        IndexModel(
+            [("updatedAt", ASCENDING)],
+            name="updatedAt_ttl",
+            expireAfterSeconds=config.JOB_STATE_TTL_SECONDS,
+        ),
+    ],
+}
+
+# collection → representative filters of the queries we run on every job
+HOT_QUERIES: Dict[str, List[Dict[str, Any]]] = {
+    "gstDetails": [{"gstNumber": "00AAAAA0000A0Z0"}],
+    "balanceSheetData": [
+        {"companyGst": "00AAAAA0000A0Z0", "fiscalYearEnd": "2024-03-31"},
+        {"companyGst": "00AAAAA0000A0Z0"},
+    ],
+    "profitAndLossSheetData": [
+        {"companyGst": "00AAAAA0000A0Z0", "fiscalYearEnd": "2024-03-31"},
+        {"companyGst": "00AAAAA0000A0Z0"},
+    ],
+    "losApplicationTracker": [{"identifier": "000000000000000000000000"}],
+    "financialSummaryJobs": [{"applicationId": "000000000000000000000000"}],
+}
+
+# Server codes for "an index with this name/key already exists but differs"
+_INDEX_CONFLICT_CODES = {85, 86}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every index in REQUIRED_INDEXES that is missing. Safe to run on
+    every start: existing identical indexes are a no-op, and conflicting
+    definitions are logged instead of dropped.
+    """
+    created: Dict[str, List[str]] = {}
+    for collection_name, index_models in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        for index_model in index_models:
+            name = index_model.document["name"]
+            try:
+                await collection.create_indexes([index_model])
+                created.setdefault(collection_name, []).append(name)
+            except OperationFailure as e:
+                if e.code in _INDEX_CONFLICT_CODES:
+                    log.warning(
+                        f"Index {collection_name}.{name} conflicts with an existing index, leaving it as is: {e}"
+                    )
+                else:
+                    log.error(f"Could not build index {collection_name}.{name}: {e}")
+    log.info(f"Indexes ensured: {created}")
+    return created
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def check_query_plans(db) -> List[Dict[str, Any]]:
+    """
+    explain() every hot query and warn about the ones that would fall back to
+    a collection scan.
+    """
+    report = []
+    for collection_name, filters in HOT_QUERIES.items():
+        for query in filters:
+            explain = await db[collection_name].find(query).explain()
+            winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+            stages = _plan_stages(winning_plan)
+            collscan = "COLLSCAN" in stages
+            report.append(
+                {
+                    "collection": collection_name,
+                    "query": sorted(query),
+                    "stages": stages,
+                    "collscan": collscan,
+                }
+            )
+            if collscan:
+                log.warning(
+                    f"Query on {collection_name} by {sorted(query)} uses a COLLSCAN (plan: {stages})"
+                )
+            else:
+                log.info(f"Query on {collection_name} by {sorted(query)} → {stages}")
+    return report
+
+
+async def run(check_only: bool = False) -> bool:
+    """Returns True when no hot query needs a collection scan."""
+    connection = NetworkConnections()
+    db = connection.get_async_mongo_db()
+    try:
+        if not check_only:
+            await ensure_indexes(db)
+        report = await check_query_plans(db)
+        return not any(r["collscan"] for r in report)
+    finally:
+        await connection.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="centralKyc index management")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only run explain() on the hot queries; do not build indexes",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s │ %(levelname)-8s │ %(message)s",
+    )
+    args = parse_args()
+    ok = asyncio.run(run(check_only=args.check))
+    raise SystemExit(0 if ok else 1)
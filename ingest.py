@@ -6,27 +6,21 @@ import asyncio
 import json
 from typing import Dict, List
 
-from database.balance_sheet_data import BalanceSheetDataDatabase
-from database.database_config import NetworkConnections
-from database.pnl_sheet_data import ProfitAndLossSheetDatabase
 from langchain.tools import Tool
-from models.balance_sheet import BalanceSheetData as ModelBalanceSheetData
-from models.pnl_sheet import ProfitAndLossSheetData as ModelPnLSheetData
-from pydantic import ValidationError
 
 from . import prompts
+from .fiscal_year_merge import describe_conflicts, merge_fiscal_years
 from .llm_tools import GeminiFileQATool
+from .sheet_persistence import persist_sheet_items
 
 _extractor = GeminiFileQATool()
-_db_connection = NetworkConnections()  # Instantiate NetworkConnections once
-_balance_sheet_db = BalanceSheetDataDatabase(_db_connection)
-_pnl_sheet_db = ProfitAndLossSheetDatabase(_db_connection)
 
 
 async def process_documents(
     docs: List[Dict[str, str]], companyGst: str
 ) -> Dict[str, list]:
-    results = {"balance-sheet": [], "pnl-sheet": []}
+    # One list of extracted items per source document, merged per year below
+    documents = {"balance-sheet": [], "pnl-sheet": []}
 
     for d in docs:
         doc_type = d.get("doc_type")
@@ -36,8 +30,10 @@ async def process_documents(
             print(f"Skipping document due to missing 'doc_type' or 's3_url': {d}")
             continue
 
-        # Use asyncio.to_thread for synchronous blocking calls in async code
-        raw_json = await asyncio.to_thread(_extractor._run, s3_url, doc_type)
+        # Async path: passing companyGst lets the extractor skip years already stored
+        raw_json = await _extractor._arun(
+            s3_url=s3_url, doc_type=doc_type, company_gst=companyGst
+        )
 
         current_doc_data_items = []
         try:
@@ -52,39 +48,7 @@ async def process_documents(
                 )
                 continue
 
-            results[doc_type].extend(
-                current_doc_data_items
-            )  # Accumulate for function's return value
-
-            # Persistence logic moved inside the loop for each document's data
-            for item_data in current_doc_data_items:
-                try:
-                    if doc_type == "balance-sheet":
-                        balance_sheet_item = ModelBalanceSheetData(**item_data)
-                        balance_sheet_item.companyGst = companyGst
-                        await _balance_sheet_db.upsert_sheet_data(balance_sheet_item)
-                        print(
-                            f"Successfully upserted balance sheet data for {balance_sheet_item.companyGst} - {balance_sheet_item.fiscalYearEnd}"
-                        )
-                    elif doc_type == "pnl-sheet":
-                        pnl_sheet_item = ModelPnLSheetData(**item_data)
-                        pnl_sheet_item.companyGst = companyGst
-                        await _pnl_sheet_db.upsert_sheet_data(pnl_sheet_item)
-                        print(
-                            f"Successfully upserted PnL sheet data for {pnl_sheet_item.companyGst} - {pnl_sheet_item.fiscalYearEnd}"
-                        )
-                    else:
-                        print(
-                            f"Unsupported document type for persistence: {doc_type} for {s3_url}"
-                        )
-                except ValidationError as e_val:
-                    print(
-                        f"Pydantic validation error for {doc_type} from {s3_url} with data {item_data}: {e_val}"
-                    )
-                except Exception as e_persist:
-                    print(
-                        f"Error persisting {doc_type} data for {s3_url} with data {item_data}: {e_persist}"
-                    )
+            documents[doc_type].append(current_doc_data_items)
 
         except json.JSONDecodeError as e:
             print(
@@ -95,4 +59,29 @@ async def process_documents(
             print(f"An unexpected error occurred processing document {s3_url}: {e}")
             continue
 
+    results = {}
+    for doc_type, doc_items in documents.items():
+        results[doc_type], conflicts = merge_fiscal_years(doc_type, doc_items)
+        if conflicts:
+            print(
+                f"Resolved {len(conflicts)} conflicting {doc_type} values: {describe_conflicts(conflicts)}"
+            )
+
+    # One validated bulk_write per collection for the whole application
+    for doc_type in ("balance-sheet", "pnl-sheet"):
+        try:
+            report = await persist_sheet_items(doc_type, results[doc_type], companyGst)
+        except Exception as e_persist:
+            print(f"Error persisting {doc_type} data for {companyGst}: {e_persist}")
+            continue
+        for r in report:
+            if r["status"] in ("inserted", "updated"):
+                print(
+                    f"Successfully upserted {doc_type} data for {r['companyGst']} - {r['fiscalYearEnd']}"
+                )
+            else:
+                print(
+                    f"Could not persist {doc_type} item {r['index']} for {companyGst} ({r['status']}): {r['error']}"
+                )
+
     return results
@@ -0,0 +1,280 @@
+# job_state.py
+
+"""
+Per-job stage checkpoints for FINANCIAL_SUMMARY.
+
+One document per ApplicationId in "financialSummaryJobs" records how far a
+job got, so a retry, a Kafka redelivery or a worker restart resumes instead
+of re-downloading and re-extracting every PDF:
+
+    received → downloaded → extracted (per document) → persisted
+             → summarized → trackerUpdated
+
+The handler opens the job with FinancialJobStore.start() and runs the agent
+inside job_context(); the tools read it with current_job():
+  • GeminiFileQATool     – returns stored items for an extracted document
+                           whose content is unchanged (same ETag, or same
+                           SHA-256 once downloaded)
+  • PersistFinancialDataTool – skips an identical, already persisted payload
+  • create_summary       – reuses a summary generated for the same data
+A job whose inputs (set of document objects) changed starts over. A
+finished job's summary is returned without rerunning only for redeliveries
+within JOB_REDELIVERY_WINDOW_SECONDS of it being produced; later requests
+rerun the agent, which still skips whatever the content checks above allow.
+Old jobs expire through a TTL index on updatedAt (JOB_STATE_TTL_SECONDS, see
+indexes.py); JOB_STATE_ENABLED=false turns checkpointing off.
+"""
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import config
+from database.database_config import NetworkConnections
+
+log = logging.getLogger(__name__)
+
+JOB_COLLECTION = "financialSummaryJobs"
+
+STAGES = (
+    "received",
+    "downloaded",
+    "extracted",
+    "persisted",
+    "summarized",
+    "trackerUpdated",
+)
+
+_current_job: ContextVar[Optional["FinancialJob"]] = ContextVar(
+    "financial_job", default=None
+)
+
+
+def data_hash(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def document_key(doc_type: str, s3_url: str) -> str:
+    # Pre-signed query strings change between deliveries; the object path does not
+    parts = urlsplit(s3_url or "")
+    return hashlib.sha256(f"{doc_type}|{parts.netloc}{parts.path}".encode()).hexdigest()[:24]
+
+
+def current_job() -> Optional["FinancialJob"]:
+    return _current_job.get()
+
+
+class FinancialJob:
+    def __init__(self, store: "FinancialJobStore", doc: Dict[str, Any]):
+        self._store = store
+        self.doc = doc
+
+    @property
+    def application_id(self) -> str:
+        return self.doc["applicationId"]
+
+    @property
+    def stage(self) -> str:
+        return self.doc.get("stage", "received")
+
+    def reached(self, stage: str) -> bool:
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+    @property
+    def completed(self) -> bool:
+        return self.reached("trackerUpdated")
+
+    @property
+    def summary_text(self) -> Optional[str]:
+        return (self.doc.get("summary") or {}).get("text")
+
+    def recent_summary(self, window: float = config.JOB_REDELIVERY_WINDOW_SECONDS) -> Optional[str]:
+        """The stored summary if it was produced less than `window` seconds ago."""
+        summary = self.doc.get("summary") or {}
+        produced_at = summary.get("at")
+        if not summary.get("text") or produced_at is None:
+            return None
+        if datetime.utcnow() - produced_at > timedelta(seconds=window):
+            return None
+        return summary["text"]
+
+    async def _advance(self, stage: str, fields: Dict[str, Any]) -> None:
+        if not self.reached(stage):
+            fields["stage"] = stage
+        for path, value in fields.items():
+            target = self.doc
+            *parents, leaf = path.split(".")
+            for key in parents:
+                target = target.setdefault(key, {})
+            target[leaf] = value
+        await self._store.update(self.application_id, fields)
+
+    def _document(self, doc_type: str, s3_url: str) -> Dict[str, Any]:
+        return (self.doc.get("documents") or {}).get(document_key(doc_type, s3_url)) or {}
+
+    def has_extraction(self, doc_type: str, s3_url: str) -> bool:
+        """Items are stored for this document (content not checked yet)."""
+        return self._document(doc_type, s3_url).get("items") is not None
+
+    def stored_etag(self, doc_type: str, s3_url: str) -> Optional[str]:
+        return self._document(doc_type, s3_url).get("etag")
+
+    def extracted_items(
+        self,
+        doc_type: str,
+        s3_url: str,
+        etag: Optional[str] = None,
+        source_hash: Optional[str] = None,
+    ) -> Optional[List[Any]]:
+        """Stored items, only when `etag` or `source_hash` matches the extracted content."""
+        entry = self._document(doc_type, s3_url)
+        if entry.get("items") is None:
+            return None
+        if etag and entry.get("etag") == etag:
+            return entry["items"]
+        if source_hash and entry.get("sourceHash") == source_hash:
+            return entry["items"]
+        return None
+
+    async def record_download(
+        self,
+        doc_type: str,
+        s3_url: str,
+        source_hash: str,
+        size: int,
+        etag: Optional[str] = None,
+    ) -> None:
+        key = document_key(doc_type, s3_url)
+        fields = {
+            f"documents.{key}.docType": doc_type,
+            f"documents.{key}.sourceHash": source_hash,
+            f"documents.{key}.etag": etag,
+            f"documents.{key}.bytes": size,
+            f"documents.{key}.downloadedAt": datetime.utcnow(),
+        }
+        if self._document(doc_type, s3_url).get("sourceHash") != source_hash:
+            # New content under the same object path: the old items no longer apply
+            fields[f"documents.{key}.items"] = None
+        await self._advance("downloaded", fields)
+
+    async def record_extraction(self, doc_type: str, s3_url: str, items: List[Any]) -> None:
+        key = document_key(doc_type, s3_url)
+        await self._advance(
+            "extracted",
+            {
+                f"documents.{key}.docType": doc_type,
+                f"documents.{key}.items": items,
+                f"documents.{key}.extractedAt": datetime.utcnow(),
+            },
+        )
+
+    def persisted_for(self, payload_hash: str) -> bool:
+        return (self.doc.get("persisted") or {}).get("dataHash") == payload_hash
+
+    async def record_persisted(self, payload_hash: str, message: str) -> None:
+        await self._advance(
+            "persisted",
+            {
+                "persisted.dataHash": payload_hash,
+                "persisted.message": message,
+                "persisted.at": datetime.utcnow(),
+            },
+        )
+
+    def persisted_message(self) -> Optional[str]:
+        return (self.doc.get("persisted") or {}).get("message")
+
+    def summary_for(self, payload_hash: str) -> Optional[str]:
+        summary = self.doc.get("summary") or {}
+        return summary.get("text") if summary.get("dataHash") == payload_hash else None
+
+    @property
+    def summary_year_hashes(self) -> Dict[str, str]:
+        return (self.doc.get("summary") or {}).get("yearHashes") or {}
+
+    async def record_summary(
+        self, payload_hash: str, text: str, year_hashes: Optional[Dict[str, str]] = None
+    ) -> None:
+        await self._advance(
+            "summarized",
+            {
+                "summary.dataHash": payload_hash,
+                "summary.text": text,
+                "summary.yearHashes": year_hashes or {},
+                "summary.at": datetime.utcnow(),
+            },
+        )
+
+    async def record_tracker_updated(self) -> None:
+        await self._advance("trackerUpdated", {"trackerUpdatedAt": datetime.utcnow()})
+
+    async def record_expired(self, stage: str) -> None:
+        # Outcome only; the stage stays where the job got to
+        fields = {"expired": {"stage": stage, "at": datetime.utcnow()}}
+        self.doc.update(fields)
+        await self._store.update(self.application_id, fields)
+
+
+class FinancialJobStore:
+    def __init__(self, connection: NetworkConnections):
+        self.collection = connection.get_async_mongo_db()[JOB_COLLECTION]
+
+    async def start(
+        self, application_id: str, company_gst: str, s3_urls: List[str]
+    ) -> FinancialJob:
+        """Load (or create) the job; a changed document set starts it over."""
+        inputs_hash = data_hash(
+            sorted(document_key("", url) for url in s3_urls)
+        )
+        now = datetime.utcnow()
+        doc = await self.collection.find_one({"applicationId": application_id})
+        if doc is None or doc.get("inputsHash") != inputs_hash or doc.get("companyGst") != company_gst:
+            if doc is not None:
+                log.info(f"Inputs for job {application_id} changed; starting over")
+            doc = {
+                "applicationId": application_id,
+                "companyGst": company_gst,
+                "inputsHash": inputs_hash,
+                "stage": "received",
+                "documents": {},
+                "attempts": 0,
+                "createdAt": now,
+            }
+            await self.collection.replace_one(
+                {"applicationId": application_id},
+                {**doc, "updatedAt": now},
+                upsert=True,
+            )
+        else:
+            log.info(f"Resuming job {application_id} from stage '{doc.get('stage')}'")
+        await self.collection.update_one(
+            {"applicationId": application_id},
+            {"$inc": {"attempts": 1}, "$set": {"updatedAt": now}},
+        )
+        doc["attempts"] = doc.get("attempts", 0) + 1
+        return FinancialJob(self, doc)
+
+    async def update(self, application_id: str, fields: Dict[str, Any]) -> None:
+        await self.collection.update_one(
+            {"applicationId": application_id},
+            {"$set": {**fields, "updatedAt": datetime.utcnow()}},
+        )
+
+
+financial_jobs = (
+    FinancialJobStore(NetworkConnections()) if config.JOB_STATE_ENABLED else None
+)
+
+
+@asynccontextmanager
+async def job_context(job: Optional[FinancialJob]):
+    token = _current_job.set(job)
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
@@ -0,0 +1,138 @@
+# json_output.py
+
+"""
+Structured (schema-constrained) Gemini output and a tolerant JSON parser.
+
+Extraction calls ask Vertex for response_mime_type="application/json" with a
+response_schema derived from the sheet models, so replies are valid JSON by
+construction. parse_json_lenient() is the fallback for anything that still
+arrives wrapped in fences or commentary.
+
+Note: str.strip("```json") strips *characters* (`, j, s, o, n) from both
+ends, not a prefix — it can eat valid JSON. strip_code_fences() removes
+only a real fence.
+"""
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from models.balance_sheet import BalanceSheetData as ModelBalanceSheetData
+from models.pnl_sheet import ProfitAndLossSheetData as ModelPnLSheetData
+
+log = logging.getLogger(__name__)
+
+SHEET_MODELS = {
+    "balance-sheet": ModelBalanceSheetData,
+    "pnl-sheet": ModelPnLSheetData,
+}
+
+# Filled in by our code, never by the model
+SERVER_SIDE_FIELDS = {"companyGst", "createdAt", "updatedAt", "_id", "id"}
+
+# Subset of OpenAPI keys the Vertex response_schema accepts
+_SCHEMA_KEYS = {"type", "description", "enum", "items", "properties", "required", "nullable"}
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+class _FreeFormObject(Exception):
+    """Schema contains an object without declared properties."""
+
+
+def strip_code_fences(text: Optional[str]) -> str:
+    text = (text or "").strip().lstrip("﻿")
+    match = _FENCE_RE.match(text)
+    return match.group(1).strip() if match else text
+
+
+def parse_json_lenient(text: Optional[str]) -> Any:
+    """
+    Best-effort JSON parse. Returns None when nothing JSON-like is found.
+    Order: as-is → without fences → first JSON value embedded in prose →
+    same with trailing commas removed.
+    """
+    cleaned = strip_code_fences(text)
+    if not cleaned:
+        return None
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+
+    starts = [i for i in (cleaned.find("["), cleaned.find("{")) if i >= 0]
+    if not starts:
+        return None
+    candidate = cleaned[min(starts):]
+    decoder = json.JSONDecoder()
+    for attempt in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+        try:
+            value, _ = decoder.raw_decode(attempt)
+            log.info("Recovered JSON from a non-strict model reply")
+            return value
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _resolve(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    while "$ref" in node:
+        node = defs[node["$ref"].split("/")[-1]]
+    return node
+
+
+def _to_vertex_schema(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    node = _resolve(node, defs)
+    nullable = False
+    if "anyOf" in node:
+        variants = [_resolve(v, defs) for v in node["anyOf"]]
+        non_null = [v for v in variants if v.get("type") != "null"]
+        nullable = len(non_null) < len(variants)
+        node = {**non_null[0], **{k: v for k, v in node.items() if k != "anyOf"}} if non_null else {"type": "string"}
+
+    schema = {k: v for k, v in node.items() if k in _SCHEMA_KEYS}
+    if nullable:
+        schema["nullable"] = True
+    if schema.get("type") == "object":
+        if not node.get("properties"):
+            raise _FreeFormObject()
+        schema["properties"] = {
+            name: _to_vertex_schema(child, defs)
+            for name, child in node["properties"].items()
+            if name not in SERVER_SIDE_FIELDS
+        }
+        # Keep nesting strict in the prompt, loose in the schema, so that
+        # "alreadyExtracted" stubs and section patches remain valid replies
+        schema.pop("required", None)
+    if schema.get("type") == "array" and "items" in node:
+        schema["items"] = _to_vertex_schema(node["items"], defs)
+    return schema
+
+
+@lru_cache(maxsize=None)
+def _extraction_response_schema(doc_type: str) -> Optional[str]:
+    model_cls = SHEET_MODELS.get(doc_type)
+    if model_cls is None:
+        return None
+    raw = model_cls.model_json_schema()
+    try:
+        item_schema = _to_vertex_schema(raw, raw.get("$defs", {}))
+    except _FreeFormObject:
+        log.info(
+            f"{model_cls.__name__} has free-form object fields; using JSON mode without a response schema"
+        )
+        return None
+    item_schema["properties"]["alreadyExtracted"] = {"type": "boolean"}
+    item_schema["required"] = ["fiscalYearEnd"]
+    return json.dumps({"type": "array", "items": item_schema})
+
+
+def extraction_response_schema(doc_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Vertex response_schema for a list of sheet items of doc_type, or None
+    when the model cannot be expressed as a closed schema (JSON mode only).
+    """
+    cached = _extraction_response_schema(doc_type)
+    return json.loads(cached) if cached else None
@@ -6,7 +6,12 @@ import signal
 from string import printable
 
 import config
-from confluent_kafka import Consumer
+from agent.coalescing import coalescer
+from agent.deadlines import DeadlineExpired
+from agent.gstin import GSTINValidationError
+from confluent_kafka import TIMESTAMP_NOT_AVAILABLE, Consumer
+from database.database_config import NetworkConnections
+from database.indexes import check_query_plans, ensure_indexes
 from task_handler import TASK_DISPATCH
 
 # ─── logging ────────────────────────────────────────────────────────
@@ -60,6 +65,11 @@ async def handle_message(msg):
     task_type = task_type.upper()
     handler = TASK_DISPATCH.get(task_type)
 
+    # The job deadline is derived from when the message was produced
+    timestamp_type, timestamp_ms = msg.timestamp()
+    if timestamp_type != TIMESTAMP_NOT_AVAILABLE:
+        payload.setdefault("EnqueuedAt", timestamp_ms / 1000)
+
     if not handler:
         log.error("❌ Unknown task type '%s' at offset %s", task_type, msg.offset())
         return False
@@ -73,6 +83,16 @@ async def handle_message(msg):
             summary = await handler(payload)
             log.info("✓ Task '%s' completed — %s chars", task_type, len(summary))
             return True
+        except GSTINValidationError as err:
+            # Deterministic input error — retrying cannot help
+            log.error("❌ Invalid GSTIN for task %s — %s", task_type, err)
+            return False
+        except DeadlineExpired as err:
+            # Nobody is waiting for the result any more — ack, do not retry
+            log.warning(
+                "⌛ Task %s expired at offset %s — %s", task_type, msg.offset(), err
+            )
+            return True
         except Exception as err:
             last_err = err
             retries -= 1
@@ -87,6 +107,11 @@ async def handle_message(msg):
 
 # ─── main poll loop ────────────────────────────────────────────────
 async def poll_forever():
+    if config.MONGO_ENSURE_INDEXES:
+        db = NetworkConnections().get_async_mongo_db()
+        await ensure_indexes(db)
+        await check_query_plans(db)
+
     try:
         while not stop_event.is_set():
             msg = consumer.poll(1.0)  # 1-second poll
@@ -101,6 +126,7 @@ async def poll_forever():
                 consumer.commit(msg)  # ack only on success
     finally:
         consumer.close()
+        log.info(coalescer.report())
         log.info("Consumer closed.")
 
 
@@ -9,6 +9,7 @@ Custom LangChain tools for the financial agent.
 import asyncio
 import json
 import logging
+import time
 import uuid
 from typing import Type  # add at top of file
 from typing import Any, Dict, Union
@@ -19,19 +20,63 @@ from agent import prompts, summarizer
 from database.los_application_tracker import LosApplicationTrackerDatabase
 import config
 
-from database.balance_sheet_data import BalanceSheetDataDatabase
 from database.database_config import NetworkConnections
 
-from database.pnl_sheet_data import ProfitAndLossSheetDatabase
 from google.cloud import storage
 from google.oauth2 import service_account  # ← NEW
 from langchain.tools import BaseTool
-from models.balance_sheet import BalanceSheetData as ModelBalanceSheetData
-from models.pnl_sheet import ProfitAndLossSheetData as ModelPnLSheetData
 from pydantic import BaseModel, Field, ValidationError, model_validator, validator
 from requests import RequestException
-from vertexai.generative_models import GenerationConfig, GenerativeModel
+from vertexai.generative_models import GenerationConfig
 from agent.prompts import API_SUMMARY_PROMPT
+from agent.gstin import GSTINValidationError, decode_gstin
+from agent.sheet_persistence import count_persisted, persist_sheet_items
+from agent.fiscal_year_merge import describe_conflicts, merge_fiscal_years
+from agent.artifact_store import artifact_store, resolve_artifacts
+from agent.page_selection import (
+    extract_page_texts,
+    log_selection,
+    pdf_size,
+    select_relevant_pages,
+)
+from agent.text_layer import build_statement_text, is_born_digital
+from agent.pdf_compaction import compact_pdf_async
+from agent.extraction_validation import (
+    apply_section_patch,
+    failing_sections,
+    identity_failures_only,
+    section_reextraction_prompt,
+    validate_items,
+)
+from agent.extraction_provenance import (
+    build_provenance,
+    extraction_prompt,
+    incremental_prompt_suffix,
+    merge_with_stored,
+    plan_extraction,
+    source_hash,
+)
+from agent.prompt_cache import prompt_cache
+from agent.hedging import hedged_call
+from agent.deadlines import DeadlineExpired, check_deadline, check_url
+from agent.document_spool import document_spool
+from agent.ranged_download import object_etag
+from agent.job_state import current_job, data_hash
+from agent.region_pool import region_pool
+from agent.model_routing import (
+    TIER_PRO,
+    escalate_tier,
+    generative_model,
+    model_name,
+    record_call,
+    record_escalation,
+    route_extraction,
+)
+from agent.json_output import (
+    extraction_response_schema,
+    parse_json_lenient,
+    strip_code_fences,
+)
 
 
 # from app.database.gst_data import GSTDataDatabase
@@ -69,10 +114,7 @@ vertexai.init(
     credentials=_creds,
 )
 
-_vertex_model = GenerativeModel(
-    model_name=config.VERTEX_MODEL,
-    generation_config=GenerationConfig(temperature=0.2),
-)
+_vertex_model = generative_model(TIER_PRO)
 
 _storage = storage.Client(credentials=_creds, project=config.PROJECT_ID)
 _bucket = _storage.bucket(config.GCS_BUCKET)
@@ -90,6 +132,10 @@ class FileQAInput(BaseModel):
         ...,
         description='The type of the document. Must be either "balance-sheet" or "pnl-sheet".',
     )
+    company_gst: Optional[str] = Field(
+        None,
+        description="GST number of the company; lets the tool reuse fiscal years already extracted.",
+    )
 
     @model_validator(mode="before")
     def _unpack_stringified_json(cls, values: dict):
@@ -108,6 +154,8 @@ class FileQAInput(BaseModel):
                     inner = json.loads(text)
                     values["s3_url"] = inner["s3_url"]
                     values["doc_type"] = inner["doc_type"]
+                    if inner.get("company_gst"):
+                        values["company_gst"] = inner["company_gst"]
                 except Exception:
                     pass
         return values
@@ -117,10 +165,10 @@ class PersistDataInput(BaseModel):
     """Input schema for the PersistFinancialDataTool."""
 
     pnl_json_list_str: str = Field(
-        description="A JSON string representing a list of extracted PNL data objects."
+        description="A JSON string list of extracted PNL data objects or artifact handles (artifact://...)."
     )
     bs_json_list_str: str = Field(
-        description="A JSON string representing a list of extracted Balance Sheet data objects."
+        description="A JSON string list of extracted Balance Sheet data objects or artifact handles (artifact://...)."
     )
     application_id: str = Field(
         description="The application ID associated with this data."
@@ -153,10 +201,10 @@ class PersistDataInput(BaseModel):
 
 class SummarizerInput(BaseModel):
     pnl_json_list_str: str = Field(
-        description="A JSON string of all extracted PNL data."
+        description="A JSON string of all extracted PNL data or a list of artifact handles."
     )
     bs_json_list_str: str = Field(
-        description="A JSON string of all extracted Balance Sheet data."
+        description="A JSON string of all extracted Balance Sheet data or a list of artifact handles."
     )
     application_id: str = Field(
         description="The application ID to associate the summary with."
@@ -203,6 +251,171 @@ class GeminiFileQATool(BaseTool):
         "Input must be a pre-signed S3 URL for the PDF and the document type."
     )
     args_schema: Type[BaseModel] = FileQAInput
+    # When True the tool stores the extracted JSON in the artifact store and
+    # returns a short handle instead of the full JSON (agent transcripts stay small)
+    return_artifact_handle: bool = False
+
+    @staticmethod
+    def _parse_extraction(text: str) -> Optional[list]:
+        parsed = parse_json_lenient(text)
+        if isinstance(parsed, dict):
+            return [parsed]
+        return parsed if isinstance(parsed, list) else None
+
+    @staticmethod
+    def _handle_observation(handle: str, doc_type: str, items: list) -> str:
+        return json.dumps(
+            {
+                "artifact": handle,
+                "doc_type": doc_type,
+                "fiscalYears": [
+                    i.get("fiscalYearEnd") for i in items if isinstance(i, dict)
+                ],
+            }
+        )
+
+    def _finalise_output(self, text: str, doc_type: str, s3_url: str) -> str:
+        items = self._parse_extraction(text)
+        if items is None:
+            # Errors / non-JSON replies go back verbatim so the agent can retry
+            return text
+        if not self.return_artifact_handle:
+            return json.dumps(items, default=str)
+        handle = artifact_store.put(items, {"doc_type": doc_type, "s3_url": s3_url})
+        return self._handle_observation(handle, doc_type, items)
+
+    @staticmethod
+    def _document_part(
+        gs_uri: Optional[str], document_text: Optional[str] = None
+    ) -> dict:
+        if document_text is not None:
+            return {"text": prompts.TEXT_LAYER_PREAMBLE + "\n" + document_text}
+        return {"file_data": {"file_uri": gs_uri, "mime_type": "application/pdf"}}
+
+    @staticmethod
+    def _generation_config(doc_type: Optional[str]) -> Optional[GenerationConfig]:
+        # Constrain extraction replies to the sheet schema so they always parse
+        if doc_type is None:
+            return None
+        return GenerationConfig(
+            temperature=0.2,
+            response_mime_type="application/json",
+            response_schema=extraction_response_schema(doc_type),
+        )
+
+    async def _agenerate_text(
+        self,
+        prompt_text: str,
+        gs_uri: Optional[str],
+        document_text: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        static_prefix: Optional[str] = None,
+        tier: str = TIER_PRO,
+    ) -> str:
+        task = doc_type or "extraction"
+        parts = [{"text": prompt_text.strip()}] if prompt_text.strip() else []
+        parts.append(self._document_part(gs_uri, document_text))
+
+        async def in_region(call_tier: str, location: str):
+            # The static prefix (output rules + extraction prompt) is served
+            # from the provider-side prompt cache when available
+            head = [{"role": "user", "parts": [{"text": prompts.GIVE_OUTPUT_STRING}]}]
+            model = generative_model(call_tier, location)
+            cached = False
+            if static_prefix:
+                head.append(
+                    {"role": "user", "parts": [{"text": static_prefix.strip()}]}
+                )
+                cached_model = await prompt_cache.amodel_for(
+                    f"{task}:{call_tier}:{location}",
+                    model,
+                    model_name(call_tier),
+                    head,
+                    location,
+                )
+                if cached_model is not None:
+                    model, head, cached = cached_model, [], True
+
+            started = time.perf_counter()
+            resp = await asyncio.to_thread(
+                model.generate_content,
+                generation_config=self._generation_config(doc_type),
+                contents=head + [{"role": "user", "parts": parts}],
+            )
+            record_call(call_tier, task, time.perf_counter() - started, resp)
+            return resp, cached
+
+        async def attempt(call_tier: str) -> str:
+            # Spread over the regional endpoints; throttled regions are retried elsewhere
+            resp, cached = await region_pool.acall(
+                lambda location: in_region(call_tier, location)
+            )
+            prompt_cache.record_usage(task, resp, cached)
+            # Extract text and remove a markdown code fence, if any
+            return (
+                strip_code_fences(resp.candidates[0].content.parts[0].text)
+                if resp.candidates
+                else ""
+            )
+
+        # Deadline on every call; after the p95 delay a hedge may race the primary
+        hedge_tier = config.GEMINI_HEDGE_TIER or tier
+        return await hedged_call(
+            f"{task}:{tier}",
+            lambda: attempt(tier),
+            lambda: attempt(hedge_tier),
+            is_valid=lambda text: parse_json_lenient(text) is not None,
+            hedge_key=f"{task}:{hedge_tier}",
+        )
+
+    async def _acorrect_failing_sections(
+        self,
+        items: list,
+        doc_type: str,
+        gs_uri: Optional[str],
+        document_text: Optional[str] = None,
+        tier: str = TIER_PRO,
+    ) -> list:
+        # "alreadyExtracted" stubs carry no figures, so they never fail a check
+        failures = validate_items(doc_type, items)
+        if not failures:
+            return items
+        log.warning(
+            f"Step 4b: {len(failures)} {doc_type} total(s) do not add up "
+            f"({[f.check + ' ' + f.fiscalYearEnd for f in failures]}); re-extracting {failing_sections(failures)}"
+        )
+        try:
+            patch_text = await self._agenerate_text(
+                section_reextraction_prompt(doc_type, failures),
+                gs_uri,
+                document_text,
+                doc_type,
+                tier=tier,
+            )
+        except DeadlineExpired:
+            raise
+        except Exception as e:
+            log.warning(f"Step 4b: section re-extraction failed, keeping original values: {e}")
+            return items
+        patched = apply_section_patch(items, patch_text)
+        remaining = validate_items(doc_type, patched)
+        if len(remaining) < len(failures):
+            log.info(
+                f"Step 4b: re-extraction fixed {len(failures) - len(remaining)} of {len(failures)} failing total(s)"
+            )
+            return patched
+        log.warning("Step 4b: re-extraction did not improve totals; keeping original values")
+        return items
+
+    async def _afinalise_output(self, text: str, doc_type: str, s3_url: str) -> str:
+        items = self._parse_extraction(text)
+        if not self.return_artifact_handle or items is None:
+            return text
+        handle = await artifact_store.aput(
+            items, {"doc_type": doc_type, "s3_url": s3_url}
+        )
+        log.info(f"Stored {doc_type} extraction for {s3_url} as {handle}")
+        return self._handle_observation(handle, doc_type, items)
 
     def _run(self, *args, **kwargs) -> str:
         kwargs = _normalise_inputs(*args, **kwargs)
@@ -246,6 +459,7 @@ class GeminiFileQATool(BaseTool):
             # 4. Call the Vertex AI Gemini model with the prompt and file reference
             print("Step 4: Calling Gemini model...")
             resp = _vertex_model.generate_content(
+                generation_config=self._generation_config(doc_type),
                 contents=[
                     {"role": "user", "parts": [{"text": prompts.GIVE_OUTPUT_STRING}]},
                     {
@@ -265,14 +479,9 @@ class GeminiFileQATool(BaseTool):
             print("Step 4: Gemini call complete.")
 
             # 5. Process the response and clean up the temporary file
-            # Extract text, remove markdown code fences, and strip whitespace
+            # Extract text and remove a markdown code fence, if any
             text = (
-                resp.candidates[0]
-                .content.parts[0]
-                .text.strip()
-                .strip("```json")
-                .strip("```")
-                .strip()
+                strip_code_fences(resp.candidates[0].content.parts[0].text)
                 if resp.candidates
                 else ""
             )
@@ -285,7 +494,7 @@ class GeminiFileQATool(BaseTool):
                 print(f"Warning: Could not delete temporary file {gs_uri}. Error: {e}")
                 pass  # Continue even if cleanup fails
 
-            return text
+            return self._finalise_output(text, doc_type, s3_url)
 
         except RequestException as e:
             return f"Error: Failed to download file from S3 URL: {e}"
@@ -297,9 +506,12 @@ class GeminiFileQATool(BaseTool):
         kwargs = _normalise_inputs(*args, **kwargs)
         s3_url = kwargs.get("s3_url")
         doc_type = kwargs.get("doc_type")
+        company_gst = kwargs.get("company_gst")
         """
         The core asynchronous logic of the tool.
         This asynchronous method is called by the LangChain agent executor.
+        When company_gst is given, fiscal years already extracted from the same
+        source (or stored from earlier sources) are reused instead of re-extracted.
         """
         log.info(f"Tool starting async for doc_type: '{doc_type}' at URL: {s3_url}")
         if not s3_url or not doc_type:
@@ -307,87 +519,198 @@ class GeminiFileQATool(BaseTool):
                 'Error: "s3_url" and "doc_type" are required. '
                 f"Received s3_url={s3_url!r}, doc_type={doc_type!r}"
             )
+        job = current_job()
+        spooled = None
         try:
-            # 1. Download the file from the pre-signed S3 URL asynchronously
-            log.info(f"Step 1: Downloading file from S3 URL asynchronously...")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(s3_url, timeout=60)
-                response.raise_for_status()  # Raise an exception for bad status codes
-                pdf_bytes = response.content
-            log.info(f"Step 1: Download complete. Downloaded {len(pdf_bytes)} bytes.")
+            # 0. Fail fast when the job has run out of time
+            check_deadline("download")
+
+            # 0b. Reuse this job's items when the object's ETag shows it is unchanged
+            if job and job.stored_etag(doc_type, s3_url):
+                check_url("download", s3_url)
+                checkpointed = job.extracted_items(
+                    doc_type, s3_url, etag=await object_etag(s3_url)
+                )
+                if checkpointed is not None:
+                    log.info(f"Step 0: {doc_type} at {s3_url} is unchanged since this job extracted it; reusing it.")
+                    return await self._afinalise_output(json.dumps(checkpointed), doc_type, s3_url)
+
+            # 1. Use the prefetched file, or download it (ranged, verified) into the spool;
+            #    a spooled PDF is passed on by path and never loaded into memory whole
+            if document_spool is not None:
+                log.info(f"Step 1: Fetching file through the document spool...")
+                spooled = await document_spool.fetch(s3_url)
+                pdf = spooled.path
+                etag = spooled.etag
+                log.info(f"Step 1: {spooled.size} bytes spooled at {pdf}.")
+            else:
+                check_url("download", s3_url)
+                log.info(f"Step 1: Downloading file from S3 URL asynchronously...")
+                async with httpx.AsyncClient() as client:
+                    response = await client.get(s3_url, timeout=60)
+                    response.raise_for_status()  # Raise an exception for bad status codes
+                    pdf = response.content
+                    etag = response.headers.get("etag")
+                log.info(f"Step 1: Download complete. Downloaded {len(pdf)} bytes.")
+
+            # 1b. Skip or narrow the extraction using stored provenance
+            pdf_hash = spooled.sha256 if spooled is not None else source_hash(pdf)
+            if job:
+                checkpointed = job.extracted_items(doc_type, s3_url, source_hash=pdf_hash)
+                await job.record_download(doc_type, s3_url, pdf_hash, pdf_size(pdf), etag)
+                if checkpointed is not None:
+                    log.info(f"Step 1: {doc_type} content matches this job's extraction; reusing it.")
+                    return await self._afinalise_output(json.dumps(checkpointed), doc_type, s3_url)
+            provenance = build_provenance(pdf_hash, doc_type, s3_url)
+            plan = await plan_extraction(company_gst, doc_type, pdf_hash)
+            if plan.skip:
+                text = json.dumps(plan.reused_items, default=str)
+                if job:
+                    await job.record_extraction(doc_type, s3_url, json.loads(text))
+                return await self._afinalise_output(text, doc_type, s3_url)
+            if plan.known_years:
+                log.info(
+                    f"Step 1b: {company_gst} already has {doc_type} years {plan.known_years}; requesting only the rest."
+                )
+
+            # 1c. Send only the statement/note pages when the text layer allows it
+            source = pdf
+            page_texts = None
+            selection = None
+            if config.PAGE_SELECTION_ENABLED or config.TEXT_LAYER_FAST_PATH:
+                page_texts = await asyncio.to_thread(extract_page_texts, source)
+            if config.PAGE_SELECTION_ENABLED:
+                pdf, selection = await asyncio.to_thread(
+                    select_relevant_pages, source, doc_type, page_texts
+                )
+                log_selection(s3_url, doc_type, selection)
+
+            # 1d. Born-digital PDFs go to Gemini as compact text, not as a file
+            document_text = None
+            if config.TEXT_LAYER_FAST_PATH and is_born_digital(page_texts):
+                pages = (
+                    selection.kept_pages
+                    if selection is not None
+                    else list(range(len(page_texts)))
+                )
+                text_doc = await asyncio.to_thread(
+                    build_statement_text, source, pages
+                )
+                if text_doc is not None:
+                    document_text = text_doc.text
+                    log.info(
+                        f"Step 1d: born-digital PDF — sending {len(pages)} page(s) as {text_doc.chars} chars of text"
+                    )
+
+            # 1e. Shrink scanned PDFs before upload (worker process)
+            if (
+                document_text is None
+                and config.PDF_COMPACTION_ENABLED
+                and not is_born_digital(page_texts)
+            ):
+                pdf, _ = await compact_pdf_async(pdf, s3_url)
 
             # 2. Upload the file to a temporary folder in Google Cloud Storage (GCS) asynchronously
-            object_name = f"tmp/{uuid.uuid4()}.pdf"
-            blob = _bucket.blob(object_name)
-            log.info(
-                f"Step 2: Uploading file to GCS as '{object_name}' asynchronously..."
-            )
-            await asyncio.to_thread(
-                blob.upload_from_string,
-                pdf_bytes,
-                content_type="application/pdf",
-                timeout=120,
-            )
-            gs_uri = f"{config.GS_URI_PREFIX}/{object_name}"
-            log.info(f"Step 2: Upload to GCS complete. URI: {gs_uri}")
+            blob = None
+            gs_uri = None
+            if (
+                document_text is None
+                and spooled is not None
+                and spooled.gsUri
+                and pdf is source
+            ):
+                # The unmodified PDF was already uploaded during prefetch
+                gs_uri = spooled.gsUri
+                log.info(f"Step 2: Using the prefetched GCS copy {gs_uri}")
+            elif document_text is None:
+                object_name = f"tmp/{uuid.uuid4()}.pdf"
+                blob = _bucket.blob(object_name)
+                log.info(
+                    f"Step 2: Uploading file to GCS as '{object_name}' asynchronously..."
+                )
+                await asyncio.to_thread(
+                    blob.upload_from_string
+                    if isinstance(pdf, bytes)
+                    else blob.upload_from_filename,
+                    pdf,
+                    content_type="application/pdf",
+                    timeout=120,
+                )
+                gs_uri = f"{config.GS_URI_PREFIX}/{object_name}"
+                log.info(f"Step 2: Upload to GCS complete. URI: {gs_uri}")
 
             # 3. Generate the prompt for the Gemini model based on the document type
             log.info("Step 3: Selecting prompt...")
-            sys_prompt = (
-                prompts.BALANCE_SHEET_PROMPT
-                if doc_type == "balance-sheet"
-                else prompts.PNL_PROMPT
-            )
+            static_prompt = extraction_prompt(doc_type)
             log.info(f"Step 3: Prompt selected for '{doc_type}'.")
 
             # 4. Call the Vertex AI Gemini model asynchronously with the prompt and file reference
-            log.info("Step 4: Calling Gemini model asynchronously...")
-            resp = await asyncio.to_thread(
-                _vertex_model.generate_content,
-                contents=[
-                    {"role": "user", "parts": [{"text": prompts.GIVE_OUTPUT_STRING}]},
-                    {
-                        "role": "user",
-                        "parts": [
-                            {"text": sys_prompt.strip()},
-                            {
-                                "file_data": {
-                                    "file_uri": gs_uri,
-                                    "mime_type": "application/pdf",
-                                }
-                            },
-                        ],
-                    },
-                ],
-            )
-            log.info("Step 4: Gemini call complete.")
-
-            # 5. Process the response and clean up the temporary file
-            # Extract text, remove markdown code fences, and strip whitespace
-            text = (
-                resp.candidates[0]
-                .content.parts[0]
-                .text.strip()
-                .strip("```json")
-                .strip("```")
-                .strip()
-                if resp.candidates
-                else ""
+            page_count = (
+                len(selection.kept_pages)
+                if selection is not None
+                else len(page_texts) if page_texts is not None else None
             )
-
-            log.info("Step 5: Cleaning up temporary GCS file...")
-            try:
-                # Deleting a blob is also blocking, use asyncio.to_thread
-                await asyncio.to_thread(blob.delete)
-                log.info("Step 5: Cleanup complete.")
-            except Exception as e:
+            tier = route_extraction(doc_type, document_text is not None, page_count)
+            while True:
+                check_deadline(f"{doc_type} extraction")
+                log.info(f"Step 4: Calling Gemini model ({tier}) asynchronously...")
+                text = await self._agenerate_text(
+                    incremental_prompt_suffix(plan),
+                    gs_uri,
+                    document_text,
+                    doc_type,
+                    static_prefix=static_prompt,
+                    tier=tier,
+                )
+                log.info("Step 4: Gemini call complete.")
+
+                # 4b. Check accounting identities locally; re-ask only failing sections
+                items = self._parse_extraction(text)
+                if items is not None:
+                    items = await self._acorrect_failing_sections(
+                        items, doc_type, gs_uri, document_text, tier
+                    )
+
+                # 4c. Escalate to a stronger tier when the reply is unusable or a section is still wrong
+                next_tier = escalate_tier(tier)
+                failures = validate_items(doc_type, items) if items is not None else []
+                if next_tier is None or (
+                    items is not None and identity_failures_only(failures)
+                ):
+                    if failures and identity_failures_only(failures):
+                        log.info(
+                            f"Step 4c: only identity checks still fail ({[f.check for f in failures]}); keeping the {tier} extraction"
+                        )
+                    break
                 log.warning(
-                    f"Warning: Could not delete temporary file {gs_uri}. Error: {e}"
+                    f"Step 4c: {doc_type} extraction on {tier} failed validation; escalating to {next_tier}"
                 )
-                pass  # Continue even if cleanup fails
-
-            return text
+                record_escalation(tier)
+                tier = next_tier
+            provenance["model"] = model_name(tier)
 
+            # 5. Clean up the temporary file
+            if blob is not None:
+                log.info("Step 5: Cleaning up temporary GCS file...")
+                try:
+                    # Deleting a blob is also blocking, use asyncio.to_thread
+                    await asyncio.to_thread(blob.delete)
+                    log.info("Step 5: Cleanup complete.")
+                except Exception as e:
+                    log.warning(
+                        f"Warning: Could not delete temporary file {gs_uri}. Error: {e}"
+                    )
+                    pass  # Continue even if cleanup fails
+
+            if items is not None:
+                text = json.dumps(merge_with_stored(items, plan, provenance), default=str)
+                if job:
+                    await job.record_extraction(doc_type, s3_url, json.loads(text))
+
+            return await self._afinalise_output(text, doc_type, s3_url)
+
+        except DeadlineExpired:
+            raise
         except httpx.HTTPError as e:
             log.error(f"Error downloading file from S3 URL asynchronously: {e}")
             return f"Error: Failed to download file from S3 URL: {e}"
@@ -397,6 +720,10 @@ class GeminiFileQATool(BaseTool):
                 f"An unexpected error occurred during async tool execution: {e}"
             )
             return f"An unexpected error occurred: {e}"
+        finally:
+            if spooled is not None:
+                # Extraction is over: the file may be evicted and its GCS copy goes
+                await document_spool.release(spooled)
 
 
 class PersistFinancialDataTool(BaseTool):
@@ -408,9 +735,6 @@ class PersistFinancialDataTool(BaseTool):
         "This must be called after all documents have been processed by FinancialDocumentExtractor."
     )
     args_schema: Type[BaseModel] = PersistDataInput
-    _db_connection = NetworkConnections()
-    _balance_sheet_db = BalanceSheetDataDatabase(_db_connection)
-    _pnl_sheet_db = ProfitAndLossSheetDatabase(_db_connection)
 
     def _run(self, *args, **kwargs) -> str:
         # Normalize inputs first
@@ -440,53 +764,62 @@ class PersistFinancialDataTool(BaseTool):
         log.info(f"Persisting data for AppID: {application_id}, GST: {company_gst}")
 
         try:
-            # Ensure strings are valid JSON or default to an empty list string
-            pnl_data_list_outer = json.loads(
-                pnl_json_list_str
-                if pnl_json_list_str and pnl_json_list_str.strip()
-                else "[]"
+            # Inline JSON and/or artifact handles from gemini_pdf_extractor
+            pnl_data_list_outer = await resolve_artifacts(pnl_json_list_str)
+            bs_data_list_outer = await resolve_artifacts(bs_json_list_str)
+
+            # One record per fiscal year across overlapping documents
+            pnl_data_list, pnl_conflicts = merge_fiscal_years(
+                "pnl-sheet", pnl_data_list_outer
             )
-            bs_data_list_outer = json.loads(
-                bs_json_list_str
-                if bs_json_list_str and bs_json_list_str.strip()
-                else "[]"
+            bs_data_list, bs_conflicts = merge_fiscal_years(
+                "balance-sheet", bs_data_list_outer
             )
 
-            pnl_data_list = [
-                item
-                for sublist in pnl_data_list_outer
-                for item in (sublist if isinstance(sublist, list) else [sublist])
-            ]
-            bs_data_list = [
-                item
-                for sublist in bs_data_list_outer
-                for item in (sublist if isinstance(sublist, list) else [sublist])
-            ]
+            # A retried job that already wrote exactly this data skips the writes
+            job = current_job()
+            payload_hash = data_hash([company_gst, pnl_data_list, bs_data_list])
+            if job and job.persisted_for(payload_hash):
+                log.info(f"Data for AppID {application_id} already persisted by this job; skipping.")
+                return job.persisted_message()
+
+            # Items are validated first, then one bulk_write per collection
+            pnl_report, bs_report = await asyncio.gather(
+                persist_sheet_items("pnl-sheet", pnl_data_list, company_gst),
+                persist_sheet_items("balance-sheet", bs_data_list, company_gst),
+            )
 
-            for item_list, doc_type in [
-                (pnl_data_list, "pnl-sheet"),
-                (bs_data_list, "balance-sheet"),
-            ]:
-                for (
-                    item_data
-                ) in (
-                    item_list
-                ):  # Iterate directly over items after potential flattening
-                    if doc_type == "balance-sheet":
-                        item = ModelBalanceSheetData(**item_data)
-                        item.companyGst = company_gst
-                        await self._balance_sheet_db.upsert_sheet_data(item)
-                    elif doc_type == "pnl-sheet":
-                        item = ModelPnLSheetData(**item_data)
-                        item.companyGst = company_gst
-                        await self._pnl_sheet_db.upsert_sheet_data(item)
-
-            return f"Successfully persisted data for PNL ({len(pnl_data_list)} items) and Balance Sheet ({len(bs_data_list)} items) for application {application_id}."
+            message = (
+                f"Successfully persisted data for PNL ({count_persisted(pnl_report)}/{len(pnl_data_list)} items) "
+                f"and Balance Sheet ({count_persisted(bs_report)}/{len(bs_data_list)} items) for application {application_id}."
+            )
+            rejected = [
+                f"{doc_type} item {r['index']} ({r['fiscalYearEnd']}): {r['status']} - {r['error']}"
+                for doc_type, report in (
+                    ("pnl-sheet", pnl_report),
+                    ("balance-sheet", bs_report),
+                )
+                for r in report
+                if r["status"] in ("invalid", "failed")
+            ]
+            if rejected:
+                message += " Not persisted: " + "; ".join(rejected)
+            if pnl_conflicts or bs_conflicts:
+                message += (
+                    f" Resolved {len(pnl_conflicts) + len(bs_conflicts)} conflicting values across overlapping documents: "
+                    + describe_conflicts(pnl_conflicts + bs_conflicts)
+                )
+            if job and not rejected:
+                await job.record_persisted(payload_hash, message)
+            return message
         except (json.JSONDecodeError, ValidationError) as e:
             log.error(
                 f"Error processing/persisting data for AppID {application_id}: {e}. Input pnl_str: '{pnl_json_list_str}', bs_str: '{bs_json_list_str}'"
             )
             return f"Error: Data validation or JSON format error during persistence. Details: {e}"
+        except KeyError as e:
+            log.error(f"Artifact lookup failed for AppID {application_id}: {e}")
+            return f"Error: {e}. Re-run gemini_pdf_extractor for that document."
         except Exception as e:
             log.exception(
                 f"Unexpected error in PersistFinancialDataTool for AppID {application_id}"
@@ -524,15 +857,11 @@ class FinancialSummarizerTool(BaseTool):
 
         log.info(f"Summarizer tool invoked for AppID: {application_id}")
         try:
-            pnl_data = json.loads(
-                pnl_json_list_str
-                if pnl_json_list_str and pnl_json_list_str.strip()
-                else "[]"
+            pnl_data, _ = merge_fiscal_years(
+                "pnl-sheet", await resolve_artifacts(pnl_json_list_str)
             )
-            bs_data = json.loads(
-                bs_json_list_str
-                if bs_json_list_str and bs_json_list_str.strip()
-                else "[]"
+            bs_data, _ = merge_fiscal_years(
+                "balance-sheet", await resolve_artifacts(bs_json_list_str)
             )
 
             if not pnl_data and not bs_data:
@@ -542,11 +871,16 @@ class FinancialSummarizerTool(BaseTool):
                 pnl_data=pnl_data, bs_data=bs_data, application_id=application_id  # type: ignore
             )
             return f"Summary generated successfully for application {application_id}. The summary has also been saved to the application tracker."
+        except DeadlineExpired:
+            raise
         except json.JSONDecodeError as e:
             log.error(
                 f"Error decoding JSON for summarizer, AppID {application_id}: {e}. Input pnl_str: '{pnl_json_list_str}', bs_str: '{bs_json_list_str}'"
             )
             return f"Error: Data validation or JSON format error for summarizer. Details: {e}"
+        except KeyError as e:
+            log.error(f"Artifact lookup failed for AppID {application_id}: {e}")
+            return f"Error: {e}. Re-run gemini_pdf_extractor for that document."
         except Exception as e:
             log.exception(
                 f"Error in FinancialSummarizerTool for app_id {application_id}"
@@ -600,7 +934,16 @@ class GSTAPISummaryTool(BaseTool):
         if not gst_number:
             return "Error: 'gst_number' is required for API summary."
 
+        # Reject malformed GSTINs locally before any API or Gemini call
+        try:
+            gstin_details = decode_gstin(gst_number)
+        except GSTINValidationError as e:
+            log.warning(f"Rejected GSTIN before API call: {e}")
+            return f"Error: {e}"
+        gst_number = gstin_details.gstin
+
         try:
+            check_deadline("GST API summary")
             url = config.ALL_MIGHT_BASE_URL + "/master-india/get-gst-details"
             headers = {
                 "x_source_name": config.SOURCE_NAME,
@@ -627,12 +970,36 @@ class GSTAPISummaryTool(BaseTool):
                     parsed.get("natureOfBusinessActivities", [])
                 ),
                 gstNumber=gst_number,
+                gstinStateCode=gstin_details.stateCode,
+                gstinStateName=gstin_details.stateName,
+                pan=gstin_details.pan,
+                panHolderType=gstin_details.panHolderType,
             )
 
             log.info("📡 Calling Gemini model with API GST data summary prompt...")
-            response = await asyncio.to_thread(
-                _vertex_model.generate_content,
-                contents=[{"role": "user", "parts": [{"text": formatted_prompt}]}],
+            tier = config.MODEL_TIER_GST_SUMMARY
+
+            async def in_region(call_tier: str, location: str):
+                started = time.perf_counter()
+                resp = await asyncio.to_thread(
+                    generative_model(call_tier, location).generate_content,
+                    contents=[{"role": "user", "parts": [{"text": formatted_prompt}]}],
+                )
+                record_call(call_tier, "gst-summary", time.perf_counter() - started, resp)
+                return resp
+
+            async def attempt(call_tier: str):
+                return await region_pool.acall(
+                    lambda location: in_region(call_tier, location)
+                )
+
+            hedge_tier = config.GEMINI_HEDGE_TIER or tier
+            response = await hedged_call(
+                f"gst-summary:{tier}",
+                lambda: attempt(tier),
+                lambda: attempt(hedge_tier),
+                is_valid=lambda resp: bool(resp.candidates),
+                hedge_key=f"gst-summary:{hedge_tier}",
             )
 
             if response.candidates:
@@ -642,6 +1009,8 @@ class GSTAPISummaryTool(BaseTool):
             else:
                 return "⚠️ No summary generated from Gemini model."
 
+        except DeadlineExpired:
+            raise
         except Exception as e:
             log.exception("Error generating GST summary from API data")
             return f"Error: {e}"
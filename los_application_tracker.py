@@ -0,0 +1,25 @@
+# los_application_tracker.py
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from database.database_config import NetworkConnections
+
+
+class LosApplicationTrackerDatabase:
+    def __init__(self, connection: NetworkConnections):
+        self.db = connection.get_async_mongo_db()
+        self.collection = self.db["losApplicationTracker"]
+
+    async def get_los_application_tracker_by_identifier(
+        self, identifier: str
+    ) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"identifier": identifier})
+
+    async def update_los_application_tracker_by_identifier(
+        self, identifier: str, update_data: Dict[str, Any]
+    ):
+        update_data = {**update_data, "updatedAt": datetime.utcnow()}
+        return await self.collection.update_one(
+            {"identifier": identifier}, {"$set": update_data}
+        )
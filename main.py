@@ -37,9 +37,76 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Launch the Kafka consumer (for production use)",
     )
+    subparsers = parser.add_subparsers(dest="command")
+
+    backfill = subparsers.add_parser(
+        "backfill",
+        help="Run TASK_DISPATCH handlers over many payloads, resumably",
+    )
+    source = backfill.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", help="File with one task payload per line")
+    source.add_argument(
+        "--mongo-query",
+        help="Mongo filter (JSON) selecting the documents to turn into payloads",
+    )
+    backfill.add_argument(
+        "--collection",
+        default="losApplicationTracker",
+        help="Collection for --mongo-query",
+    )
+    backfill.add_argument(
+        "--task-type",
+        default="FINANCIAL_SUMMARY",
+        help="Payload type for --mongo-query documents without a 'type' field",
+    )
+    backfill.add_argument(
+        "--gst-field",
+        default="gstNumber",
+        help="Document field copied into GstNumber for --mongo-query",
+    )
+    backfill.add_argument("--concurrency", type=int, default=4)
+    backfill.add_argument(
+        "--checkpoint",
+        help="Checkpoint file (default: derived from the source)",
+    )
+    backfill.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Run payloads that failed in earlier runs again",
+    )
+    backfill.add_argument(
+        "--progress-every",
+        type=float,
+        default=10.0,
+        help="Seconds between throughput/ETA lines",
+    )
     return parser.parse_args()
 
 
+# ─── Resumable backfill over TASK_DISPATCH ────────────────────────
+async def run_backfill_command(args: argparse.Namespace) -> bool:
+    from backfill_runner import JsonlSource, MongoSource, run_backfill
+    from bson import json_util  # extended JSON: {"$oid": ...}, {"$date": ...}
+
+    if args.jsonl:
+        source = JsonlSource(args.jsonl)
+    else:
+        source = MongoSource(
+            args.collection,
+            json_util.loads(args.mongo_query),
+            args.task_type,
+            args.gst_field,
+        )
+    checkpoint = await run_backfill(
+        source,
+        checkpoint_path=args.checkpoint,
+        concurrency=args.concurrency,
+        retry_failed=args.retry_failed,
+        progress_every=args.progress_every,
+    )
+    return not checkpoint.failed
+
+
 # ─── Run your custom GST summary agent (API + auto-browser) ───────
 async def run_one_off_test():
     log.info("── running one-off test (custom GST agent) ──")
@@ -58,6 +125,10 @@ async def run_one_off_test():
 def main():
     args = parse_args()
 
+    if args.command == "backfill":
+        ok = asyncio.run(run_backfill_command(args))
+        raise SystemExit(0 if ok else 1)
+
     # 🔁 Toggle between Kafka mode and one-off test mode
     if args and not args.kafka:
         asyncio.run(run_one_off_test())  # ✅ YOUR agent runs here
@@ -0,0 +1,282 @@
+# model_routing.py
+
+"""
+Per-task model tiers.
+
+  • fast – GST company blurb, simple born-digital statements (text fast path)
+  • pro  – scanned / long statements, the ratio summary, agent orchestration
+
+Which tier a task uses is set in config (MODEL_TIER_*). Extraction picks a
+tier per document with route_extraction() and escalates fast → pro when the
+reply does not parse or still fails validation (escalate_tier()).
+
+Every call is recorded per tier (calls, latency, tokens, estimated cost):
+GenerativeModel calls via record_call(), LangChain chat models through the
+TierUsageCallback attached in chat_model().
+
+Clients are regional: generative_model(tier, location) is meant to be called
+from inside region_pool.acall(), and chat_model() returns a PooledChatModel
+that spreads each LangChain call over the same region pool.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+import config
+from google.oauth2 import service_account
+from agent.region_pool import region_pool, vertex_location
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+from langchain_google_vertexai import ChatVertexAI  # type: ignore
+from pydantic import BaseModel
+from vertexai.generative_models import GenerationConfig, GenerativeModel
+
+log = logging.getLogger(__name__)
+
+TIER_FAST = "fast"
+TIER_PRO = "pro"
+TIERS = (TIER_FAST, TIER_PRO)
+
+# USD per million tokens: (input, output)
+TIER_PRICING = {
+    TIER_FAST: (config.VERTEX_FAST_INPUT_USD_PER_MTOK, config.VERTEX_FAST_OUTPUT_USD_PER_MTOK),
+    TIER_PRO: (config.VERTEX_PRO_INPUT_USD_PER_MTOK, config.VERTEX_PRO_OUTPUT_USD_PER_MTOK),
+}
+
+_creds = None
+if config.GOOGLE_KEY_FILE:
+    _creds = service_account.Credentials.from_service_account_file(
+        config.GOOGLE_KEY_FILE,
+        scopes=["https://www.googleapis.com/auth/cloud-platform"],
+    )
+
+
+class TierStats(BaseModel):
+    model: str
+    calls: int = 0
+    latencySeconds: float = 0.0
+    promptTokens: int = 0
+    cachedTokens: int = 0
+    outputTokens: int = 0
+    costUsd: float = 0.0
+    escalations: int = 0
+
+
+def _normalise_tier(tier: Optional[str]) -> str:
+    if tier in TIERS:
+        return tier
+    log.warning(f"Unknown model tier {tier!r}, using {TIER_PRO}")
+    return TIER_PRO
+
+
+def model_name(tier: str) -> str:
+    if not config.MODEL_ROUTING_ENABLED:
+        return config.VERTEX_MODEL
+    tier = _normalise_tier(tier)
+    return config.VERTEX_MODEL_FAST if tier == TIER_FAST else config.VERTEX_MODEL_PRO
+
+
+def extraction_models() -> set:
+    """Model names whose stored extractions are reusable (see extraction_provenance)."""
+    return {model_name(tier) for tier in TIERS} | {config.VERTEX_MODEL}
+
+
+_lock = threading.Lock()
+_generative_models: Dict[tuple, GenerativeModel] = {}
+_regional_chat_models: Dict[tuple, ChatVertexAI] = {}
+_chat_models: Dict[str, "PooledChatModel"] = {}
+_stats: Dict[str, TierStats] = {}
+
+
+def generative_model(tier: str, location: Optional[str] = None) -> GenerativeModel:
+    name = model_name(tier)
+    key = (name, location or config.LOCATION)
+    with _lock:
+        if key not in _generative_models:
+            with vertex_location(location):
+                _generative_models[key] = GenerativeModel(
+                    model_name=name,
+                    generation_config=GenerationConfig(temperature=0.2),
+                )
+        return _generative_models[key]
+
+
+def _regional_chat_model(tier: str, location: str) -> ChatVertexAI:
+    key = (tier, location)
+    with _lock:
+        if key not in _regional_chat_models:
+            _regional_chat_models[key] = ChatVertexAI(
+                model_name=model_name(tier),
+                temperature=config.TEMPERATURE,
+                project=config.PROJECT_ID,
+                location=location,
+                credentials=_creds,
+            )
+        return _regional_chat_models[key]
+
+
+class PooledChatModel(BaseChatModel):
+    """Chat model that sends each call to a region picked by region_pool."""
+
+    tier: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "vertexai-region-pool"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return region_pool.call(
+            lambda location: _regional_chat_model(self.tier, location)._generate(
+                messages, stop=stop, **kwargs
+            )
+        )
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        return await region_pool.acall(
+            lambda location: _regional_chat_model(self.tier, location)._agenerate(
+                messages, stop=stop, **kwargs
+            )
+        )
+
+
+def chat_model(tier: str) -> PooledChatModel:
+    """
+    LangChain chat model for a tier, shared by every caller on that tier.
+    Never put it in JSON mode globally — ReAct agents need free-text
+    Thought/Action output; bind response_mime_type per call instead.
+    """
+    tier = _normalise_tier(tier)
+    with _lock:
+        if tier not in _chat_models:
+            _chat_models[tier] = PooledChatModel(
+                tier=tier,
+                callbacks=[TierUsageCallback(tier)],
+            )
+        return _chat_models[tier]
+
+
+def route_extraction(
+    doc_type: str, born_digital_text: bool, page_count: Optional[int]
+) -> str:
+    """
+    fast for born-digital statements sent as text with a modest page count,
+    pro for scanned or long documents.
+    """
+    if not config.MODEL_ROUTING_ENABLED:
+        return TIER_PRO
+    if born_digital_text and page_count is not None and page_count <= config.MODEL_FAST_MAX_PAGES:
+        tier = TIER_FAST
+    else:
+        tier = TIER_PRO
+    log.info(
+        f"Routing {doc_type} extraction to {tier} ({model_name(tier)}): "
+        f"born_digital_text={born_digital_text} pages={page_count}"
+    )
+    return tier
+
+
+def escalate_tier(tier: str) -> Optional[str]:
+    """Next tier up, or None when already on the strongest one."""
+    if not config.MODEL_ROUTING_ENABLED or tier == TIER_PRO:
+        return None
+    return TIER_PRO
+
+
+def _tier_stats(tier: str) -> TierStats:
+    if tier not in _stats:
+        _stats[tier] = TierStats(model=model_name(tier))
+    return _stats[tier]
+
+
+def estimate_cost(tier: str, prompt_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = TIER_PRICING[_normalise_tier(tier)]
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (
+        uncached * input_price
+        + cached_tokens * input_price * config.VERTEX_CACHED_INPUT_DISCOUNT
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def _record(tier, task, latency, prompt_tokens, cached_tokens, output_tokens) -> None:
+    cost = estimate_cost(tier, prompt_tokens, cached_tokens, output_tokens)
+    with _lock:
+        stats = _tier_stats(tier)
+        stats.calls += 1
+        stats.latencySeconds += latency
+        stats.promptTokens += prompt_tokens
+        stats.cachedTokens += cached_tokens
+        stats.outputTokens += output_tokens
+        stats.costUsd += cost
+    log.info(
+        f"Model call {task} on {tier} ({model_name(tier)}): {latency:.2f}s, "
+        f"prompt={prompt_tokens} cached={cached_tokens} output={output_tokens} ≈ ${cost:.5f}"
+    )
+
+
+def record_call(tier: str, task: str, latency: float, resp: Any) -> None:
+    """Record a vertexai GenerativeModel response."""
+    usage = getattr(resp, "usage_metadata", None)
+    _record(
+        tier,
+        task,
+        latency,
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "cached_content_token_count", 0) or 0,
+        getattr(usage, "candidates_token_count", 0) or 0,
+    )
+
+
+def record_escalation(tier: str) -> None:
+    with _lock:
+        _tier_stats(tier).escalations += 1
+
+
+def tier_report() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        report = {}
+        for tier, stats in _stats.items():
+            row = stats.model_dump()
+            row["avgLatencySeconds"] = stats.latencySeconds / stats.calls if stats.calls else 0.0
+            report[tier] = row
+        return report
+
+
+class TierUsageCallback(BaseCallbackHandler):
+    """Times LangChain chat-model calls and records their token usage."""
+
+    run_inline = True
+
+    def __init__(self, tier: str):
+        self.tier = tier
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        latency = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        usage = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        _record(
+            self.tier,
+            "chat",
+            latency,
+            usage.get("input_tokens", 0),
+            (usage.get("input_token_details") or {}).get("cache_read", 0),
+            usage.get("output_tokens", 0),
+        )
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._started.pop(run_id, None)
@@ -0,0 +1,228 @@
+# page_selection.py
+
+"""
+Relevant-page selection for financial-statement PDFs.
+
+Annual reports are 40–150 pages; the Balance Sheet, P&L and their notes are
+usually ~10. We read the text layer of every page locally, score pages for
+statement / note headings, and build a trimmed PDF with only the relevant
+page ranges. When the text layer is missing (scanned file) or the scoring
+is not confident, the full file is used unchanged.
+
+Every function takes the PDF as bytes or as the path of a spooled file; a
+path is read through an open file handle, so pypdf seeks into it instead of
+holding the whole document in memory.
+
+pypdf is optional: without it every document goes through in full.
+"""
+import io
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple, Union
+
+import config
+from pydantic import BaseModel
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # pragma: no cover - optional dependency
+    PdfReader = PdfWriter = None
+
+log = logging.getLogger(__name__)
+
+# PDF content, or the path of a file holding it
+PdfSource = Union[bytes, str]
+
+# Gemini bills each PDF page as one image of ~258 input tokens
+GEMINI_TOKENS_PER_PDF_PAGE = 258
+
+# Below this many characters per page on average we treat the PDF as scanned
+MIN_TEXT_CHARS_PER_PAGE = 200
+
+STATEMENT_PATTERNS = {
+    "balance-sheet": [
+        r"balance\s+sheet\s+as\s+(at|on)",
+        r"statement\s+of\s+financial\s+position",
+        r"equity\s+and\s+liabilities",
+        r"shareholders.?\s+funds",
+        r"non[-\s]current\s+liabilities",
+        r"total\s+assets",
+    ],
+    "pnl-sheet": [
+        r"(statement\s+of\s+)?profit\s+(and|&)\s+loss",
+        r"revenue\s+from\s+operations",
+        r"total\s+(income|revenue)",
+        r"profit\s+(before|after)\s+tax",
+        r"earnings\s+per\s+(equity\s+)?share",
+    ],
+}
+NOTE_PATTERNS = [
+    r"notes?\s+(forming\s+part\s+of|to)\s+(the\s+)?(standalone\s+|consolidated\s+)?financial\s+statements",
+    r"^\s*note\s*(no\.?)?\s*\d+",
+    r"schedule\s+[\dIVX]+",
+]
+NEGATIVE_PATTERNS = [
+    r"independent\s+auditor.?s?\s+report",
+    r"directors.?\s+report",
+    r"management\s+discussion",
+    r"annexure\s+[A-Z\d]",
+    r"notice\s+(of|is\s+hereby)",
+]
+_NUMBER_RE = re.compile(r"\d[\d,]*\.?\d*")
+
+
+class PageSelection(BaseModel):
+    total_pages: int = 0
+    kept_pages: List[int] = []
+    used_full_document: bool = True
+    reason: str = ""
+    bytes_before: int = 0
+    bytes_after: int = 0
+    est_tokens_saved: int = 0
+    elapsed_ms: float = 0.0
+
+
+def pdf_size(pdf: PdfSource) -> int:
+    return len(pdf) if isinstance(pdf, bytes) else os.path.getsize(pdf)
+
+
+@contextmanager
+def open_pdf(pdf: PdfSource):
+    """A seekable stream over `pdf`, valid until the block exits."""
+    if isinstance(pdf, bytes):
+        yield io.BytesIO(pdf)
+        return
+    with open(pdf, "rb") as fh:
+        yield fh
+
+
+def extract_page_texts(pdf: PdfSource) -> Optional[List[str]]:
+    """Text layer of every page, or None when pypdf is unavailable/unreadable."""
+    if PdfReader is None:
+        return None
+    try:
+        with open_pdf(pdf) as stream:
+            reader = PdfReader(stream)
+            return [(page.extract_text() or "") for page in reader.pages]
+    except Exception as e:
+        log.warning(f"Could not read PDF text layer: {e}")
+        return None
+
+
+def has_text_layer(page_texts: Optional[List[str]]) -> bool:
+    if not page_texts:
+        return False
+    avg_chars = sum(len(t.strip()) for t in page_texts) / len(page_texts)
+    return avg_chars >= MIN_TEXT_CHARS_PER_PAGE
+
+
+def _hits(patterns: List[str], text: str) -> int:
+    return sum(
+        1 for p in patterns if re.search(p, text, flags=re.IGNORECASE | re.MULTILINE)
+    )
+
+
+def score_pages(page_texts: List[str], doc_type: str) -> List[Tuple[int, int]]:
+    """(statement score, note score) per page."""
+    statement_patterns = STATEMENT_PATTERNS.get(doc_type, [])
+    scores = []
+    for text in page_texts:
+        numeric_dense = len(_NUMBER_RE.findall(text)) >= 20
+        penalty = 2 * _hits(NEGATIVE_PATTERNS, text)
+        statement = 3 * _hits(statement_patterns, text) + numeric_dense - penalty
+        note = _hits(NOTE_PATTERNS, text) + numeric_dense - penalty
+        scores.append((statement, note))
+    return scores
+
+
+def choose_pages(
+    scores: List[Tuple[int, int]], padding: int = 1, min_statement_score: int = 6
+) -> List[int]:
+    """
+    Statement pages (score ≥ min_statement_score), every note page from the
+    first statement page onwards, plus `padding` neighbours on each side.
+    """
+    statement_pages = [i for i, (s, _) in enumerate(scores) if s >= min_statement_score]
+    if not statement_pages:
+        return []
+    first = statement_pages[0]
+    note_pages = [i for i, (_, n) in enumerate(scores) if i > first and n >= 2]
+
+    keep = set()
+    for page in statement_pages + note_pages:
+        keep.update(range(max(0, page - padding), min(len(scores), page + padding + 1)))
+    return sorted(keep)
+
+
+def _write_pages(pdf: PdfSource, pages: List[int]) -> bytes:
+    with open_pdf(pdf) as stream:
+        reader = PdfReader(stream)
+        writer = PdfWriter()
+        for page in pages:
+            writer.add_page(reader.pages[page])
+        out = io.BytesIO()
+        writer.write(out)
+    return out.getvalue()
+
+
+def select_relevant_pages(
+    pdf: PdfSource,
+    doc_type: str,
+    page_texts: Optional[List[str]] = None,
+    max_keep_ratio: float = config.PAGE_SELECTION_MAX_KEEP_RATIO,
+) -> Tuple[PdfSource, PageSelection]:
+    """
+    Returns (pdf to send, selection report): `pdf` itself when nothing is
+    trimmed, else the trimmed bytes. CPU-bound — run it via asyncio.to_thread
+    from async code.
+    """
+    start = time.perf_counter()
+    size = pdf_size(pdf)
+    selection = PageSelection(bytes_before=size, bytes_after=size)
+
+    def _finish(reason: str, data: PdfSource = pdf) -> Tuple[PdfSource, PageSelection]:
+        selection.reason = reason
+        selection.elapsed_ms = round(1000 * (time.perf_counter() - start), 1)
+        return data, selection
+
+    page_texts = page_texts if page_texts is not None else extract_page_texts(pdf)
+    if page_texts is None:
+        return _finish("no text layer reader available")
+    selection.total_pages = len(page_texts)
+    selection.kept_pages = list(range(len(page_texts)))
+    if not has_text_layer(page_texts):
+        return _finish("no usable text layer (scanned document)")
+
+    pages = choose_pages(score_pages(page_texts, doc_type))
+    if not pages:
+        return _finish("no statement heading found")
+    if len(pages) > max_keep_ratio * len(page_texts):
+        return _finish(f"relevant pages cover {len(pages)}/{len(page_texts)} pages")
+
+    try:
+        trimmed = _write_pages(pdf, pages)
+    except Exception as e:
+        log.warning(f"Could not build trimmed PDF, sending full document: {e}")
+        return _finish("trimming failed")
+
+    selection.used_full_document = False
+    selection.kept_pages = pages
+    selection.bytes_after = len(trimmed)
+    selection.est_tokens_saved = GEMINI_TOKENS_PER_PDF_PAGE * (len(page_texts) - len(pages))
+    return _finish("trimmed to relevant pages", trimmed)
+
+
+def log_selection(s3_url: str, doc_type: str, selection: PageSelection):
+    if selection.used_full_document:
+        log.info(
+            f"Page selection for {doc_type} {s3_url}: full document ({selection.total_pages} pages) — {selection.reason}"
+        )
+        return
+    log.info(
+        f"Page selection for {doc_type} {s3_url}: kept {len(selection.kept_pages)}/{selection.total_pages} pages "
+        f"{selection.kept_pages}, {selection.bytes_before} → {selection.bytes_after} bytes, "
+        f"~{selection.est_tokens_saved} input tokens saved, {selection.elapsed_ms} ms"
+    )
@@ -0,0 +1,176 @@
+# pdf_compaction.py
+
+"""
+Optional compaction of scanned PDFs before upload.
+
+Scanned statements are often 20–100 MB of high-DPI page images. Before
+the GCS upload we can:
+  • downsample page images above the target DPI (re-encoded as JPEG)
+  • strip XMP / document-info metadata and embedded font programs
+  • linearize the file
+The work is CPU-bound and runs in a worker process so it never blocks the
+event loop. The result is used only if it is actually smaller. A spooled
+file is passed to the worker by path rather than as pickled bytes.
+
+pikepdf and Pillow are optional: without them documents are uploaded as-is.
+"""
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import config
+from agent.page_selection import PdfSource, open_pdf, pdf_size
+from pydantic import BaseModel
+
+try:
+    import pikepdf
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    pikepdf = None
+    Image = None
+
+log = logging.getLogger(__name__)
+
+_FONT_FILE_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class CompactionReport(BaseModel):
+    applied: bool = False
+    reason: str = ""
+    bytes_before: int = 0
+    bytes_after: int = 0
+    images_downsampled: int = 0
+    fonts_stripped: int = 0
+    elapsed_ms: float = 0.0
+
+
+def _page_width_inches(page) -> float:
+    box = [float(v) for v in page.mediabox]
+    return max(abs(box[2] - box[0]), 1.0) / 72.0
+
+
+def _downsample_images(pdf, target_dpi: int, jpeg_quality: int) -> int:
+    count = 0
+    for page in pdf.pages:
+        width_in = _page_width_inches(page)
+        for _, raw_image in page.images.items():
+            try:
+                pdf_image = pikepdf.PdfImage(raw_image)
+                if pdf_image.bits_per_component == 1:
+                    continue  # bilevel scans are already tiny (CCITT/JBIG2)
+                effective_dpi = pdf_image.width / width_in
+                if effective_dpi <= target_dpi * 1.1:
+                    continue
+                scale = target_dpi / effective_dpi
+                pil = pdf_image.as_pil_image()
+                if pil.mode not in ("RGB", "L"):
+                    pil = pil.convert("RGB")
+                pil = pil.resize(
+                    (max(1, int(pil.width * scale)), max(1, int(pil.height * scale))),
+                    Image.LANCZOS,
+                )
+                out = io.BytesIO()
+                pil.save(out, format="JPEG", quality=jpeg_quality, optimize=True)
+                raw_image.write(out.getvalue(), filter=pikepdf.Name.DCTDecode)
+                raw_image.Width, raw_image.Height = pil.width, pil.height
+                raw_image.ColorSpace = (
+                    pikepdf.Name.DeviceGray if pil.mode == "L" else pikepdf.Name.DeviceRGB
+                )
+                raw_image.BitsPerComponent = 8
+                for key in ("/DecodeParms", "/SMask", "/Decode"):
+                    if key in raw_image:
+                        del raw_image[key]
+                count += 1
+            except Exception as e:
+                log.debug(f"Skipping image during compaction: {e}")
+    return count
+
+
+def _strip_fonts(pdf) -> int:
+    count = 0
+    for obj in pdf.objects:
+        if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") == "/FontDescriptor":
+            for key in _FONT_FILE_KEYS:
+                if key in obj:
+                    del obj[key]
+                    count += 1
+    return count
+
+
+def compact_pdf(
+    source: PdfSource,
+    target_dpi: int = config.PDF_COMPACTION_TARGET_DPI,
+    jpeg_quality: int = config.PDF_COMPACTION_JPEG_QUALITY,
+) -> Tuple[PdfSource, CompactionReport]:
+    """Synchronous compaction — called inside the worker process."""
+    start = time.perf_counter()
+    size = pdf_size(source)
+    report = CompactionReport(bytes_before=size, bytes_after=size)
+    if pikepdf is None or Image is None:
+        report.reason = "pikepdf/Pillow not installed"
+        return source, report
+    try:
+        with open_pdf(source) as stream, pikepdf.open(stream) as pdf:
+            report.images_downsampled = _downsample_images(pdf, target_dpi, jpeg_quality)
+            report.fonts_stripped = _strip_fonts(pdf)
+            if "/Metadata" in pdf.Root:
+                del pdf.Root.Metadata
+            for key in list(pdf.docinfo.keys()):
+                del pdf.docinfo[key]
+            out = io.BytesIO()
+            pdf.save(
+                out,
+                linearize=True,
+                compress_streams=True,
+                object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            )
+        compacted = out.getvalue()
+    except Exception as e:
+        report.reason = f"compaction failed: {e}"
+        report.elapsed_ms = round(1000 * (time.perf_counter() - start), 1)
+        return source, report
+
+    report.elapsed_ms = round(1000 * (time.perf_counter() - start), 1)
+    if len(compacted) >= size:
+        report.reason = "no size reduction"
+        return source, report
+    report.applied = True
+    report.reason = "compacted"
+    report.bytes_after = len(compacted)
+    return compacted, report
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=config.PDF_COMPACTION_WORKERS)
+    return _pool
+
+
+async def compact_pdf_async(
+    source: PdfSource, s3_url: str = ""
+) -> Tuple[PdfSource, CompactionReport]:
+    """Run compact_pdf in the worker pool and log the size/latency savings."""
+    size = pdf_size(source)
+    if size < config.PDF_COMPACTION_MIN_BYTES:
+        return source, CompactionReport(
+            reason="below size threshold",
+            bytes_before=size,
+            bytes_after=size,
+        )
+    loop = asyncio.get_running_loop()
+    compacted, report = await loop.run_in_executor(_get_pool(), compact_pdf, source)
+    if report.applied:
+        log.info(
+            f"PDF compaction for {s3_url}: {report.bytes_before} → {report.bytes_after} bytes "
+            f"({100 * (1 - report.bytes_after / report.bytes_before):.0f}% smaller), "
+            f"{report.images_downsampled} image(s) downsampled, {report.fonts_stripped} font(s) stripped, "
+            f"{report.elapsed_ms} ms"
+        )
+    else:
+        log.info(f"PDF compaction skipped for {s3_url}: {report.reason}")
+    return compacted, report
@@ -0,0 +1,330 @@
+# prompt_cache.py
+
+"""
+Provider-side context caching for the static extraction prompt prefix.
+
+BALANCE_SHEET_PROMPT / PNL_PROMPT (with COMMON_EXTRACTION_RULES and
+STRICT_JSON_OUTPUT_INSTRUCTIONS) are identical on every extraction, so they
+are uploaded once as a Vertex CachedContent and each call only sends the
+dynamic part (incremental-years hint + the document).
+
+Lifecycle, keyed by a hash of (model, prefix contents):
+  • create  – first use, or reuse a cache another worker created with the
+              same display name
+  • refresh – extend the TTL when an entry in use is close to expiry
+  • expire  – when the prefix for a label changes (new prompt version) the
+              old cache is deleted; idle caches lapse on their TTL
+
+Backends:
+  • vertex – vertexai CachedContent (default)
+  • local  – in-process stand-in that prepends the prefix itself; same
+             lifecycle, no provider calls (tests / local runs)
+  • off    – caching disabled
+
+Any cache failure (e.g. prefix below the provider's minimum token count)
+falls back to the uncached model and is not retried for FAILURE_BACKOFF.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import config
+from agent.region_pool import vertex_location
+from pydantic import BaseModel
+from vertexai.generative_models import GenerationConfig, GenerativeModel
+
+try:
+    from vertexai import caching
+except ImportError:  # older SDKs only ship the preview module
+    try:
+        from vertexai.preview import caching
+    except ImportError:
+        caching = None
+
+log = logging.getLogger(__name__)
+
+DISPLAY_NAME_PREFIX = "fin-extract-"
+FAILURE_BACKOFF = 600  # seconds before retrying a prefix that failed to cache
+
+
+def prompt_hash(model_name: str, prefix_contents: List[Dict[str, Any]]) -> str:
+    payload = json.dumps([model_name, prefix_contents], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class PromptCacheStats(BaseModel):
+    calls: int = 0
+    cachedCalls: int = 0
+    promptTokens: int = 0
+    cachedTokens: int = 0
+    creates: int = 0
+    refreshes: int = 0
+    expires: int = 0
+    failures: int = 0
+
+
+class _CacheEntry(BaseModel):
+    name: str
+    label: str
+    promptHash: str
+    expiresAt: float
+    location: Optional[str] = None
+    model: Any = None
+
+
+class VertexCacheBackend:
+    """Thin blocking wrapper over vertexai CachedContent."""
+
+    def __init__(self):
+        if caching is None:
+            raise RuntimeError("vertexai caching module is not available")
+
+    # Cached contents are regional: every call runs against `location`
+
+    def find(self, display_name: str, location: Optional[str] = None) -> Optional[tuple]:
+        with vertex_location(location):
+            for cached in caching.CachedContent.list():
+                if cached.display_name == display_name:
+                    return cached.name, cached.expire_time.timestamp()
+        return None
+
+    def create(
+        self, model_name, prefix_contents, ttl_seconds, display_name, location=None
+    ) -> tuple:
+        with vertex_location(location):
+            cached = caching.CachedContent.create(
+                model_name=model_name,
+                contents=prefix_contents,
+                ttl=timedelta(seconds=ttl_seconds),
+                display_name=display_name,
+            )
+        return cached.name, cached.expire_time.timestamp()
+
+    def refresh(self, name: str, ttl_seconds: int, location: Optional[str] = None) -> float:
+        with vertex_location(location):
+            cached = caching.CachedContent(cached_content_name=name)
+            cached.update(ttl=timedelta(seconds=ttl_seconds))
+            cached.refresh()
+        return cached.expire_time.timestamp()
+
+    def delete(self, name: str, location: Optional[str] = None) -> None:
+        with vertex_location(location):
+            caching.CachedContent(cached_content_name=name).delete()
+
+    def model_for(
+        self, name: str, base_model: GenerativeModel, prefix_contents, location=None
+    ):
+        with vertex_location(location):
+            return GenerativeModel.from_cached_content(
+                cached_content=name,
+                generation_config=GenerationConfig(temperature=0.2),
+            )
+
+
+class _LocalCachedModel:
+    """Behaves like a cached-content model by prepending the prefix."""
+
+    def __init__(self, base_model, prefix_contents):
+        self._base_model = base_model
+        self._prefix_contents = prefix_contents
+
+    def generate_content(self, contents, **kwargs):
+        return self._base_model.generate_content(
+            contents=list(self._prefix_contents) + list(contents), **kwargs
+        )
+
+
+class LocalCacheBackend:
+    """In-process stand-in for VertexCacheBackend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches: Dict[str, Dict[str, Any]] = {}
+
+    def find(self, display_name: str, location: Optional[str] = None) -> Optional[tuple]:
+        with self._lock:
+            for name, cached in self._caches.items():
+                if cached["display_name"] == display_name and cached["expires_at"] > time.time():
+                    return name, cached["expires_at"]
+        return None
+
+    def create(
+        self, model_name, prefix_contents, ttl_seconds, display_name, location=None
+    ) -> tuple:
+        name = f"local/cachedContents/{uuid.uuid4().hex}"
+        expires_at = time.time() + ttl_seconds
+        with self._lock:
+            self._caches[name] = {
+                "display_name": display_name,
+                "contents": prefix_contents,
+                "expires_at": expires_at,
+            }
+        return name, expires_at
+
+    def refresh(self, name: str, ttl_seconds: int, location: Optional[str] = None) -> float:
+        with self._lock:
+            cached = self._caches.get(name)
+            if cached is None or cached["expires_at"] <= time.time():
+                raise KeyError(f"cached content {name} has expired")
+            cached["expires_at"] = time.time() + ttl_seconds
+            return cached["expires_at"]
+
+    def delete(self, name: str, location: Optional[str] = None) -> None:
+        with self._lock:
+            self._caches.pop(name, None)
+
+    def model_for(self, name: str, base_model, prefix_contents, location=None):
+        return _LocalCachedModel(base_model, prefix_contents)
+
+
+class PromptCacheManager:
+    def __init__(
+        self,
+        backend,
+        ttl_seconds: int = config.PROMPT_CACHE_TTL_SECONDS,
+        refresh_margin_seconds: int = config.PROMPT_CACHE_REFRESH_MARGIN_SECONDS,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.stats = PromptCacheStats()
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._failed_until: Dict[str, float] = {}
+        # One lock per event loop: ingest and the worker run separate loops
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def _loop_lock(self) -> asyncio.Lock:
+        return self._locks.setdefault(id(asyncio.get_running_loop()), asyncio.Lock())
+
+    async def amodel_for(
+        self,
+        label: str,
+        base_model,
+        model_name: str,
+        prefix_contents: List[Dict[str, Any]],
+        location: Optional[str] = None,
+    ):
+        """
+        Model bound to the cached prefix for (model_name, prefix_contents) in
+        `location` (default region when None), or None when caching is
+        unavailable for it.
+        """
+        if self.backend is None:
+            return None
+        digest = prompt_hash(f"{location or ''}/{model_name}", prefix_contents)
+        entry = self._entries.get(digest)
+        if entry and entry.expiresAt - time.time() > self.refresh_margin_seconds:
+            return entry.model
+        if self._failed_until.get(digest, 0) > time.time():
+            return None
+
+        async with self._loop_lock():
+            try:
+                entry = await self._aensure(
+                    digest, label, base_model, model_name, prefix_contents, location
+                )
+            except Exception as e:
+                self.stats.failures += 1
+                self._failed_until[digest] = time.time() + FAILURE_BACKOFF
+                log.warning(
+                    f"Prompt cache unavailable for {label} ({digest}); sending the full prompt: {e}"
+                )
+                return None
+        return entry.model
+
+    async def _aensure(
+        self, digest, label, base_model, model_name, prefix_contents, location
+    ):
+        entry = self._entries.get(digest)
+        now = time.time()
+        if entry and entry.expiresAt - now > self.refresh_margin_seconds:
+            return entry  # refreshed by a concurrent caller
+        if entry and entry.expiresAt > now:
+            try:
+                entry.expiresAt = await asyncio.to_thread(
+                    self.backend.refresh, entry.name, self.ttl_seconds, location
+                )
+                self.stats.refreshes += 1
+                log.info(f"Refreshed prompt cache {entry.name} for {label}")
+                return entry
+            except Exception as e:
+                log.warning(f"Could not refresh prompt cache {entry.name}, recreating: {e}")
+
+        await self._aexpire_label(label, keep=digest)
+        display_name = f"{DISPLAY_NAME_PREFIX}{digest}"
+        found = await asyncio.to_thread(self.backend.find, display_name, location)
+        if found and found[1] - now > self.refresh_margin_seconds:
+            name, expires_at = found
+            log.info(f"Reusing prompt cache {name} for {label}")
+        else:
+            name, expires_at = await asyncio.to_thread(
+                self.backend.create,
+                model_name,
+                prefix_contents,
+                self.ttl_seconds,
+                display_name,
+                location,
+            )
+            self.stats.creates += 1
+            log.info(f"Created prompt cache {name} for {label} ({digest})")
+
+        entry = _CacheEntry(
+            name=name,
+            label=label,
+            promptHash=digest,
+            expiresAt=expires_at,
+            location=location,
+            model=self.backend.model_for(name, base_model, prefix_contents, location),
+        )
+        self._entries[digest] = entry
+        return entry
+
+    async def _aexpire_label(self, label: str, keep: str) -> None:
+        """Drop caches for an older version of the same prompt."""
+        stale = [
+            e for d, e in self._entries.items() if e.label == label and d != keep
+        ]
+        for entry in stale:
+            self._entries.pop(entry.promptHash, None)
+            self.stats.expires += 1
+            try:
+                await asyncio.to_thread(self.backend.delete, entry.name, entry.location)
+                log.info(f"Expired prompt cache {entry.name} for {label}")
+            except Exception as e:
+                log.warning(f"Could not delete prompt cache {entry.name}: {e}")
+
+    def record_usage(self, label: str, resp, cached: bool) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+        self.stats.calls += 1
+        self.stats.cachedCalls += int(cached)
+        self.stats.promptTokens += prompt_tokens
+        self.stats.cachedTokens += cached_tokens
+        log.info(
+            f"Gemini usage for {label}: prompt_tokens={prompt_tokens} "
+            f"cached_tokens={cached_tokens} cache={'hit' if cached else 'off'}"
+        )
+
+
+def build_prompt_cache(backend: str = config.PROMPT_CACHE_BACKEND):
+    if backend == "off":
+        return PromptCacheManager(None)
+    if backend == "local":
+        return PromptCacheManager(LocalCacheBackend())
+    if backend != "vertex":
+        log.warning(f"Unknown PROMPT_CACHE_BACKEND {backend!r}, using vertex")
+    try:
+        return PromptCacheManager(VertexCacheBackend())
+    except RuntimeError as e:
+        log.warning(f"Prompt caching disabled: {e}")
+        return PromptCacheManager(None)
+
+
+prompt_cache = build_prompt_cache()
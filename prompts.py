@@ -95,7 +95,7 @@ Each JSON object **MUST exactly match** this structure:
         "shortTermProvisions": number,
         "totalCurrentLiabilities": number
       }},
-      "totalLiabilities": number,
+      "totalLiabilities": number, // Total Equity and Liabilities: shareholders' funds + non-current + current liabilities, as printed
       "nonCurrentAssets": {{
         "tangibleAssets": number,
         "intangibleAssets": number,
@@ -239,6 +239,36 @@ interestExpenses ← profitAndLoss.expenses.financeCosts
 netProfit        ← profitAndLoss.profit.profitAfterTax
 """
 
+# --- TEXT-LAYER INPUT PREAMBLE ---
+# Prepended to the document text when a born-digital PDF is sent as text.
+TEXT_LAYER_PREAMBLE = """\
+The financial statements below were extracted from the PDF's text layer instead of being attached as a file.
+Each page starts with "=== Page N ==="; table columns are separated by " | ". Apply every rule above to this text exactly as you would to the PDF.
+"""
+
+# --- INCREMENTAL EXTRACTION HINT ---
+# Appended to BALANCE_SHEET_PROMPT / PNL_PROMPT when some fiscal years of the
+# company are already stored.
+INCREMENTAL_YEARS_HINT = """\
+**ALREADY EXTRACTED YEARS:** {known_years}
+- For any fiscal year in this list, DO NOT extract line items. Output only the stub {{"fiscalYearEnd": "YYYY-MM-DD", "alreadyExtracted": true}} in its place.
+- Extract every other fiscal year in full, exactly as specified above.
+"""
+
+# --- TARGETED RE-EXTRACTION PROMPT ---
+# Used when local validation finds totals that do not add up.
+SECTION_REEXTRACTION_PROMPT = """\
+You previously extracted the {statement} from the attached document, but these totals do not add up:
+{failures}
+
+Re-read ONLY these sections: {sections}
+for ONLY these fiscal years: {years}.
+Verify every digit against the statement and its referenced notes.
+
+Return ONLY a JSON array with one object per fiscal year, containing "fiscalYearEnd" and
+ONLY the requested sections, nested exactly as in the original structure. No markdown, no commentary.
+"""
+
 SUMMARY_PROMPT = """\
     You are a financial-analysis assistant.  
 I will send you the **current-year raw figures** in JSON.  
@@ -332,6 +362,38 @@ Round all numbers and use human-friendly units exactly as in the original
 • No back-ticks, no code fences, no word “markdown”.  
 • Output is a single JSON string.
 ."""
+
+# --- SUMMARY MERGE PROMPT ---
+# Reduce step of the map-reduce summary: each fiscal year was analysed on its
+# own with SUMMARY_PROMPT; this pass joins them into the final object.
+SUMMARY_MERGE_PROMPT = """\
+You are a financial-analysis assistant. Each fiscal-year block below was produced separately, from that year's figures only,
+in the {{"fiscalYears": [...]}} JSON format.
+
+Merge them into ONE JSON object of exactly the same shape:
+- Keep every fiscal year, and every pointsOfConcern / strongPoints entry with its metric and value, unchanged.
+- Order the fiscal years as given.
+- Rewrite each "overallSummary" (500-1000 characters) so that it also comments on the change from the previous year
+  (improving or deteriorating ratios, new or resolved red flags).
+- No additional keys, no nulls.
+
+Return ONLY the JSON object: no code fences, no commentary.
+
+Per-year results:
+{partials}
+"""
+
+# --- INCREMENTAL SUMMARY HINT ---
+# Appended after SUMMARY_PROMPT's data message when only one new fiscal year
+# is summarised and spliced into the stored multi-year summary.
+SUMMARY_INCREMENTAL_HINT = """\
+The data above is for ONE new fiscal year only. For comparison, this is the stored analysis of the previous fiscal year:
+{previous}
+
+Return the {{"fiscalYears": [...]}} object with exactly one block, for the new fiscal year only.
+In its "overallSummary", also comment on the change from the previous year (improving or deteriorating ratios,
+new or resolved red flags). Do not repeat the previous year's block.
+"""
 # COMPANY_SUMMARY_PROMPT = """\
 # Given the GST Number: {gstNumber}
 # You have access to structured data obtained from either:
@@ -391,6 +453,8 @@ Input Data:
 - GST Status: {status}
 - Nature of Business Activities: {natureOfBusinessActivities}
 - GST Number: {gstNumber}
+- State (decoded from GSTIN): {gstinStateName} (code {gstinStateCode})
+- PAN (embedded in GSTIN): {pan} – {panHolderType}
 
 Additional Rules:
 - For the **IndiaMART profile**, perform a Google or Bing search using this GST number and include the Indiamart "about us" page if found.
@@ -407,6 +471,7 @@ Sources and References:
 • GST Status: {status} (Source: GST API - status)  
 • Nature of Business Activities: {natureOfBusinessActivities} (Source: GST API - natureOfBusinessActivities)  
 • GST Number: {gstNumber} (Source: GST API - gstNumber)  
+• PAN: {pan} – {panHolderType} (Source: GSTIN characters 3-12)  
 • IndiaMART Profile: <link or "Not available"> (Source: External Search)  
 • Official Website: <link or "Not available"> (Source: External Search)  
 
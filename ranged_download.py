@@ -0,0 +1,262 @@
+# ranged_download.py
+
+"""
+Parallel ranged downloads of S3 objects into a spool file.
+
+download_to_file() asks for the first DOWNLOAD_CHUNK_BYTES with a Range
+request. Pre-signed URLs are signed for GET only, so there is no HEAD. If the
+server answers 206, the file is preallocated to the total size from
+Content-Range and memory-mapped. The remaining chunks are then fetched
+DOWNLOAD_PARALLEL_CHUNKS at a time and written straight into the map.
+
+  • resume    – a chunk that fails or ends early is re-requested from the
+                last byte received, up to DOWNLOAD_CHUNK_RETRIES times
+                (5xx, 429 and transport errors only; 403 = expired URL)
+  • integrity – every chunk is pinned to the first response's ETag with
+                If-Match (412 = the object changed mid-download); each
+                response's Content-Range must be the range asked for, and the
+                bytes actually written must add up to the object size. The
+                content is checked against x-amz-checksum-sha256 only when
+                the URL was pre-signed with ChecksumMode (an unsigned
+                x-amz-checksum-mode header would break the signature, 403),
+                else against a single-part ETag (its MD5,
+                DOWNLOAD_VERIFY_MD5_ETAG; turn off for SSE-KMS buckets, whose
+                ETags are not MD5s)
+
+Multipart uploads get no content verification: their ETag is not an MD5 of
+the object and their checksum (if any) is a checksum of part checksums, so
+only the size and Content-Range checks apply. S3 may also leave the checksum
+off ranged responses, so larger single-part objects usually rely on the ETag.
+
+Servers that ignore Range (200) are streamed to the file in one pass.
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import mmap
+import re
+from typing import Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+import httpx
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+HASH_BLOCK_BYTES = 8 << 20
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class DownloadIntegrityError(Exception):
+    """The downloaded object does not match its size, ETag or checksum."""
+
+
+class DownloadResult(BaseModel):
+    size: int
+    sha256: str
+    etag: Optional[str] = None
+    chunks: int = 1
+    resumed: int = 0
+    verified: List[str] = []
+
+
+def _retriable(error: BaseException) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return code == 429 or code >= 500
+    return False
+
+
+def _content_range(content_range: Optional[str]) -> Tuple[int, int, int]:
+    """(first byte, last byte, total size) from a Content-Range header."""
+    match = _CONTENT_RANGE.match(content_range or "")
+    if not match:
+        raise DownloadIntegrityError(f"Unexpected Content-Range {content_range!r}")
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+def _signed_for_checksum(url: str) -> bool:
+    # Only a URL pre-signed with ChecksumMode makes S3 return x-amz-checksum-*
+    query = {k.lower() for k in parse_qs(urlsplit(url).query)}
+    return "x-amz-checksum-mode" in query
+
+
+def _verify(
+    path: str,
+    size: int,
+    expected_size: int,
+    etag: Optional[str],
+    checksum_sha256: Optional[str],
+) -> List[str]:
+    """Hash the finished file and check it; returns [sha256, *checks passed]."""
+    if size != expected_size:
+        raise DownloadIntegrityError(f"Downloaded {size} bytes, expected {expected_size}")
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_BYTES), b""):
+            sha256.update(block)
+            md5.update(block)
+    checks = ["size"]
+    if checksum_sha256 and "-" not in checksum_sha256:
+        if base64.b64encode(sha256.digest()).decode() != checksum_sha256:
+            raise DownloadIntegrityError("SHA-256 checksum mismatch")
+        checks.append("sha256")
+    plain_etag = (etag or "").strip('"')
+    if (
+        config.DOWNLOAD_VERIFY_MD5_ETAG
+        and re.fullmatch(r"[0-9a-f]{32}", plain_etag)  # multipart ETags end in "-<parts>"
+    ):
+        if md5.hexdigest() != plain_etag:
+            raise DownloadIntegrityError(f"MD5 does not match ETag {etag}")
+        checks.append("etag")
+    return [sha256.hexdigest()] + checks
+
+
+async def _fetch_range(
+    client: httpx.AsyncClient,
+    url: str,
+    view: mmap.mmap,
+    start: int,
+    end: int,
+    total: int,
+    etag: Optional[str],
+    retries: int,
+) -> Tuple[int, int]:
+    """Fill view[start:end+1], resuming after failures; returns (bytes written, resumes)."""
+    position, written, resumed = start, 0, 0
+    while position <= end:
+        headers = {"Range": f"bytes={position}-{end}"}
+        if etag:
+            headers["If-Match"] = etag
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 412:
+                    raise DownloadIntegrityError("Object changed during download (ETag mismatch)")
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise DownloadIntegrityError("Server stopped honouring Range requests")
+                served = _content_range(response.headers.get("content-range"))
+                if served != (position, end, total):
+                    raise DownloadIntegrityError(
+                        f"Asked for bytes {position}-{end}/{total}, got {served[0]}-{served[1]}/{served[2]}"
+                    )
+                async for chunk in response.aiter_bytes():
+                    if position + len(chunk) > end + 1:
+                        raise DownloadIntegrityError(f"Range {start}-{end} returned extra bytes")
+                    view[position : position + len(chunk)] = chunk
+                    position += len(chunk)
+                    written += len(chunk)
+            if position <= end:
+                raise httpx.ReadError(f"Range ended early at byte {position}")
+        except Exception as e:
+            if not _retriable(e) or resumed >= retries:
+                raise
+            resumed += 1
+            log.warning(
+                f"Chunk {start}-{end} failed at byte {position} ({e}); resuming ({resumed}/{retries})"
+            )
+            await asyncio.sleep(min(2 ** resumed, 10))
+    return written, resumed
+
+
+async def object_etag(url: str) -> Optional[str]:
+    """The object's current ETag, from a one-byte Range request (no HEAD, see above)."""
+    timeout = httpx.Timeout(config.DOWNLOAD_CHUNK_TIMEOUT_SECONDS, connect=10)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+            response.raise_for_status()
+            return response.headers.get("etag")
+
+
+async def download_to_file(
+    url: str,
+    path: str,
+    chunk_bytes: int = config.DOWNLOAD_CHUNK_BYTES,
+    parallel: int = config.DOWNLOAD_PARALLEL_CHUNKS,
+    retries: int = config.DOWNLOAD_CHUNK_RETRIES,
+    on_size: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> DownloadResult:
+    """Download `url` into `path`; `on_size(total)` is awaited before any byte is written."""
+    timeout = httpx.Timeout(config.DOWNLOAD_CHUNK_TIMEOUT_SECONDS, connect=10)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        async with client.stream(
+            "GET", url, headers={"Range": f"bytes=0-{chunk_bytes - 1}"}
+        ) as response:
+            response.raise_for_status()
+            etag = response.headers.get("etag")
+            checksum = (
+                response.headers.get("x-amz-checksum-sha256")
+                if _signed_for_checksum(url)
+                else None
+            )
+            if response.status_code != 206:
+                # No range support: plain streaming download
+                if on_size is not None and response.headers.get("content-length"):
+                    await on_size(int(response.headers["content-length"]))
+                size = 0
+                with open(path, "wb") as fh:
+                    async for chunk in response.aiter_bytes():
+                        fh.write(chunk)
+                        size += len(chunk)
+                expected = int(response.headers.get("content-length", size))
+                sha256, *checks = await asyncio.to_thread(
+                    _verify, path, size, expected, etag, checksum
+                )
+                return DownloadResult(size=size, sha256=sha256, etag=etag, verified=checks)
+            first_start, first_end, total = _content_range(response.headers.get("content-range"))
+            first = await response.aread()
+
+        if (first_start, first_end) != (0, min(chunk_bytes, total) - 1) or len(first) != first_end + 1:
+            raise DownloadIntegrityError(
+                f"First chunk is {len(first)} bytes for Content-Range {first_start}-{first_end}/{total}"
+            )
+        ranges = [
+            (start, min(start + chunk_bytes, total) - 1)
+            for start in range(len(first), total, chunk_bytes)
+        ]
+        if on_size is not None:
+            await on_size(total)
+        size, resumed = len(first), 0
+        with open(path, "wb+") as fh:
+            fh.truncate(total)
+            if total:
+                with mmap.mmap(fh.fileno(), total) as view:
+                    view[: len(first)] = first
+                    semaphore = asyncio.Semaphore(parallel)
+
+                    async def fetch(start: int, end: int) -> Tuple[int, int]:
+                        async with semaphore:
+                            return await _fetch_range(
+                                client, url, view, start, end, total, etag, retries
+                            )
+
+                    tasks = [asyncio.create_task(fetch(s, e)) for s, e in ranges]
+                    try:
+                        for written, resumes in await asyncio.gather(*tasks):
+                            size += written
+                            resumed += resumes
+                    except BaseException:
+                        # Stop the other chunks before the map is closed
+                        for task in tasks:
+                            task.cancel()
+                        await asyncio.gather(*tasks, return_exceptions=True)
+                        raise
+                    view.flush()
+
+    sha256, *checks = await asyncio.to_thread(_verify, path, size, total, etag, checksum)
+    if ranges:
+        log.info(
+            f"Ranged download: {total} bytes in {len(ranges) + 1} chunks ({resumed} resumed), verified {checks}"
+        )
+    return DownloadResult(
+        size=total,
+        sha256=sha256,
+        etag=etag,
+        chunks=len(ranges) + 1,
+        resumed=resumed,
+        verified=checks,
+    )
@@ -0,0 +1,268 @@
+# region_pool.py
+
+"""
+Multi-region Vertex AI endpoint pool.
+
+Per-region quota caps throughput, so Gemini calls are spread over the
+regions in VERTEX_LOCATIONS ("us-central1:3,europe-west4:1,..." — the
+optional ":n" is the weight; defaults to LOCATION alone).
+
+  • selection – smooth weighted round-robin over healthy regions
+  • ejection  – a throttled region (429 / quota) is ejected at once, a
+                failing one after VERTEX_REGION_EJECT_AFTER_ERRORS
+                consecutive errors; the ejection time doubles on every
+                repeat (capped) and resets after a success
+  • retry     – throttling / unavailable / deadline errors are retried on
+                another region, up to VERTEX_REGION_MAX_ATTEMPTS attempts
+
+acall()/call() take a function of the location, so the same pool drives
+GenerativeModel clients (model_routing.generative_model(tier, location)),
+pooled LangChain chat models (model_routing.chat_model) and, in tests,
+FakeRegionalModel endpoints. counters() exposes per-region request, error
+and ejection counts.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import config
+import vertexai
+from google.api_core import exceptions as api_exceptions
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+MAX_EJECT_SECONDS = 600
+
+_THROTTLE_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+_RETRIABLE_ERRORS = _THROTTLE_ERRORS + (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+)
+_THROTTLE_CODES = {429}
+_RETRIABLE_CODES = {429, 500, 503, 504}
+
+
+def _error_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_throttle(error: BaseException) -> bool:
+    return isinstance(error, _THROTTLE_ERRORS) or _error_code(error) in _THROTTLE_CODES
+
+
+def is_retriable(error: BaseException) -> bool:
+    return isinstance(error, _RETRIABLE_ERRORS) or _error_code(error) in _RETRIABLE_CODES
+
+
+def parse_locations(spec: str) -> List[Tuple[str, int]]:
+    """"us-central1:3,europe-west4" → [("us-central1", 3), ("europe-west4", 1)]"""
+    regions = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        location, _, weight = entry.partition(":")
+        regions.append((location.strip(), max(1, int(weight or 1))))
+    return regions or [(config.LOCATION, 1)]
+
+
+_init_lock = threading.RLock()
+
+
+@contextmanager
+def vertex_location(location: Optional[str]):
+    """
+    Temporarily point vertexai's global config at `location`.
+
+    The SDK captures the location when a model or cached content is created,
+    so every SDK object, default region included, is built inside this block;
+    the lock keeps a default-region creation from picking up another thread's
+    temporary location.
+    """
+    with _init_lock:
+        if not location or location == config.LOCATION:
+            yield
+            return
+        vertexai.init(location=location)
+        try:
+            yield
+        finally:
+            vertexai.init(location=config.LOCATION)
+
+
+class RegionState(BaseModel):
+    location: str
+    weight: int = 1
+    currentWeight: int = 0
+    requests: int = 0
+    errors: int = 0
+    throttles: int = 0
+    consecutiveErrors: int = 0
+    ejections: int = 0
+    ejectionStreak: int = 0
+    ejectedUntil: float = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return self.ejectedUntil <= now
+
+
+class RegionPool:
+    def __init__(
+        self,
+        regions: List[Tuple[str, int]],
+        eject_after_errors: int = config.VERTEX_REGION_EJECT_AFTER_ERRORS,
+        eject_seconds: float = config.VERTEX_REGION_EJECT_SECONDS,
+        max_attempts: int = config.VERTEX_REGION_MAX_ATTEMPTS,
+    ):
+        self._regions = [RegionState(location=loc, weight=w) for loc, w in regions]
+        self.eject_after_errors = eject_after_errors
+        self.eject_seconds = eject_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+    @property
+    def locations(self) -> List[str]:
+        return [r.location for r in self._regions]
+
+    def pick(self, exclude: Tuple[str, ...] = ()) -> str:
+        """Smooth weighted round-robin over healthy regions not in `exclude`."""
+        now = time.time()
+        with self._lock:
+            candidates = [
+                r for r in self._regions if r.healthy(now) and r.location not in exclude
+            ]
+            if not candidates:
+                # Everything is ejected: use the region that comes back first
+                remaining = [r for r in self._regions if r.location not in exclude]
+                chosen = min(remaining or self._regions, key=lambda r: r.ejectedUntil)
+            else:
+                total = sum(r.weight for r in candidates)
+                for region in candidates:
+                    region.currentWeight += region.weight
+                chosen = max(candidates, key=lambda r: r.currentWeight)
+                chosen.currentWeight -= total
+            chosen.requests += 1
+            return chosen.location
+
+    def _region(self, location: str) -> RegionState:
+        return next(r for r in self._regions if r.location == location)
+
+    def report_success(self, location: str) -> None:
+        with self._lock:
+            region = self._region(location)
+            region.consecutiveErrors = 0
+            region.ejectionStreak = 0
+
+    def report_error(self, location: str) -> None:
+        # Request errors (bad input, safety blocks) say nothing about region health
+        with self._lock:
+            self._region(location).errors += 1
+
+    def report_failure(self, location: str, error: BaseException) -> None:
+        throttled = is_throttle(error)
+        with self._lock:
+            region = self._region(location)
+            region.errors += 1
+            region.throttles += int(throttled)
+            region.consecutiveErrors += 1
+            if not throttled and region.consecutiveErrors < self.eject_after_errors:
+                return
+            ejected_for = min(
+                MAX_EJECT_SECONDS, self.eject_seconds * 2 ** region.ejectionStreak
+            )
+            region.ejections += 1
+            region.ejectionStreak += 1
+            region.ejectedUntil = time.time() + ejected_for
+            region.consecutiveErrors = 0
+        log.warning(
+            f"Ejecting Vertex region {location} for {ejected_for:.0f}s "
+            f"({'throttled' if throttled else 'repeated errors'}: {error})"
+        )
+
+    def _next_attempt(self, tried: Tuple[str, ...], error: BaseException) -> bool:
+        return (
+            is_retriable(error)
+            and len(tried) < min(self.max_attempts, len(self._regions))
+        )
+
+    async def acall(self, fn: Callable[[str], Awaitable[Any]]) -> Any:
+        tried: Tuple[str, ...] = ()
+        while True:
+            location = self.pick(exclude=tried)
+            tried += (location,)
+            try:
+                result = await fn(location)
+            except Exception as error:
+                if is_retriable(error):
+                    self.report_failure(location, error)
+                else:
+                    self.report_error(location)
+                if not self._next_attempt(tried, error):
+                    raise
+                log.info(f"Retrying Vertex call in another region after {location} failed: {error}")
+                continue
+            self.report_success(location)
+            return result
+
+    def call(self, fn: Callable[[str], Any]) -> Any:
+        tried: Tuple[str, ...] = ()
+        while True:
+            location = self.pick(exclude=tried)
+            tried += (location,)
+            try:
+                result = fn(location)
+            except Exception as error:
+                if is_retriable(error):
+                    self.report_failure(location, error)
+                else:
+                    self.report_error(location)
+                if not self._next_attempt(tried, error):
+                    raise
+                log.info(f"Retrying Vertex call in another region after {location} failed: {error}")
+                continue
+            self.report_success(location)
+            return result
+
+    def counters(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return {
+                r.location: {
+                    "weight": r.weight,
+                    "requests": r.requests,
+                    "errors": r.errors,
+                    "throttles": r.throttles,
+                    "ejections": r.ejections,
+                    "ejected": not r.healthy(now),
+                }
+                for r in self._regions
+            }
+
+
+class FakeRegionalModel:
+    """
+    Local stand-in for a regional GenerativeModel: returns `reply` or raises
+    `error` (e.g. api_exceptions.ResourceExhausted("quota")) for the first
+    `fail_times` calls. Used to exercise the pool without Vertex.
+    """
+
+    def __init__(self, location: str, reply: Any = None, error: Optional[BaseException] = None, fail_times: int = 0):
+        self.location = location
+        self.reply = reply
+        self.error = error
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def generate_content(self, contents=None, **kwargs):
+        self.calls += 1
+        if self.error is not None and self.calls <= self.fail_times:
+            raise self.error
+        return self.reply
+
+
+region_pool = RegionPool(parse_locations(config.VERTEX_LOCATIONS))
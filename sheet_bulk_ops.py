@@ -0,0 +1,83 @@
+# sheet_bulk_ops.py
+
+"""
+Shared write helpers for the (companyGst, fiscalYearEnd)-keyed sheet collections.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+def sheet_upsert_spec(
+    item: BaseModel, extra_fields: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    (filter, update) for one sheet item, keyed by (companyGst, fiscalYearEnd).
+    extra_fields are stored alongside the model fields (e.g. extractionProvenance).
+    """
+    now = datetime.utcnow()
+    doc = item.model_dump(exclude={"createdAt"}, exclude_none=True)
+    doc.update(extra_fields or {})
+    doc["updatedAt"] = now
+    return (
+        {"companyGst": item.companyGst, "fiscalYearEnd": item.fiscalYearEnd},
+        {"$set": doc, "$setOnInsert": {"createdAt": now}},
+    )
+
+
+def sheet_upsert_op(
+    item: BaseModel, extra_fields: Optional[Dict[str, Any]] = None
+) -> UpdateOne:
+    return UpdateOne(*sheet_upsert_spec(item, extra_fields), upsert=True)
+
+
+async def bulk_upsert_sheet_items(
+    collection,
+    items: List[BaseModel],
+    extra_fields: Optional[List[Optional[Dict[str, Any]]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Upsert all items with a single unordered bulk_write.
+
+    Returns one result per item, in input order:
+      {"index", "companyGst", "fiscalYearEnd", "status", "error"}
+    where status is "inserted", "updated" or "failed". Unordered writes mean
+    one failing item does not stop the others.
+    """
+    if not items:
+        return []
+    extra_fields = extra_fields or [None] * len(items)
+
+    results = [
+        {
+            "index": idx,
+            "companyGst": item.companyGst,
+            "fiscalYearEnd": item.fiscalYearEnd,
+            "status": "updated",
+            "error": None,
+        }
+        for idx, item in enumerate(items)
+    ]
+
+    try:
+        bulk_result = await collection.bulk_write(
+            [
+                sheet_upsert_op(item, extra)
+                for item, extra in zip(items, extra_fields)
+            ],
+            ordered=False,
+        )
+        upserted = bulk_result.upserted_ids or {}
+    except BulkWriteError as bwe:
+        details = bwe.details or {}
+        upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+        for err in details.get("writeErrors", []):
+            results[err["index"]]["status"] = "failed"
+            results[err["index"]]["error"] = err.get("errmsg")
+
+    for idx in upserted:
+        results[idx]["status"] = "inserted"
+    return results
@@ -0,0 +1,93 @@
+# sheet_persistence.py
+
+"""
+Validate-then-bulk persistence of extracted sheet items.
+
+Every item is validated up front; invalid rows are reported and skipped so
+they cannot abort the batch, and the valid ones go to Mongo in a single
+unordered bulk_write per collection.
+"""
+import logging
+from typing import Any, Dict, List
+
+from database.balance_sheet_data import BalanceSheetDataDatabase
+from database.database_config import NetworkConnections
+from database.pnl_sheet_data import ProfitAndLossSheetDatabase
+from models.balance_sheet import BalanceSheetData as ModelBalanceSheetData
+from models.pnl_sheet import ProfitAndLossSheetData as ModelPnLSheetData
+from pydantic import ValidationError
+
+log = logging.getLogger(__name__)
+
+_db_connection = NetworkConnections()
+_balance_sheet_db = BalanceSheetDataDatabase(_db_connection)
+_pnl_sheet_db = ProfitAndLossSheetDatabase(_db_connection)
+
+# Stored next to the model fields rather than validated by the sheet models
+PASSTHROUGH_FIELDS = ("extractionProvenance",)
+
+SHEET_TARGETS = {
+    "balance-sheet": (ModelBalanceSheetData, _balance_sheet_db),
+    "pnl-sheet": (ModelPnLSheetData, _pnl_sheet_db),
+}
+
+
+async def persist_sheet_items(
+    doc_type: str, raw_items: List[Any], company_gst: str
+) -> List[Dict[str, Any]]:
+    """
+    Persist all items of one doc_type for one company.
+
+    Returns one result per input item, in input order, with status
+    "inserted", "updated", "invalid" or "failed".
+    """
+    model_cls, sheet_db = SHEET_TARGETS[doc_type]
+
+    report: List[Dict[str, Any]] = []
+    valid_items, valid_indexes, extra_fields = [], [], []
+    for idx, item_data in enumerate(raw_items):
+        try:
+            if not isinstance(item_data, dict):
+                raise TypeError(f"expected an object, got {type(item_data).__name__}")
+            model_fields = {
+                k: v for k, v in item_data.items() if k not in PASSTHROUGH_FIELDS
+            }
+            item = model_cls(**model_fields)
+            item.companyGst = company_gst
+        except (ValidationError, TypeError) as e:
+            report.append(
+                {
+                    "index": idx,
+                    "companyGst": company_gst,
+                    "fiscalYearEnd": (
+                        item_data.get("fiscalYearEnd")
+                        if isinstance(item_data, dict)
+                        else None
+                    ),
+                    "status": "invalid",
+                    "error": str(e),
+                }
+            )
+            continue
+        valid_items.append(item)
+        valid_indexes.append(idx)
+        extra_fields.append(
+            {k: item_data[k] for k in PASSTHROUGH_FIELDS if item_data.get(k)} or None
+        )
+
+    bulk_results = await sheet_db.bulk_upsert_sheet_data(valid_items, extra_fields)
+    for idx, result in zip(valid_indexes, bulk_results):
+        report.append({**result, "index": idx})
+
+    report.sort(key=lambda r: r["index"])
+    for r in report:
+        if r["status"] in ("invalid", "failed"):
+            log.warning(
+                f"{doc_type} item {r['index']} for {company_gst} "
+                f"({r['fiscalYearEnd']}) {r['status']}: {r['error']}"
+            )
+    return report
+
+
+def count_persisted(report: List[Dict[str, Any]]) -> int:
+    return sum(1 for r in report if r["status"] in ("inserted", "updated"))
@@ -1,17 +1,36 @@
 """
 LangChain chain that summarises parsed JSON data – no file input required.
+
+Inputs larger than SUMMARY_MAP_REDUCE_MIN_CHARS (serialised) that span more
+than one fiscal year are summarised map-reduce style: SUMMARY_PROMPT runs
+once per fiscal year in parallel, and SUMMARY_MERGE_PROMPT joins the partial
+results into the same {"fiscalYears": [...]} object, adding year-over-year
+commentary. A year whose reply fails or is unusable is retried once; if it
+still fails, the whole input goes through the single-prompt path instead.
+If the merge call fails, the per-year blocks are concatenated.
+
+Alongside the summary, the LOS tracker keeps "balanceSheetSummaryYears"
+(fiscalYearEnd → hash of that year's records). When the next run adds exactly
+one fiscal year later than all stored ones and every stored year is
+unchanged, only the new year is summarised (with the previous year's block
+for the year-over-year comparison) and spliced into the stored summary.
 """
 
+import asyncio
 import json
 import logging  # Added logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 
 import config
 from agent import prompts
+from agent.deadlines import DeadlineExpired, call_timeout, check_deadline
+from agent.job_state import current_job, data_hash
+from agent.json_output import parse_json_lenient, strip_code_fences
 from database.database_config import NetworkConnections
 from database.los_application_tracker import LosApplicationTrackerDatabase
-from google.oauth2 import service_account  # NEW
+from agent.model_routing import chat_model
 from langchain.prompts import ChatPromptTemplate
-from langchain_google_vertexai import ChatVertexAI  # type: ignore
 
 
 _db_connection = NetworkConnections()
@@ -21,20 +40,13 @@ _los_application_tracker_db = LosApplicationTrackerDatabase(_db_connection)
 
 log = logging.getLogger(__name__)
 
-_creds = None
-if config.GOOGLE_KEY_FILE:
-    _creds = service_account.Credentials.from_service_account_file(
-        config.GOOGLE_KEY_FILE,
-        scopes=["https://www.googleapis.com/auth/cloud-platform"],
-    )
-
+# Attempts per fiscal year in the map step before falling back to one prompt
+MAP_YEAR_ATTEMPTS = 2
 
-_summary_llm = ChatVertexAI(
-    model_name=config.VERTEX_MODEL,
-    temperature=config.TEMPERATURE,
-    project=config.PROJECT_ID,
-    location=config.LOCATION,
-    credentials=_creds,
+# SUMMARY_PROMPT asks for one JSON object; JSON mode guarantees it parses.
+# Bound per call so the shared chat model stays usable for the ReAct agents.
+_summary_llm = chat_model(config.MODEL_TIER_FINANCIAL_SUMMARY).bind(
+    response_mime_type="application/json"
 )
 
 _summary_template = ChatPromptTemplate.from_messages(
@@ -54,8 +66,202 @@ _summary_template = ChatPromptTemplate.from_messages(
 )
 
 
+def summary_messages(pnl_data: list, bs_data: list) -> list:
+    """Chat messages for one summary (also used to build batch requests)."""
+    return _summary_template.format_prompt(
+        pnl=json.dumps(pnl_data, indent=2, default=str) if pnl_data else "[]",
+        bs=json.dumps(bs_data, indent=2, default=str) if bs_data else "[]",
+        summary_prompt=prompts.SUMMARY_PROMPT,
+    ).to_messages()
+
+
+async def _ainvoke_summary_llm(messages: list, stage: str) -> str:
+    """One summary-model call, within the job's remaining time."""
+    check_deadline(stage)
+    timeout = call_timeout(config.GEMINI_CALL_TIMEOUT_SECONDS)
+    try:
+        rtn = await asyncio.wait_for(_summary_llm.ainvoke(messages), timeout)
+    except asyncio.TimeoutError:
+        if timeout < config.GEMINI_CALL_TIMEOUT_SECONDS:
+            raise DeadlineExpired(stage, f"cut short after {timeout:.0f}s")
+        raise
+    return rtn.content
+
+
+def split_by_fiscal_year(pnl_data: list, bs_data: list) -> List[Tuple[str, list, list]]:
+    """(fiscalYearEnd, pnl records, bs records) per year, oldest first."""
+    groups = defaultdict(lambda: ([], []))
+    for index, records in enumerate((pnl_data or [], bs_data or [])):
+        for record in records:
+            year = str(record.get("fiscalYearEnd") or "unknown")
+            groups[year][index].append(record)
+    return [(year, pnl, bs) for year, (pnl, bs) in sorted(groups.items())]
+
+
+def fiscal_year_hashes(pnl_data: list, bs_data: list) -> Dict[str, str]:
+    return {
+        year: data_hash([pnl, bs]) for year, pnl, bs in split_by_fiscal_year(pnl_data, bs_data)
+    }
+
+
+def use_map_reduce(pnl_data: list, bs_data: list) -> bool:
+    if not config.SUMMARY_MAP_REDUCE_ENABLED:
+        return False
+    size = len(json.dumps([pnl_data, bs_data], default=str))
+    return (
+        size >= config.SUMMARY_MAP_REDUCE_MIN_CHARS
+        and len(split_by_fiscal_year(pnl_data, bs_data)) > 1
+    )
+
+
+def _fiscal_year_sections(text: str, year: str) -> list:
+    parsed = parse_json_lenient(strip_code_fences(text))
+    sections = parsed.get("fiscalYears") if isinstance(parsed, dict) else None
+    if not isinstance(sections, list) or not sections:
+        raise ValueError(f"Summary for fiscal year {year} has no fiscalYears")
+    return sections
+
+
+async def summarize_map_reduce(pnl_data: list, bs_data: list) -> str:
+    groups = split_by_fiscal_year(pnl_data, bs_data)
+    log.info(f"Summarising {len(groups)} fiscal years separately before merging")
+    semaphore = asyncio.Semaphore(config.SUMMARY_MAP_CONCURRENCY)
+
+    async def summarize_year(year: str, pnl: list, bs: list) -> list:
+        for attempt in range(1, MAP_YEAR_ATTEMPTS + 1):
+            try:
+                async with semaphore:
+                    text = await _ainvoke_summary_llm(
+                        summary_messages(pnl, bs), f"financial summary {year}"
+                    )
+                return _fiscal_year_sections(text, year)
+            except DeadlineExpired:
+                raise
+            except Exception as e:
+                if attempt == MAP_YEAR_ATTEMPTS:
+                    raise
+                log.warning(f"Summary for fiscal year {year} failed ({e}); retrying")
+
+    partials = await asyncio.gather(
+        *(summarize_year(*group) for group in groups), return_exceptions=True
+    )
+    for partial in partials:
+        if isinstance(partial, DeadlineExpired):
+            raise partial
+    failed = [group[0] for group, partial in zip(groups, partials) if isinstance(partial, Exception)]
+    if failed:
+        log.warning(
+            f"Summary for fiscal year(s) {failed} failed twice; summarising all years in one prompt"
+        )
+        return await _ainvoke_summary_llm(
+            summary_messages(pnl_data, bs_data), "financial summary"
+        )
+    merged = {"fiscalYears": [section for sections in partials for section in sections]}
+
+    try:
+        text = await _ainvoke_summary_llm(
+            [
+                (
+                    "human",
+                    prompts.SUMMARY_MERGE_PROMPT.format(
+                        partials=json.dumps(merged, ensure_ascii=False)
+                    ),
+                )
+            ],
+            "financial summary merge",
+        )
+        sections = _fiscal_year_sections(text, "merge")
+        if len(sections) != len(merged["fiscalYears"]):
+            raise ValueError(
+                f"merge returned {len(sections)} fiscal years, expected {len(merged['fiscalYears'])}"
+            )
+        merged = {"fiscalYears": sections}
+    except DeadlineExpired:
+        raise
+    except Exception as e:
+        log.warning(f"Summary merge step failed, keeping the per-year results as they are: {e}")
+    return json.dumps(merged, ensure_ascii=False)
+
+
+async def _stored_summary(application_id: str) -> Tuple[Optional[dict], Dict[str, str]]:
+    tracker = await _los_application_tracker_db.get_los_application_tracker_by_identifier(
+        application_id
+    )
+    if not tracker or not tracker.get("balanceSheetSummary"):
+        return None, {}
+    parsed = parse_json_lenient(tracker["balanceSheetSummary"])
+    return (parsed if isinstance(parsed, dict) else None), tracker.get("balanceSheetSummaryYears") or {}
+
+
+async def summarize_incremental(
+    application_id: str, pnl_data: list, bs_data: list, hashes: Dict[str, str]
+) -> Optional[str]:
+    """Splice one new latest fiscal year into the stored summary, or None."""
+    previous, previous_hashes = await _stored_summary(application_id)
+    sections = (previous or {}).get("fiscalYears")
+    new_years = sorted(set(hashes) - set(previous_hashes))
+    if (
+        not isinstance(sections, list)
+        or not previous_hashes
+        or len(sections) != len(previous_hashes)
+        or len(new_years) != 1
+        or new_years[0] < max(previous_hashes)
+        or any(hashes.get(year) != digest for year, digest in previous_hashes.items())
+    ):
+        return None
+
+    new_year = new_years[0]
+    log.info(
+        f"Incremental summary for application ID {application_id}: only fiscal year {new_year} is new"
+    )
+    _, pnl, bs = next(group for group in split_by_fiscal_year(pnl_data, bs_data) if group[0] == new_year)
+    latest = max(sections, key=lambda section: str(section.get("year", "")))
+    messages = summary_messages(pnl, bs) + [
+        (
+            "human",
+            prompts.SUMMARY_INCREMENTAL_HINT.format(
+                previous=json.dumps(latest, ensure_ascii=False)
+            ),
+        )
+    ]
+    new_section = _fiscal_year_sections(
+        await _ainvoke_summary_llm(messages, f"financial summary {new_year}"), new_year
+    )[0]
+
+    # Keep the stored order: newest first or newest last
+    labels = [str(section.get("year", "")) for section in sections]
+    newest_first = len(labels) > 1 and labels == sorted(labels, reverse=True)
+    spliced = [new_section] + sections if newest_first else sections + [new_section]
+    return json.dumps({"fiscalYears": spliced}, ensure_ascii=False)
+
+
+async def store_summary(
+    application_id: str, text: str, year_hashes: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Normalise a model reply to JSON and save it on the LOS tracker, with the
+    per-year input hashes (empty when unknown, which disables the next
+    incremental update).
+    """
+    text = strip_code_fences(text)
+    parsed = parse_json_lenient(text)
+    if parsed is not None:
+        text = json.dumps(parsed, ensure_ascii=False)
+    else:
+        log.warning(
+            f"Summary for application ID {application_id} is not valid JSON; storing it as returned"
+        )
+
+    await _los_application_tracker_db.update_los_application_tracker_by_identifier(
+        application_id,
+        {"balanceSheetSummary": text, "balanceSheetSummaryYears": year_hashes or {}},
+    )
+    log.info(f"LOS application tracker updated with summary for ID: {application_id}")
+    return text
+
+
 async def create_summary(
-    pnl_data: list, bs_data: list, application_id: str, gst_number: str
+    pnl_data: list, bs_data: list, application_id: str, gst_number: str = ""
 ) -> str:
     """
     Creates a summary using Vertex AI based on P&L and Balance Sheet data,
@@ -70,28 +276,41 @@ async def create_summary(
         str: The generated summary text.
     """
     log.info(f"Generating summary for application ID: {application_id}")
+    job = current_job()
+    payload_hash = data_hash([pnl_data, bs_data])
+    hashes = fiscal_year_hashes(pnl_data, bs_data)
     try:
-        # Invoke the LLM to generate the summary
-        rtn = await _summary_llm.ainvoke(  # Use ainvoke for async
-            _summary_template.format_prompt(
-                pnl=json.dumps(pnl_data, indent=2) if pnl_data else "[]",
-                bs=json.dumps(bs_data, indent=2) if bs_data else "[]",
-                summary_prompt=prompts.SUMMARY_PROMPT,
-            ).to_messages()
-        )
-        text = rtn.content
-        log.info(
-            f"Summary generated successfully for application ID: {application_id}. Summary: {text[:100]}..."
-        )
-        text = text.strip("```json").strip("```").strip()
-
-        await _los_application_tracker_db.update_los_application_tracker_by_identifier(
-            application_id, {"balanceSheetSummary": text}
-        )
-        log.info(
-            f"LOS application tracker updated with summary for ID: {application_id}"
-        )
+        text = job.summary_for(payload_hash) if job else None
+        if text is not None:
+            log.info(f"Reusing the checkpointed summary for application ID: {application_id}")
+        else:
+            # Invoke the LLM to generate the summary, within the job's remaining time
+            if config.SUMMARY_INCREMENTAL_ENABLED:
+                try:
+                    text = await summarize_incremental(
+                        application_id, pnl_data, bs_data, hashes
+                    )
+                except DeadlineExpired:
+                    raise
+                except Exception as e:
+                    log.warning(f"Incremental summary failed, regenerating in full: {e}")
+            if text is None and use_map_reduce(pnl_data, bs_data):
+                text = await summarize_map_reduce(pnl_data, bs_data)
+            elif text is None:
+                text = await _ainvoke_summary_llm(
+                    summary_messages(pnl_data, bs_data), "financial summary"
+                )
+            log.info(
+                f"Summary generated successfully for application ID: {application_id}. Summary: {text[:100]}..."
+            )
+            if job:
+                await job.record_summary(payload_hash, text, hashes)
+        text = await store_summary(application_id, text, hashes)
+        if job:
+            await job.record_tracker_updated()
         return text
+    except DeadlineExpired:
+        raise
     except Exception as e:
         log.exception(
             f"Error creating balance sheet summary for application ID {application_id}. Falling back to GST summary. Details: {e}"
@@ -1,16 +1,71 @@
+import functools
+
 from agent.Company_Summary_Agent import run_gst_summary_agent
+from agent.coalescing import coalescer
+from agent.deadlines import DeadlineExpired, check_deadline, deadline_scope, payload_deadline
+from agent.document_spool import document_spool
 from agent.financial_workflow_agent import run_financial_agent
+from agent.gstin import validate_gstin
+from agent.job_state import financial_jobs, job_context
+from agent.summarizer import store_summary
 from graph.gstr3b.gstr3b_summary import run_gstr3b_summary_workflow
 from agent.Company_Summary_Agent import run_gst_summary_agent
 
 
+def with_deadline(handler):
+    """Run the handler under the payload's deadline; expired payloads fail fast."""
+
+    @functools.wraps(handler)
+    async def run(payload: dict) -> str:
+        with deadline_scope(payload_deadline(payload)):
+            check_deadline("dispatch", needed=0)
+            return await handler(payload)
+
+    return run
+
+
 async def handle_financial_summary(payload: dict) -> str:
-    return await run_financial_agent(
-        pnl_s3_urls=payload.get("PNLSheetUrls", []),
-        bs_s3_urls=payload.get("BalanceSheetUrls", []),
-        application_id=payload.get("ApplicationId", ""),
-        company_gst=payload.get("GstNumber", ""),
-    )
+    company_gst = validate_gstin(payload.get("GstNumber"))
+    application_id = payload.get("ApplicationId", "")
+    pnl_s3_urls = payload.get("PNLSheetUrls", [])
+    bs_s3_urls = payload.get("BalanceSheetUrls", [])
+
+    job = None
+    if financial_jobs is not None and application_id:
+        job = await financial_jobs.start(
+            application_id, company_gst, pnl_s3_urls + bs_s3_urls
+        )
+        # Redeliveries shortly after a run reuse its summary; later requests rerun
+        summary_text = job.recent_summary()
+        if job.completed and summary_text:
+            return summary_text
+        if job.reached("summarized") and summary_text:
+            # Only the tracker write was lost; no need to rerun the agent
+            await store_summary(application_id, summary_text, job.summary_year_hashes)
+            await job.record_tracker_updated()
+            return summary_text
+
+    # Start every download now instead of when the agent gets to each document
+    if document_spool is not None:
+        document_spool.prefetch(
+            url
+            for doc_type, urls in (("pnl-sheet", pnl_s3_urls), ("balance-sheet", bs_s3_urls))
+            for url in urls
+            if job is None or not job.has_extraction(doc_type, url)
+        )
+
+    async with job_context(job):
+        try:
+            return await run_financial_agent(
+                pnl_s3_urls=pnl_s3_urls,
+                bs_s3_urls=bs_s3_urls,
+                application_id=application_id,
+                company_gst=company_gst,
+            )
+        except DeadlineExpired as e:
+            if job:
+                await job.record_expired(e.stage)
+            raise
 
 
 async def gstr3b_summary(payload: dict) -> str:
@@ -18,16 +73,18 @@ async def gstr3b_summary(payload: dict) -> str:
 
 
 async def handle_gst_summary(payload: dict) -> str:
-    gst_number = payload.get("GstNumber")
     application_id = payload.get("ApplicationId")
-    if not gst_number:
-        raise ValueError("GST number missing in payload")
+    # Raises GSTINValidationError (a ValueError) before any API/LLM call
+    gst_number = validate_gstin(payload.get("GstNumber"))
 
     return await run_gst_summary_agent(gst_number, application_id)
 
 
+# Identical summary requests arriving close together share one execution
 TASK_DISPATCH = {
-    "FINANCIAL_SUMMARY": handle_financial_summary,
-    "GSTR3B_SUMMARY": gstr3b_summary,
-    "GST_SUMMARY": handle_gst_summary,
+    "FINANCIAL_SUMMARY": coalescer.wrap(
+        "FINANCIAL_SUMMARY", with_deadline(handle_financial_summary)
+    ),
+    "GSTR3B_SUMMARY": with_deadline(gstr3b_summary),
+    "GST_SUMMARY": coalescer.wrap("GST_SUMMARY", with_deadline(handle_gst_summary)),
 }
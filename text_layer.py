@@ -0,0 +1,81 @@
+# text_layer.py
+
+"""
+Text-layer fast path for born-digital PDFs.
+
+Statements exported from accounting software carry a clean text layer.
+For those we send Gemini the statement pages as compact, column-aligned
+text instead of the PDF itself: far fewer input tokens than page images,
+no GCS upload, and no OCR-style reading. Scanned documents keep using the
+file path.
+"""
+import logging
+import re
+from typing import List, Optional
+
+import config
+from agent.page_selection import MIN_TEXT_CHARS_PER_PAGE, PdfReader, PdfSource, open_pdf
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+# Share of pages that must carry real text for a PDF to count as born-digital
+BORN_DIGITAL_PAGE_RATIO = 0.9
+
+_COLUMN_GAP_RE = re.compile(r" {3,}")
+
+
+class TextLayerDocument(BaseModel):
+    text: str
+    pages: List[int]
+    chars: int
+
+
+def is_born_digital(page_texts: Optional[List[str]]) -> bool:
+    if not page_texts:
+        return False
+    with_text = sum(1 for t in page_texts if len(t.strip()) >= MIN_TEXT_CHARS_PER_PAGE)
+    return with_text >= BORN_DIGITAL_PAGE_RATIO * len(page_texts)
+
+
+def _compact(page_text: str) -> str:
+    """Column gaps → " | ", blank lines dropped — keeps tables readable in few tokens."""
+    lines = []
+    for line in page_text.splitlines():
+        line = _COLUMN_GAP_RE.sub(" | ", line.strip())
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def build_statement_text(
+    pdf: PdfSource,
+    pages: List[int],
+    max_chars: int = config.TEXT_LAYER_MAX_CHARS,
+) -> Optional[TextLayerDocument]:
+    """
+    Layout-preserving text of the given pages, or None when the text cannot
+    be extracted or is too large to be worth sending as text.
+    CPU-bound — run it via asyncio.to_thread from async code.
+    """
+    if PdfReader is None or not pages:
+        return None
+    try:
+        with open_pdf(pdf) as stream:
+            reader = PdfReader(stream)
+            blocks = [
+                f"=== Page {page + 1} ===\n"
+                + _compact(reader.pages[page].extract_text(extraction_mode="layout") or "")
+                for page in pages
+            ]
+    except Exception as e:
+        log.warning(f"Could not extract layout text, using file path: {e}")
+        return None
+
+    text = "\n\n".join(blocks)
+    if len(text) > max_chars:
+        log.info(
+            f"Text layer is {len(text)} chars (limit {max_chars}); using file path"
+        )
+        return None
+    return TextLayerDocument(text=text, pages=pages, chars=len(text))